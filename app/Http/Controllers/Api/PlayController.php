@@ -190,7 +190,7 @@ protected function preheatAudioProcess($channelId, $streamUrl)
         try {
             // 检查进程是否已在运行
             $processStatus = $this->audioProcessingService->getProcessStatus($channelId);
-            if ($processStatus && $processStatus['status'] === 'running') {
+            if ($processStatus && in_array($processStatus['status'], ['running', 'starting'], true)) {
                 Log::info('音频处理进程已在运行', ['channel_id' => $channelId]);
                 return;
             }
@@ -244,8 +244,14 @@ public function stream(Request $request)
             $useHls = $request->input('hls', false);
             $segmentName = $request->input('segment', false);
             
+            // 多码率频道的档位（主播放列表中的各档媒体播放列表）
+            $variant = $request->input('variant') ?: null;
+            if (!$this->isValidVariant($variant)) {
+                return $this->error('无效的请求参数', 400);
+            }
+            
             if ($useHls) {
-                return $this->handleHlsRequest($channelId, $channel, $segmentName, $timestamp, $signature);
+                return $this->handleHlsRequest($channelId, $channel, $segmentName, $timestamp, $signature, $variant);
             }
 
             // 传统MP3流模式 - 直接重定向到音频处理服务
@@ -268,16 +274,17 @@ public function stream(Request $request)
      * @param string|false $segmentName
      * @param int $timestamp
      * @param string $signature
+     * @param string|null $variant
      * @return \Illuminate\Http\Response
      */
-    protected function handleHlsRequest($channelId, $channel, $segmentName, $timestamp, $signature)
+    protected function handleHlsRequest($channelId, $channel, $segmentName, $timestamp, $signature, $variant = null)
     {
         if ($segmentName) {
             // 请求 TS 切片
-            return $this->proxyHlsSegment($channelId, $segmentName);
+            return $this->proxyHlsSegment($channelId, $segmentName, $variant);
         } else {
             // 请求播放列表
-            return $this->proxyHlsPlaylist($channelId, $channel, $timestamp, $signature);
+            return $this->proxyHlsPlaylist($channelId, $channel, $timestamp, $signature, $variant);
         }
     }
 
@@ -288,79 +295,122 @@ protected function handleHlsRequest($channelId, $channel, $segmentName, $timesta
      * @param Channel $channel
      * @param int $timestamp
      * @param string $signature
+     * @param string|null $variant 多码率档位，为空时为频道播放列表（启用阶梯时为主播放列表）
      * @return \Illuminate\Http\Response
      */
-    protected function proxyHlsPlaylist($channelId, $channel, $timestamp, $signature)
+    protected function proxyHlsPlaylist($channelId, $channel, $timestamp, $signature, $variant = null)
     {
         try {
             // 确保进程正在运行
             $this->ensureProcessRunning($channelId, $channel->stream_url);
 
-            // 检查播放列表缓存（缓存时间更短）
-            $cacheKey = "hls_playlist:{$channelId}";
-            $cachedPlaylist = Cache::get($cacheKey);
+            // LL-HLS 阻塞式重载参数，透传给音频处理服务
+            $blockingParams = array_filter(request()->only(['_HLS_msn', '_HLS_part']), function ($value) {
+                return $value !== null && $value !== '';
+            });
+
+            // 检查播放列表缓存（缓存时间更短，阻塞式重载请求不走缓存）
+            $playlistKey = $variant ? "{$channelId}/{$variant}" : $channelId;
+            $cacheKey = "hls_playlist:{$playlistKey}";
+            $cachedPlaylist = empty($blockingParams) ? Cache::get($cacheKey) : null;
             
-            if ($cachedPlaylist) {
-                return response($cachedPlaylist, 200, [
+            if (is_array($cachedPlaylist)) {
+                $cachedHeaders = [
                     'Content-Type' => 'application/vnd.apple.mpegurl',
                     'Cache-Control' => 'max-age=3, must-revalidate',  # 允许3秒缓存
                     'Access-Control-Allow-Origin' => '*',
                     'Access-Control-Allow-Methods' => 'GET, OPTIONS',
                     'Access-Control-Allow-Headers' => 'Content-Type, Authorization',
                     'X-Cache-Status' => 'HIT'
-                ]);
+                ];
+
+                // 缓存命中时同样按缓存内容的 ETag 响应条件请求
+                if ($cachedPlaylist['etag']) {
+                    $cachedHeaders['ETag'] = $cachedPlaylist['etag'];
+                    if (request()->header('If-None-Match') === $cachedPlaylist['etag']) {
+                        unset($cachedHeaders['Content-Type']);
+                        return response('', 304, $cachedHeaders);
+                    }
+                }
+
+                return response($cachedPlaylist['body'], 200, $cachedHeaders);
             }
 
             // 获取音频处理服务的播放列表
-            $hlsPlaylistUrl = $this->audioProcessingService->getHlsPlaylistUrl($channelId);
+            $hlsPlaylistUrl = $this->audioProcessingService->getHlsPlaylistUrl($channelId, $variant);
             
             Log::info('请求 HLS 播放列表', [
                 'channel_id' => $channelId,
+                'variant' => $variant,
                 'playlist_url' => $hlsPlaylistUrl
             ]);
 
-            $response = Http::timeout(2)->get($hlsPlaylistUrl);  // 减少超时时间到2秒
+            // 上一次获取的原始播放列表及其 ETag，用于条件请求
+            $upstreamCacheKey = "hls_playlist_upstream:{$playlistKey}";
+            $upstream = Cache::get($upstreamCacheKey);
+
+            if (empty($blockingParams)) {
+                $headers = $upstream ? ['If-None-Match' => $upstream['etag']] : [];
+                $response = Http::timeout(2)->withHeaders($headers)->get($hlsPlaylistUrl);  // 减少超时时间到2秒
+            } else {
+                // 阻塞式重载最多等待三倍目标时长
+                $response = Http::timeout(20)->get($hlsPlaylistUrl, $blockingParams);
+            }
             
-            if ($response->successful()) {
-                // 修改播放列表中的TS切片URL为PHP代理地址
-                $playlistContent = $response->body();
-                $proxyBaseUrl = route('api.play.stream', [
-                    'channel_id' => $channelId,
-                    'timestamp' => $timestamp,
-                    'signature' => $signature,
-                    'hls' => true
-                ]);
-                
-                // 替换所有TS切片URL为PHP代理地址
-                $playlistContent = preg_replace(
-                    '/([a-zA-Z0-9_-]+\.ts)/',
-                    $proxyBaseUrl . '&segment=$1',
-                    $playlistContent
-                );
-                
-                // 缓存播放列表2秒（增加缓存时间，减少请求频率）
-                Cache::put($cacheKey, $playlistContent, now()->addSeconds(2));
-                
-                return response($playlistContent, 200, [
-                    'Content-Type' => 'application/vnd.apple.mpegurl',
-                    'Cache-Control' => 'max-age=3, must-revalidate',  # 允许3秒缓存
-                    'Access-Control-Allow-Origin' => '*',
-                    'Access-Control-Allow-Methods' => 'GET, OPTIONS',
-                    'Access-Control-Allow-Headers' => 'Content-Type, Authorization',
-                    'X-Cache-Status' => 'MISS'
-                ]);
+            if ($response->status() == 304 && $upstream) {
+                // 播放列表未变化，复用上一次的内容
+                $upstreamBody = $upstream['body'];
+                $upstreamEtag = $upstream['etag'];
+            } elseif ($response->successful()) {
+                $upstreamBody = $response->body();
+                $upstreamEtag = $response->header('ETag');
+                if ($upstreamEtag) {
+                    Cache::put($upstreamCacheKey, ['etag' => $upstreamEtag, 'body' => $upstreamBody], now()->addSeconds(60));
+                }
             } elseif ($response->status() == 404) {
                 // 播放列表尚未生成，快速重试机制
-                return $this->handlePlaylistNotReady($channelId, $channel, $timestamp, $signature);
+                return $this->handlePlaylistNotReady($channelId, $channel, $timestamp, $signature, $variant);
             } else {
                 Log::error('获取HLS播放列表失败', [
                     'channel_id' => $channelId,
+                    'variant' => $variant,
                     'url' => $hlsPlaylistUrl,
                     'status' => $response->status(),
                     'body' => $response->body()
                 ]);
                 return $this->error('获取播放列表失败', 500);
             }
+
+            $proxyBaseUrl = $this->hlsProxyBaseUrl($channelId, $timestamp, $signature, $variant);
+
+            $responseHeaders = [
+                'Content-Type' => 'application/vnd.apple.mpegurl',
+                'Cache-Control' => 'max-age=3, must-revalidate',  # 允许3秒缓存
+                'Access-Control-Allow-Origin' => '*',
+                'Access-Control-Allow-Methods' => 'GET, OPTIONS',
+                'Access-Control-Allow-Headers' => 'Content-Type, Authorization',
+                'X-Cache-Status' => 'MISS'
+            ];
+
+            // 改写后的内容由原始内容和代理地址唯一确定，据此生成对浏览器的 ETag
+            if ($upstreamEtag) {
+                $responseHeaders['ETag'] = '"' . md5($upstreamEtag . $proxyBaseUrl) . '"';
+                if (request()->header('If-None-Match') === $responseHeaders['ETag']) {
+                    unset($responseHeaders['Content-Type']);
+                    return response('', 304, $responseHeaders);
+                }
+            }
+
+            // 修改播放列表中的TS切片和各档播放列表URL为PHP代理地址
+            $playlistContent = $this->rewritePlaylistUrls($upstreamBody, $channelId, $timestamp, $signature, $variant);
+            
+            // 缓存播放列表及其 ETag 2秒（增加缓存时间，减少请求频率）
+            Cache::put($cacheKey, [
+                'body' => $playlistContent,
+                'etag' => $responseHeaders['ETag'] ?? null
+            ], now()->addSeconds(2));
+            
+            return response($playlistContent, 200, $responseHeaders);
         } catch (\Exception $e) {
             Log::error('代理HLS播放列表异常', [
                 'channel_id' => $channelId,
@@ -381,7 +431,7 @@ protected function ensureProcessRunning($channelId, $streamUrl)
         try {
             $processStatus = $this->audioProcessingService->getProcessStatus($channelId);
             
-            if (!$processStatus || $processStatus['status'] !== 'running') {
+            if (!$processStatus || !in_array($processStatus['status'], ['running', 'starting'], true)) {
                 Log::info('进程未运行，立即启动', ['channel_id' => $channelId]);
                 $this->audioProcessingService->startProcess($channelId, $streamUrl);
                 
@@ -396,6 +446,76 @@ protected function ensureProcessRunning($channelId, $streamUrl)
         }
     }
 
+    /**
+     * 生成 HLS 代理地址
+     * 
+     * @param int $channelId
+     * @param int $timestamp
+     * @param string $signature
+     * @param string|null $variant
+     * @return string
+     */
+    protected function hlsProxyBaseUrl($channelId, $timestamp, $signature, $variant = null)
+    {
+        $params = [
+            'channel_id' => $channelId,
+            'timestamp' => $timestamp,
+            'signature' => $signature,
+            'hls' => true
+        ];
+        if ($variant) {
+            $params['variant'] = $variant;
+        }
+
+        return route('api.play.stream', $params);
+    }
+
+    /**
+     * 将播放列表中的地址改写为PHP代理地址
+     * 
+     * 媒体播放列表中的TS切片改写为带 segment 参数的代理地址（多码率档位同时带 variant 参数）；
+     * 主播放列表中的各档播放列表（<档位>/playlist.m3u8）改写为带 variant 参数的代理地址。
+     * 
+     * @param string $body
+     * @param int $channelId
+     * @param int $timestamp
+     * @param string $signature
+     * @param string|null $variant
+     * @return string
+     */
+    protected function rewritePlaylistUrls($body, $channelId, $timestamp, $signature, $variant = null)
+    {
+        $proxyBaseUrl = $this->hlsProxyBaseUrl($channelId, $timestamp, $signature, $variant);
+
+        $body = preg_replace(
+            '/([a-zA-Z0-9_-]+\.ts)/',
+            $proxyBaseUrl . '&segment=$1',
+            $body
+        );
+
+        // 只有频道播放列表可能是主播放列表
+        if (!$variant) {
+            $body = preg_replace(
+                '/^([A-Za-z0-9_-]+)\/playlist\.m3u8$/m',
+                $proxyBaseUrl . '&variant=$1',
+                $body
+            );
+        }
+
+        return $body;
+    }
+
+    /**
+     * 校验多码率档位名称（为空表示频道播放列表）
+     * 
+     * @param string|null $variant
+     * @return bool
+     */
+    protected function isValidVariant($variant)
+    {
+        return $variant === null || (is_string($variant) && preg_match('/^[A-Za-z0-9_-]+$/', $variant) === 1);
+    }
+
     /**
      * 处理播放列表未就绪的情况
      * 
@@ -403,31 +523,20 @@ protected function ensureProcessRunning($channelId, $streamUrl)
      * @param Channel $channel
      * @param int $timestamp
      * @param string $signature
+     * @param string|null $variant
      * @return \Illuminate\Http\Response
      */
-    protected function handlePlaylistNotReady($channelId, $channel, $timestamp, $signature)
+    protected function handlePlaylistNotReady($channelId, $channel, $timestamp, $signature, $variant = null)
     {
         // 快速重试一次
         usleep(200000); // 等待0.2秒
         
-        $hlsPlaylistUrl = $this->audioProcessingService->getHlsPlaylistUrl($channelId);
+        $hlsPlaylistUrl = $this->audioProcessingService->getHlsPlaylistUrl($channelId, $variant);
         $response = Http::timeout(1)->get($hlsPlaylistUrl);
         
         if ($response->successful()) {
             // 成功获取，处理播放列表
-            $playlistContent = $response->body();
-            $proxyBaseUrl = route('api.play.stream', [
-                'channel_id' => $channelId,
-                'timestamp' => $timestamp,
-                'signature' => $signature,
-                'hls' => true
-            ]);
-            
-            $playlistContent = preg_replace(
-                '/([a-zA-Z0-9_-]+\.ts)/',
-                $proxyBaseUrl . '&segment=$1',
-                $playlistContent
-            );
+            $playlistContent = $this->rewritePlaylistUrls($response->body(), $channelId, $timestamp, $signature, $variant);
             
             return response($playlistContent, 200, [
                 'Content-Type' => 'application/vnd.apple.mpegurl',
@@ -457,13 +566,15 @@ protected function handlePlaylistNotReady($channelId, $channel, $timestamp, $sig
      * 
      * @param int $channelId
      * @param string $segmentName
+     * @param string|null $variant 多码率档位
      * @return \Illuminate\Http\Response
      */
-    protected function proxyHlsSegment($channelId, $segmentName)
+    protected function proxyHlsSegment($channelId, $segmentName, $variant = null)
     {
         try {
-            // 检查切片是否已缓存
-            $cacheKey = "hls_segment:{$channelId}:{$segmentName}";
+            // 检查切片是否已缓存（各档切片同名，缓存键区分档位）
+            $segmentPath = $variant ? "{$variant}/{$segmentName}" : $segmentName;
+            $cacheKey = "hls_segment:{$channelId}:{$segmentPath}";
             $cachedSegment = Cache::get($cacheKey);
             
             if ($cachedSegment) {
@@ -478,15 +589,21 @@ protected function proxyHlsSegment($channelId, $segmentName)
             }
 
             // 从音频处理服务获取切片
-            $segmentUrl = $this->audioProcessingService->getHlsSegmentUrl($channelId, $segmentName);
+            $segmentUrl = $this->audioProcessingService->getHlsSegmentUrl($channelId, $segmentName, $variant);
             
             Log::debug('请求 HLS 切片', [
                 'channel_id' => $channelId,
+                'variant' => $variant,
                 'segment_name' => $segmentName,
                 'segment_url' => $segmentUrl
             ]);
 
-            $response = Http::timeout(2)->get($segmentUrl);  // 减少超时时间到2秒
+            // 透传听众标识，供音频处理服务估算独立听众数
+            $listenerId = sha1(request()->ip() . '|' . request()->userAgent());
+
+            $response = Http::timeout(2)
+                ->withHeaders(['X-Listener-Id' => $listenerId])
+                ->get($segmentUrl);  // 减少超时时间到2秒
             
             if ($response->successful()) {
                 $segmentData = $response->body();
@@ -624,8 +741,13 @@ public function streamTS(Request $request, $segment)
                 return $this->error('播放链接已过期', 401);
             }
             
+            $variant = $request->input('variant') ?: null;
+            if (!$this->isValidVariant($variant)) {
+                return $this->error('无效的请求参数', 400);
+            }
+            
             // 代理到音频处理服务
-            return $this->proxyHlsSegment($channelId, $segment);
+            return $this->proxyHlsSegment($channelId, $segment, $variant);
             
         } catch (\Exception $e) {
             Log::error('播放TS分片失败', [
@@ -216,11 +216,13 @@ public function isServiceAvailable()
      * 获取 HLS 播放列表 URL
      * 
      * @param int $channelId
+     * @param string|null $variant 多码率档位，为空时为频道播放列表（启用阶梯时为主播放列表）
      * @return string
      */
-    public function getHlsPlaylistUrl($channelId)
+    public function getHlsPlaylistUrl($channelId, $variant = null)
     {
-        return $this->baseUrl . "/hls/{$channelId}/playlist.m3u8";
+        $path = $variant ? "{$channelId}/{$variant}" : $channelId;
+        return $this->baseUrl . "/hls/{$path}/playlist.m3u8";
     }
 
     /**
@@ -228,11 +230,13 @@ public function getHlsPlaylistUrl($channelId)
      * 
      * @param int $channelId
      * @param string $segmentName
+     * @param string|null $variant 多码率档位
      * @return string
      */
-    public function getHlsSegmentUrl($channelId, $segmentName)
+    public function getHlsSegmentUrl($channelId, $segmentName, $variant = null)
     {
-        return $this->baseUrl . "/hls/{$channelId}/{$segmentName}";
+        $path = $variant ? "{$channelId}/{$variant}" : $channelId;
+        return $this->baseUrl . "/hls/{$path}/{$segmentName}";
     }
 
     /**
@@ -0,0 +1,185 @@
+"""
+多码率（ABR）阶梯
+
+网络较差的移动端听众无法稳定收听单一的 128k 输出，而每个码率各启动一个 FFmpeg
+会成倍增加解码开销。启用阶梯的频道由一个 FFmpeg 进程解码一次，经 asplit 分成多路，
+分别编码为各档码率，以 var_stream_map 输出到频道目录下的子目录：
+
+    <hls_output_dir>/<channel_id>/playlist.m3u8          主播放列表（本模块生成）
+    <hls_output_dir>/<channel_id>/<档位>/playlist.m3u8    各档媒体播放列表
+    <hls_output_dir>/<channel_id>/<档位>/segment_NNN.ts   各档切片
+
+各档全部生成首个播放列表后写入主播放列表，频道随之就绪；活动跟踪、空闲停止和资源清理
+都以频道为单位，不区分档位。
+"""
+
+import os
+import re
+import logging
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_BITRATE_RE = re.compile(r'^(\d+(?:\.\d+)?)([kKmM]?)$')
+_VARIANT_NAME_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+# AAC 编码配置 -> RFC 6381 CODECS 属性
+_AAC_CODECS = {
+    'aac_he': 'mp4a.40.5',
+    'aac_he_v2': 'mp4a.40.29'
+}
+
+
+def parse_bitrate(value) -> int:
+    """将 64k / 1.5M / 64000 形式的码率转换为 bit/s"""
+    match = _BITRATE_RE.match(str(value).strip())
+    if not match:
+        raise ValueError(f"invalid bitrate: {value}")
+    number, unit = match.groups()
+    scale = {'': 1, 'k': 1000, 'm': 1000000}[unit.lower()]
+    return int(float(number) * scale)
+
+
+@dataclass
+class Variant:
+    """阶梯中的一档"""
+    name: str  # 子目录名，同时作为 var_stream_map 中的 name
+    bitrate: str  # 如 64k
+    codec: str = 'aac'
+    profile: Optional[str] = None  # 如 aac_he（需要 libfdk_aac）
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+
+    @property
+    def bandwidth(self) -> int:
+        """主播放列表中的 BANDWIDTH（含约 10% 的 TS 封装开销）"""
+        return int(parse_bitrate(self.bitrate) * 1.1)
+
+    @property
+    def codecs(self) -> Optional[str]:
+        """主播放列表中的 CODECS，无法确定时返回 None"""
+        if 'aac' not in self.codec:
+            return None
+        return _AAC_CODECS.get(self.profile or '', 'mp4a.40.2')
+
+
+class AbrLadder:
+    """
+    多码率阶梯
+
+    channels 为空时对所有频道启用，否则只对列出的频道启用。
+    """
+
+    def __init__(self, variants: Iterable[Variant], channels: Iterable[str] = (),
+                 playlist_name: str = 'playlist.m3u8'):
+        self.variants: List[Variant] = list(variants)
+        self.channels = frozenset(channels)
+        self.playlist_name = playlist_name
+
+        if not self.variants:
+            raise ValueError("ABR ladder requires at least one variant")
+        names = [variant.name for variant in self.variants]
+        if len(set(names)) != len(names):
+            raise ValueError(f"duplicate ABR variant names: {names}")
+        for variant in self.variants:
+            if not _VARIANT_NAME_RE.match(variant.name):
+                raise ValueError(f"invalid ABR variant name: {variant.name}")
+            parse_bitrate(variant.bitrate)
+
+        logger.info(
+            f"AbrLadder initialized with variants={names}, "
+            f"channels={sorted(self.channels) if self.channels else 'all'}"
+        )
+
+    @property
+    def variant_names(self) -> List[str]:
+        return [variant.name for variant in self.variants]
+
+    def applies_to(self, channel_id: str) -> bool:
+        """频道是否启用阶梯"""
+        return not self.channels or channel_id in self.channels
+
+    def build_output_args(self, output_dir: str) -> List[str]:
+        """
+        构建阶梯的编码与输出参数（位于 -i 之后、HLS 通用参数之前）
+
+        一次解码经 asplit 分成多路，每路独立编码；调用方需在末尾追加
+        build_playlist_path() 作为输出路径。
+        """
+        count = len(self.variants)
+        labels = ''.join(f'[a{index}]' for index in range(count))
+        args = ['-filter_complex', f'[0:a]asplit={count}{labels}']
+
+        for index, variant in enumerate(self.variants):
+            args += [
+                '-map', f'[a{index}]',
+                f'-c:a:{index}', variant.codec,
+                f'-b:a:{index}', variant.bitrate
+            ]
+            if variant.profile:
+                args += [f'-profile:a:{index}', variant.profile]
+            if variant.sample_rate:
+                args += [f'-ar:a:{index}', str(variant.sample_rate)]
+            if variant.channels:
+                args += [f'-ac:a:{index}', str(variant.channels)]
+
+        args += [
+            '-var_stream_map', ' '.join(f'a:{index},name:{variant.name}'
+                                        for index, variant in enumerate(self.variants)),
+            '-hls_segment_filename', os.path.join(output_dir, '%v', 'segment_%03d.ts')
+        ]
+        return args
+
+    def build_playlist_path(self, output_dir: str) -> str:
+        """各档媒体播放列表的输出路径模板"""
+        return os.path.join(output_dir, '%v', self.playlist_name)
+
+    def prepare_output_dir(self, output_dir: str):
+        """创建各档子目录，并移除上次运行残留的媒体播放列表"""
+        for name in self.variant_names:
+            variant_dir = os.path.join(output_dir, name)
+            os.makedirs(variant_dir, exist_ok=True)
+            playlist_path = os.path.join(variant_dir, self.playlist_name)
+            if os.path.exists(playlist_path):
+                os.remove(playlist_path)
+
+    def variants_ready(self, output_dir: str) -> bool:
+        """各档是否都已生成首个媒体播放列表"""
+        return all(os.path.exists(os.path.join(output_dir, name, self.playlist_name))
+                   for name in self.variant_names)
+
+    def build_master_playlist(self) -> str:
+        """生成主播放列表，按码率从高到低排列（未做带宽估计的播放器从第一档开始）"""
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-INDEPENDENT-SEGMENTS']
+        for variant in sorted(self.variants, key=lambda v: v.bandwidth, reverse=True):
+            attributes = [f'BANDWIDTH={variant.bandwidth}']
+            if variant.codecs:
+                attributes.append(f'CODECS="{variant.codecs}"')
+            lines.append(f'#EXT-X-STREAM-INF:{",".join(attributes)}')
+            lines.append(f'{variant.name}/{self.playlist_name}')
+        return '\n'.join(lines) + '\n'
+
+    def write_master_playlist(self, output_dir: str):
+        """原子写入主播放列表"""
+        playlist_path = os.path.join(output_dir, self.playlist_name)
+        tmp_path = f"{playlist_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.build_master_playlist())
+        os.replace(tmp_path, playlist_path)
+
+    def get_status(self) -> dict:
+        """获取阶梯配置"""
+        return {
+            'channels': sorted(self.channels) if self.channels else 'all',
+            'variants': [
+                {
+                    'name': variant.name,
+                    'bitrate': variant.bitrate,
+                    'codec': variant.codec,
+                    'profile': variant.profile,
+                    'bandwidth': variant.bandwidth
+                }
+                for variant in self.variants
+            ]
+        }
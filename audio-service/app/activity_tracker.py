@@ -0,0 +1,96 @@
+"""
+频道活动跟踪器
+
+记录每个频道最近一次 HLS 请求的时间和累计请求数。热路径（每个播放列表 /
+切片请求）只做属性赋值，不获取任何锁，也不接触 ProcessManager 的锁。
+"""
+
+import time
+import itertools
+import logging
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _ChannelActivity:
+    """单个频道的活动计数"""
+
+    __slots__ = ('last_seen', 'requests', '_counter')
+
+    def __init__(self):
+        self.last_seen = time.monotonic()
+        self.requests = 0
+        # itertools.count 的 next() 在 CPython 中是原子的，无需加锁即可并发递增
+        self._counter = itertools.count(1)
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+        self.requests = next(self._counter)
+
+
+class ActivityTracker:
+    """
+    频道活动跟踪器
+
+    由 serve_hls_file 在每次请求时调用 touch()，IdleProcessMonitor 读取空闲时间，
+    保持频道存活无需额外调用 /api/process/<id>/activity。
+    """
+
+    def __init__(self):
+        self._channels: Dict[str, _ChannelActivity] = {}
+        logger.info("ActivityTracker initialized")
+
+    def touch(self, channel_id: str):
+        """记录一次频道请求（无锁）"""
+        state = self._channels.get(channel_id)
+        if state is None:
+            state = self._channels.setdefault(channel_id, _ChannelActivity())
+        state.touch()
+
+    def idle_seconds(self, channel_id: str, now: Optional[float] = None) -> Optional[float]:
+        """
+        获取频道距最近一次请求的秒数
+
+        Returns:
+            float: 空闲秒数，从未收到请求返回 None
+        """
+        state = self._channels.get(channel_id)
+        if state is None:
+            return None
+        return (now if now is not None else time.monotonic()) - state.last_seen
+
+    def get_request_count(self, channel_id: str) -> int:
+        """获取频道累计请求数"""
+        state = self._channels.get(channel_id)
+        return state.requests if state is not None else 0
+
+    def get_request_counts(self) -> Dict[str, int]:
+        """获取所有频道的累计请求数"""
+        return {channel_id: state.requests for channel_id, state in list(self._channels.items())}
+
+    def forget(self, channel_id: str):
+        """移除频道计数"""
+        self._channels.pop(channel_id, None)
+
+    def prune(self, max_idle: float, live_channels: Iterable[str] = ()) -> int:
+        """
+        清理已无进程且长时间无请求的频道计数
+
+        Args:
+            max_idle: 无请求超过该秒数的频道计数被清理
+            live_channels: 仍有进程运行的频道，其计数始终保留
+        """
+        now = time.monotonic()
+        live_channels = set(live_channels)
+        stale = [channel_id for channel_id, state in list(self._channels.items())
+                 if channel_id not in live_channels and now - state.last_seen > max_idle]
+        for channel_id in stale:
+            self._channels.pop(channel_id, None)
+        return len(stale)
+
+    def get_status(self) -> dict:
+        """获取跟踪器状态"""
+        return {
+            'tracked_channels': len(self._channels)
+        }
@@ -0,0 +1,273 @@
+"""
+转码准入控制
+
+在 ProcessManager.start_process 之前限制同时运行的 FFmpeg 转码数量，避免流量高峰时
+CPU 打满导致所有频道丢切片。预算可按进程数（槽位）和估算 CPU 开销两种方式限制。
+
+预算不足时的策略：
+- queue: 按优先级排队等待（固定频道 > VIP 频道 > 普通频道），超时后拒绝
+- reject: 立即拒绝
+- evict: 停止听众最少的低优先级频道以腾出预算，没有可驱逐的频道时拒绝
+"""
+
+import os
+import heapq
+import itertools
+import threading
+import time
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_PINNED = 0
+PRIORITY_VIP = 1
+PRIORITY_NORMAL = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_PINNED: 'pinned',
+    PRIORITY_VIP: 'vip',
+    PRIORITY_NORMAL: 'normal'
+}
+
+ADMISSION_POLICIES = ('queue', 'reject', 'evict')
+
+
+class _Admission:
+    """已准入的频道"""
+
+    __slots__ = ('cost', 'priority', 'admitted_at')
+
+    def __init__(self, cost: float, priority: int):
+        self.cost = cost
+        self.priority = priority
+        self.admitted_at = time.monotonic()
+
+
+class AdmissionController:
+    """
+    转码准入控制器
+
+    admit() 在启动进程前申请预算，release() 在进程结束（停止或退出）后归还预算。
+    """
+
+    def __init__(self, max_processes: int = 0, cpu_budget: float = 0.0, default_cost: float = 5.0,
+                 policy: str = 'queue', queue_timeout: float = 5.0,
+                 pinned_channels: Iterable[str] = (), vip_channels: Iterable[str] = (),
+                 popularity: Optional[Callable[[str], int]] = None,
+                 evict: Optional[Callable[[str], bool]] = None):
+        if policy not in ADMISSION_POLICIES:
+            raise ValueError(f"Invalid admission policy: {policy}")
+
+        self.max_processes = max_processes  # 0 表示不限制
+        self.cpu_budget = cpu_budget or (os.cpu_count() or 1) * 80.0  # 单位：单核 CPU 百分比
+        self.default_cost = default_cost
+        self.policy = policy
+        self.queue_timeout = queue_timeout
+        self.pinned_channels = set(str(channel_id) for channel_id in pinned_channels)
+        self.vip_channels = set(str(channel_id) for channel_id in vip_channels)
+        self.popularity = popularity
+        self.evict = evict
+
+        self._admitted: Dict[str, _Admission] = {}
+        self._used_cost = 0.0
+        self._waiters: List[Tuple[int, int, str]] = []  # (优先级, 序号, 频道) 最小堆
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+        # 统计计数
+        self._admitted_total = 0
+        self._queued_total = 0
+        self._rejected_total = 0
+        self._evicted_total = 0
+
+        logger.info(
+            f"AdmissionController initialized with policy={policy}, max_processes={max_processes}, "
+            f"cpu_budget={self.cpu_budget}, default_cost={default_cost}"
+        )
+
+    def get_priority(self, channel_id: str, requested: Optional[str] = None) -> int:
+        """获取频道优先级：配置的固定 / VIP 频道优先，其次为请求指定的优先级"""
+        if channel_id in self.pinned_channels:
+            return PRIORITY_PINNED
+        if channel_id in self.vip_channels:
+            return PRIORITY_VIP
+        for priority, name in PRIORITY_NAMES.items():
+            if requested == name:
+                return priority
+        return PRIORITY_NORMAL
+
+    def _fits(self, cost: float) -> bool:
+        """预算是否足够（调用方持有 _condition）"""
+        if self.max_processes and len(self._admitted) >= self.max_processes:
+            return False
+        # 至少允许一个进程，避免单个开销超过预算的频道永远无法启动
+        return not self._admitted or self._used_cost + cost <= self.cpu_budget
+
+    def _grant(self, channel_id: str, cost: float, priority: int):
+        self._admitted[channel_id] = _Admission(cost, priority)
+        self._used_cost += cost
+        self._admitted_total += 1
+
+    def _pick_victim(self, priority: int) -> Optional[str]:
+        """选择听众最少的可驱逐频道（固定频道和优先级更高的频道不会被驱逐）"""
+        candidates = [
+            channel_id for channel_id, admission in self._admitted.items()
+            if admission.priority != PRIORITY_PINNED and admission.priority >= priority
+        ]
+        if not candidates:
+            return None
+
+        def sort_key(channel_id: str):
+            admission = self._admitted[channel_id]
+            listeners = self.popularity(channel_id) if self.popularity else 0
+            # 低优先级优先；听众少的优先；同等条件下先驱逐运行时间最长的
+            return (-admission.priority, listeners, admission.admitted_at)
+
+        return min(candidates, key=sort_key)
+
+    def admit(self, channel_id: str, cost: Optional[float] = None, priority: Optional[str] = None,
+              timeout: Optional[float] = None, opportunistic: bool = False):
+        """
+        申请转码预算
+
+        Args:
+            channel_id: 频道 ID
+            cost: 估算 CPU 开销（单核百分比），默认使用 default_cost
+            priority: 请求指定的优先级（pinned / vip / normal）
+            timeout: 排队等待的最长时间，默认使用 queue_timeout；0 表示不排队也不驱逐
+            opportunistic: 只使用空闲预算，不排队也不驱逐其他频道（用于预热）
+
+        Raises:
+            AdmissionRejectedError: 预算不足且无法排队或驱逐
+        """
+        cost = self.default_cost if cost is None else cost
+        level = self.get_priority(channel_id, priority)
+        timeout = self.queue_timeout if timeout is None else timeout
+
+        with self._condition:
+            if channel_id in self._admitted:
+                return
+
+            if not self._waiters and self._fits(cost):
+                self._grant(channel_id, cost, level)
+                return
+
+            if opportunistic:
+                self._reject(channel_id, level, 'no spare transcode budget')
+
+            # 不等待的调用方（进程接管、自动重启）只能推迟，不能驱逐其他频道
+            if timeout <= 0:
+                self._reject(channel_id, level, 'transcode budget exhausted')
+
+            if self.policy == 'evict':
+                self._admit_by_eviction(channel_id, cost, level)
+                return
+
+            if self.policy == 'reject':
+                self._reject(channel_id, level, 'transcode budget exhausted')
+
+            # 按优先级排队
+            entry = (level, next(self._sequence), channel_id)
+            heapq.heappush(self._waiters, entry)
+            self._queued_total += 1
+            deadline = time.monotonic() + timeout
+            try:
+                while not (self._waiters[0] is entry and self._fits(cost)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._reject(channel_id, level, f'queued for {timeout:.0f}s without a free transcode slot')
+                    self._condition.wait(remaining)
+                self._grant(channel_id, cost, level)
+            finally:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                # 队首变化，唤醒其余等待者重新检查
+                self._condition.notify_all()
+
+    def _admit_by_eviction(self, channel_id: str, cost: float, level: int):
+        """驱逐听众最少的频道直到预算足够（调用方持有 _condition）"""
+        while not self._fits(cost):
+            victim = self._pick_victim(level)
+            if victim is None or self.evict is None:
+                self._reject(channel_id, level, 'transcode budget exhausted and no channel can be evicted')
+
+            logger.warning(f"Evicting channel {victim} to admit {PRIORITY_NAMES[level]} channel {channel_id}")
+            self._evicted_total += 1
+            # 停止进程时会调用 release()，在锁外执行
+            self._condition.release()
+            try:
+                evicted = self.evict(victim)
+            finally:
+                self._condition.acquire()
+            if not evicted:
+                # 进程已不存在，直接回收预算
+                self._release_locked(victim)
+
+        self._grant(channel_id, cost, level)
+
+    def _reject(self, channel_id: str, level: int, reason: str):
+        self._rejected_total += 1
+        logger.warning(f"Admission rejected for channel {channel_id}: {reason}")
+        raise AdmissionRejectedError(channel_id, reason, self.policy, PRIORITY_NAMES[level])
+
+    def release(self, channel_id: str):
+        """归还频道占用的预算"""
+        with self._condition:
+            if self._release_locked(channel_id):
+                self._condition.notify_all()
+
+    def _release_locked(self, channel_id: str) -> bool:
+        admission = self._admitted.pop(channel_id, None)
+        if admission is None:
+            return False
+        self._used_cost = max(0.0, self._used_cost - admission.cost)
+        return True
+
+    def get_utilization(self) -> float:
+        """获取预算利用率（百分比，按 CPU 预算和进程槽位中较高的一个）"""
+        with self._condition:
+            utilization = self._used_cost / self.cpu_budget * 100 if self.cpu_budget else 0.0
+            if self.max_processes:
+                utilization = max(utilization, len(self._admitted) / self.max_processes * 100)
+            return utilization
+
+    def is_admitted(self, channel_id: str) -> bool:
+        """检查频道是否已占用预算"""
+        return channel_id in self._admitted
+
+    def get_status(self) -> dict:
+        """获取准入控制状态"""
+        with self._condition:
+            by_priority = {name: 0 for name in PRIORITY_NAMES.values()}
+            for admission in self._admitted.values():
+                by_priority[PRIORITY_NAMES[admission.priority]] += 1
+
+            running = len(self._admitted)
+            return {
+                'policy': self.policy,
+                'max_processes': self.max_processes,
+                'running': running,
+                'cpu_budget': self.cpu_budget,
+                'cpu_used': round(self._used_cost, 1),
+                'utilization': round(self._used_cost / self.cpu_budget * 100, 1) if self.cpu_budget else 0.0,
+                'slot_utilization': round(running / self.max_processes * 100, 1) if self.max_processes else None,
+                'queued': len(self._waiters),
+                'by_priority': by_priority,
+                'admitted_total': self._admitted_total,
+                'queued_total': self._queued_total,
+                'rejected_total': self._rejected_total,
+                'evicted_total': self._evicted_total
+            }
+
+
+class AdmissionRejectedError(Exception):
+    """转码预算不足错误"""
+
+    def __init__(self, channel_id: str, reason: str, policy: str, priority: str):
+        self.channel_id = channel_id
+        self.reason = reason
+        self.policy = policy
+        self.priority = priority
+        super().__init__(f"Cannot start channel {channel_id}: {reason}")
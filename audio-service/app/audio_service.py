@@ -78,10 +78,62 @@ class AudioService:
         """获取空闲进程监控器"""
         return self.container.get_service('idle_monitor')
     
+    @property
+    def activity_tracker(self):
+        """获取活动跟踪器"""
+        return self.container.get_service('activity_tracker')
+    
+    @property
+    def listener_estimator(self):
+        """获取听众估算器"""
+        return self.container.get_service('listener_estimator')
+    
+    @property
+    def circuit_breaker(self):
+        """获取上游熔断器（未启用时返回 None）"""
+        try:
+            return self.container.get_service('circuit_breaker')
+        except ValueError:
+            return None
+    
+    @property
+    def process_sampler(self):
+        """获取进程资源采样器（未启用时返回 None）"""
+        try:
+            return self.container.get_service('process_sampler')
+        except ValueError:
+            return None
+    
+    @property
+    def progress_monitor(self):
+        """获取 FFmpeg 进度统计（未启用时返回 None）"""
+        try:
+            return self.container.get_service('progress_monitor')
+        except ValueError:
+            return None
+    
     @property
     def resource_cleaner(self):
         """获取资源清理器"""
         return self.container.get_service('resource_cleaner')
+    
+    @property
+    def hls_watcher(self):
+        """获取 HLS 目录监视器"""
+        return self.container.get_service('hls_watcher')
+    
+    @property
+    def playlist_tracker(self):
+        """获取播放列表跟踪器"""
+        return self.container.get_service('playlist_tracker')
+    
+    @property
+    def segment_cache(self):
+        """获取切片缓存（未启用时返回 None）"""
+        try:
+            return self.container.get_service('segment_cache')
+        except ValueError:
+            return None
 
 
 # 全局服务实例
@@ -0,0 +1,202 @@
+"""
+上游主机熔断器
+
+同一电台服务商的主机宕机时，该主机上的所有频道会反复启动 FFmpeg 并以网络错误失败。
+熔断器按上游主机统计连续的网络错误：
+
+- CLOSED: 正常放行
+- OPEN: 连续网络错误达到阈值后打开，在冷却时间内直接拒绝该主机的启动请求
+- HALF_OPEN: 冷却结束后只放行一个探测进程；探测成功则关闭，失败则重新打开并延长冷却时间
+"""
+
+import time
+import threading
+import logging
+from enum import Enum
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from app.error_handler import ErrorInfo
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(Enum):
+    """熔断器状态"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class _HostCircuit:
+    """单个上游主机的熔断状态"""
+
+    def __init__(self):
+        self.state = CircuitState.CLOSED
+        self.failures = 0  # 连续网络错误次数
+        self.open_seconds = 0.0  # 当前冷却时长
+        self.opened_at = 0.0
+        self.probe_channel: Optional[str] = None
+        self.probe_started_at = 0.0
+        self.trips = 0  # 累计打开次数
+        self.last_error: Optional[str] = None
+
+
+class CircuitBreaker:
+    """
+    按上游主机的熔断器
+
+    由 ErrorHandler 的 NETWORK_ERROR 恢复回调记录失败，进程首次生成播放列表时记录成功；
+    ProcessManager 在启动进程前调用 before_start() 检查。
+    """
+
+    def __init__(self, failure_threshold: int = 3, open_seconds: float = 30.0, max_open_seconds: float = 300.0):
+        self.failure_threshold = failure_threshold
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+
+        self._circuits: Dict[str, _HostCircuit] = {}
+        self._lock = threading.Lock()
+
+        logger.info(
+            f"CircuitBreaker initialized with failure_threshold={failure_threshold}, "
+            f"open_seconds={open_seconds}, max_open_seconds={max_open_seconds}"
+        )
+
+    @staticmethod
+    def get_host(stream_url: str) -> str:
+        """提取上游主机（含端口）作为熔断键"""
+        try:
+            netloc = urlparse(stream_url).netloc
+        except ValueError:
+            netloc = ''
+        return (netloc.rsplit('@', 1)[-1] or stream_url).lower()
+
+    def before_start(self, channel_id: str, stream_url: str):
+        """
+        启动进程前检查熔断状态
+
+        Raises:
+            CircuitOpenError: 熔断器打开，或半开状态下已有探测进程
+        """
+        host = self.get_host(stream_url)
+        now = time.monotonic()
+
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None or circuit.state == CircuitState.CLOSED:
+                return
+
+            if circuit.state == CircuitState.OPEN:
+                remaining = circuit.opened_at + circuit.open_seconds - now
+                if remaining > 0:
+                    raise CircuitOpenError(host, circuit.state, remaining, circuit.last_error)
+
+                # 冷却结束，放行一个探测进程
+                circuit.state = CircuitState.HALF_OPEN
+                circuit.probe_channel = channel_id
+                circuit.probe_started_at = now
+                logger.info(f"Circuit for {host} half-open, probing with channel {channel_id}")
+                return
+
+            # HALF_OPEN：探测进程在冷却时长内没有结果时允许新的探测
+            if circuit.probe_channel != channel_id and now - circuit.probe_started_at < circuit.open_seconds:
+                retry_after = circuit.probe_started_at + circuit.open_seconds - now
+                raise CircuitOpenError(host, circuit.state, retry_after, circuit.last_error)
+
+            circuit.probe_channel = channel_id
+            circuit.probe_started_at = now
+
+    def record_failure(self, stream_url: str, error_message: Optional[str] = None):
+        """记录一次上游网络错误"""
+        host = self.get_host(stream_url)
+        now = time.monotonic()
+
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None:
+                circuit = self._circuits[host] = _HostCircuit()
+
+            circuit.failures += 1
+            circuit.last_error = error_message
+
+            if circuit.state == CircuitState.HALF_OPEN:
+                # 探测失败，延长冷却时间后重新打开
+                circuit.open_seconds = min(circuit.open_seconds * 2, self.max_open_seconds)
+            elif circuit.state == CircuitState.CLOSED and circuit.failures >= self.failure_threshold:
+                circuit.open_seconds = self.base_open_seconds
+            else:
+                return
+
+            circuit.state = CircuitState.OPEN
+            circuit.opened_at = now
+            circuit.probe_channel = None
+            circuit.trips += 1
+
+        logger.warning(f"Circuit for {host} opened for {circuit.open_seconds:.0f}s after {circuit.failures} network errors")
+
+    def record_success(self, stream_url: str):
+        """记录一次成功启动（进程已生成播放列表）"""
+        host = self.get_host(stream_url)
+
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None:
+                return
+            was_open = circuit.state != CircuitState.CLOSED
+            del self._circuits[host]
+
+        if was_open:
+            logger.info(f"Circuit for {host} closed")
+
+    def handle_network_error(self, error_info: ErrorInfo):
+        """ErrorHandler NETWORK_ERROR 恢复回调"""
+        stream_url = (error_info.additional_info or {}).get('stream_url')
+        if stream_url:
+            self.record_failure(stream_url, error_info.error_message)
+
+    def get_host_status(self, stream_url: str) -> dict:
+        """获取上游主机的熔断状态"""
+        host = self.get_host(stream_url)
+        with self._lock:
+            circuit = self._circuits.get(host)
+            return self._circuit_to_dict(host, circuit, time.monotonic())
+
+    def _circuit_to_dict(self, host: str, circuit: Optional[_HostCircuit], now: float) -> dict:
+        if circuit is None:
+            return {'host': host, 'state': CircuitState.CLOSED.value, 'failures': 0}
+
+        status = {
+            'host': host,
+            'state': circuit.state.value,
+            'failures': circuit.failures,
+            'trips': circuit.trips,
+            'last_error': circuit.last_error
+        }
+        if circuit.state == CircuitState.OPEN:
+            status['retry_after'] = round(max(0.0, circuit.opened_at + circuit.open_seconds - now), 1)
+        elif circuit.state == CircuitState.HALF_OPEN:
+            status['probe_channel'] = circuit.probe_channel
+        return status
+
+    def get_status(self) -> dict:
+        """获取熔断器状态"""
+        now = time.monotonic()
+        with self._lock:
+            hosts = [self._circuit_to_dict(host, circuit, now) for host, circuit in self._circuits.items()]
+        return {
+            'failure_threshold': self.failure_threshold,
+            'open_hosts': sum(1 for host in hosts if host['state'] != CircuitState.CLOSED.value),
+            'hosts': hosts
+        }
+
+
+class CircuitOpenError(Exception):
+    """上游主机熔断错误"""
+
+    def __init__(self, host: str, state: CircuitState, retry_after: float, last_error: Optional[str] = None):
+        self.host = host
+        self.state = state
+        self.retry_after = max(0.0, retry_after)
+        self.last_error = last_error
+        super().__init__(f"Upstream host {host} is unavailable ({state.value}), retry after {self.retry_after:.0f}s")
@@ -44,7 +44,7 @@ class ConcurrencyControl:
         if not channel_id:
             raise ValueError("channel_id cannot be empty")
         
-        lock_file_path = self._get_lock_file_path(channel_id)
+        lock_file_path = self.get_lock_file_path(channel_id)
         
         try:
             # 打开锁文件
@@ -99,7 +99,7 @@ class ConcurrencyControl:
             os.close(fd)
             
             # 删除锁文件
-            lock_file_path = self._get_lock_file_path(channel_id)
+            lock_file_path = self.get_lock_file_path(channel_id)
             try:
                 os.remove(lock_file_path)
             except OSError:
@@ -133,7 +133,7 @@ class ConcurrencyControl:
             return True
         
         # 检查锁文件是否存在且被其他进程持有
-        lock_file_path = self._get_lock_file_path(channel_id)
+        lock_file_path = self.get_lock_file_path(channel_id)
         
         if not os.path.exists(lock_file_path):
             return False
@@ -169,7 +169,7 @@ class ConcurrencyControl:
         if not channel_id:
             return None
         
-        lock_file_path = self._get_lock_file_path(channel_id)
+        lock_file_path = self.get_lock_file_path(channel_id)
         
         if not os.path.exists(lock_file_path):
             return None
@@ -255,7 +255,7 @@ class ConcurrencyControl:
         
         return active_locks
     
-    def _get_lock_file_path(self, channel_id: str) -> str:
+    def get_lock_file_path(self, channel_id: str) -> str:
         """获取锁文件路径"""
         return str(self.lock_dir / f"ffmpeg_lock_{channel_id}.lock")
     
@@ -1,6 +1,7 @@
 import os
 import yaml
 import logging
+from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, Optional
 
@@ -27,7 +28,42 @@ class AudioServiceConfig:
                 'audio_codec': 'aac',
                 'bitrate': '128k',
                 'preset': 'fast',
-                'tune': 'audio'
+                'tune': 'audio',
+                'log_buffer_lines': 200,  # 每个频道保留的 stderr 行数
+                'progress': True  # 以 -progress pipe:1 输出实时转码统计
+            },
+            
+            # 编码直通配置（上游已是兼容编码时 -c:a copy，不转码）
+            'passthrough': {
+                'enabled': True,
+                'ffprobe_path': '',  # 为空时使用 FFmpeg 同目录下的 ffprobe
+                'codecs': ['aac'],  # 可直接重新封装的上游编码
+                'max_bitrate': 192000,  # 上游码率超过该值 (bit/s) 时仍然转码
+                'probe_timeout': 5,  # 探测超时 (秒)
+                'cache_ttl': 604800,  # 探测结果缓存时间 (秒)，按探测时间计算，服务重启后仍然有效
+                'failure_ttl': 300,  # 探测或直通启动失败后直接转码的时间 (秒)
+                'cost_percent': 1  # 直通进程的估算 CPU 开销 (单核百分比)
+            },
+            
+            # 探测结果缓存配置（已知上游格式时以最小探测量启动 FFmpeg）
+            'probe_cache': {
+                'enabled': True,
+                'path': '',  # 为空时使用 <lock_dir>/probe_cache.json
+                'fast_start': True,  # 以缓存的格式指定 -f 并使用最小探测量
+                'probesize': 32768,  # 快速启动的探测大小 (字节)
+                'analyzeduration': 500000  # 快速启动的分析时长 (微秒)
+            },
+            
+            # 多码率阶梯配置（一个 FFmpeg 解码一次，输出多档码率）
+            'abr': {
+                'enabled': False,
+                'channels': [],  # 启用阶梯的频道，为空时对所有频道启用
+                'cost_percent': 8,  # 阶梯进程的估算 CPU 开销 (单核百分比)
+                'variants': [
+                    {'name': '32k', 'bitrate': '32k', 'codec': 'aac', 'sample_rate': 22050},
+                    {'name': '64k', 'bitrate': '64k', 'codec': 'aac'},
+                    {'name': '128k', 'bitrate': '128k', 'codec': 'aac'}
+                ]
             },
             
             # HLS 配置
@@ -38,7 +74,71 @@ class AudioServiceConfig:
                 'segment_list_size': 35,
                 'segment_prefix': 'segment_',
                 'max_age': 720,
-                'cleanup_interval': 180
+                'cleanup_interval': 180,
+                'watcher_backend': 'auto',  # auto / inotify / polling
+                'watcher_poll_interval': 0.1,  # 轮询后端扫描间隔 (秒)
+                'playlist_wait_timeout': 0.5,  # 播放列表未生成时的最长等待时间 (秒)
+                'blocking_reload': True,  # 支持 LL-HLS 阻塞式播放列表重载
+                'delivery_mode': 'direct',  # 切片发送方式: direct / x-accel-redirect / x-sendfile
+                'x_accel_prefix': '/internal/hls/'  # nginx internal location 前缀
+            },
+            
+            # 切片缓存配置
+            'segment_cache': {
+                'enabled': True,
+                'max_size_mb': 64,  # 缓存总字节预算 (MB)
+                'max_segment_size_kb': 2048  # 单个切片大小上限 (KB)
+            },
+            
+            # 进程自动重启配置
+            'restart': {
+                'enabled': True,  # 进程意外退出后是否自动重启
+                'max_retries': 5,  # 连续重启次数上限
+                'initial_delay': 2,  # 首次重启延迟 (秒)，之后指数增长
+                'max_delay': 30,  # 最大重启延迟 (秒)
+                'jitter': 0.2,  # 延迟随机抖动比例
+                'stable_after': 60  # 进程运行超过该时长后重置重试预算 (秒)
+            },
+            
+            # 上游主机熔断配置
+            'circuit_breaker': {
+                'enabled': True,
+                'failure_threshold': 3,  # 连续网络错误达到该次数后熔断
+                'open_seconds': 30,  # 熔断冷却时间 (秒)
+                'max_open_seconds': 300  # 探测连续失败时冷却时间的上限 (秒)
+            },
+            
+            # 转码准入控制配置
+            'admission': {
+                'enabled': False,
+                'max_processes': 0,  # 同时运行的转码进程上限，0 表示不限制
+                'cpu_budget_percent': 0,  # 转码 CPU 预算 (单核百分比)，0 表示 CPU 核数 × 80
+                'transcode_cost_percent': 5,  # 单个转码进程的估算 CPU 开销 (单核百分比)
+                'policy': 'queue',  # 预算不足时的策略: queue / reject / evict
+                'queue_timeout': 5,  # 排队等待的最长时间 (秒)
+                'pinned_channels': [],  # 固定频道：最高优先级，不会被驱逐
+                'vip_channels': []  # VIP 频道：优先于普通频道
+            },
+            
+            # 进程资源采样配置
+            'process_sampler': {
+                'enabled': True,
+                'interval': 5,  # 采样间隔 (秒)
+                'history_size': 12  # 每个频道保留的采样点数
+            },
+            
+            # 进程注册表配置（服务重启时接管仍在运行的 FFmpeg）
+            'process_registry': {
+                'enabled': True,
+                'path': '',  # 注册表文件路径，为空时使用 <lock_dir>/ffmpeg_registry.json
+                'detach_on_shutdown': False  # 任何关闭都保留 FFmpeg 进程；默认只在重启（SIGHUP）时保留
+            },
+            
+            # 独立听众估算配置
+            'listeners': {
+                'hll_precision': 10,  # HyperLogLog 精度，寄存器数为 2^precision
+                'window_seconds': 3600,  # 滑动窗口长度 (秒)
+                'window_buckets': 6  # 窗口分片数
             },
             
             # 并发控制配置
@@ -47,10 +147,37 @@ class AudioServiceConfig:
                 'lock_timeout': 30
             },
             
+            # 频道预热配置
+            'prewarm': {
+                'enabled': True,
+                'interval': 60,  # 统计和预热检查间隔 (秒)
+                'lead_time': 300,  # 提前启动的时间 (秒)
+                'join_grace': 600,  # 预计开始收听后仍无人请求时停止 (秒)
+                'min_requests_per_hour': 600,  # 预计请求数达到该值的时段才预热
+                'max_channels': 10,  # 同时预热的频道上限
+                'max_utilization': 70,  # 转码预算利用率达到该百分比时不再预热
+                'history_decay': 0.8,  # 历史统计每周的衰减系数
+                'state_path': '',  # 统计数据文件，为空时使用 <lock_dir>/prewarm_state.json
+                'schedule': []  # 预热计划: channel_id / stream_url / start / end / days
+            },
+            
             # 空闲进程配置
             'idle_process': {
                 'timeout': 300,  # 5 分钟
-                'check_interval': 60  # 1 分钟
+                'check_interval': 60,  # 请求计数清理间隔 (秒)
+                'adaptive': True,  # 按频道热度自适应保留时间
+                'min_linger': 60,  # 保留时间下限 (秒)
+                'max_linger': 1800,  # 保留时间上限 (秒)
+                'busy_requests_per_hour': 1200,  # 约一个持续收听的听众产生的请求速率
+                'rejoin_window': 600  # 空闲停止后该时间内重新启动视为过早停止 (秒)
+            },
+            
+            # 输出停滞看门狗配置
+            'stall_watchdog': {
+                'enabled': True,
+                'stall_factor': 3,  # 超过 stall_factor × 切片时长没有新输出判定为停滞
+                'startup_grace': 30,  # 启动后等待首个播放列表的最长时间 (秒)
+                'check_interval': 2  # 检查间隔 (秒)
             },
             
             # 资源清理配置
@@ -135,7 +262,17 @@ class AudioServiceConfig:
             'IDLE_TIMEOUT': ('idle_process', 'timeout'),
             'LOCK_DIR': ('concurrency', 'lock_dir'),
             'MIN_FREE_SPACE_MB': ('error_handling', 'min_free_space_mb'),
-            'AUTO_RECOVERY_ENABLED': ('error_handling', 'auto_recovery_enabled')
+            'AUTO_RECOVERY_ENABLED': ('error_handling', 'auto_recovery_enabled'),
+            'SEGMENT_CACHE_ENABLED': ('segment_cache', 'enabled'),
+            'SEGMENT_CACHE_MAX_SIZE_MB': ('segment_cache', 'max_size_mb'),
+            'HLS_DELIVERY_MODE': ('hls', 'delivery_mode'),
+            'RESTART_ENABLED': ('restart', 'enabled'),
+            'RESTART_MAX_RETRIES': ('restart', 'max_retries'),
+            'CIRCUIT_BREAKER_ENABLED': ('circuit_breaker', 'enabled'),
+            'ADMISSION_MAX_PROCESSES': ('admission', 'max_processes'),
+            'ADMISSION_POLICY': ('admission', 'policy'),
+            'PROCESS_REGISTRY_ENABLED': ('process_registry', 'enabled'),
+            'PROCESS_REGISTRY_PATH': ('process_registry', 'path')
         }
         
         for env_var, (section, key) in env_mappings.items():
@@ -145,13 +282,14 @@ class AudioServiceConfig:
                 if key in ['port', 'segment_duration', 'segment_list_size', 'max_age', 
                           'cleanup_interval', 'lock_timeout', 'timeout', 'check_interval', 
                           'interval', 'max_log_size', 'min_free_space_mb', 'disk_check_interval',
-                          'network_retry_delay', 'max_recovery_attempts', 'max_error_history']:
+                          'network_retry_delay', 'max_recovery_attempts', 'max_error_history',
+                          'max_size_mb', 'max_segment_size_kb', 'max_retries', 'max_processes']:
                     try:
                         value = int(value)
                     except ValueError:
                         logger.warning(f"Invalid integer value for {env_var}: {value}")
                         continue
-                elif key in ['debug', 'auto_recovery_enabled']:
+                elif key in ['debug', 'auto_recovery_enabled', 'enabled']:
                     value = value.lower() in ('true', '1', 'yes', 'on')
                 
                 config[section][key] = value
@@ -179,9 +317,43 @@ class AudioServiceConfig:
         if self.IDLE_TIMEOUT <= 0:
             errors.append(f"Invalid idle timeout: {self.IDLE_TIMEOUT}")
         
+        if self.IDLE_ADAPTIVE_ENABLED and not (0 < self.IDLE_MIN_LINGER <= self.IDLE_MAX_LINGER):
+            errors.append(f"Invalid linger bounds: {self.IDLE_MIN_LINGER}-{self.IDLE_MAX_LINGER}")
+        
         if self.LOCK_TIMEOUT <= 0:
             errors.append(f"Invalid lock timeout: {self.LOCK_TIMEOUT}")
         
+        # 验证切片发送方式
+        if self.HLS_DELIVERY_MODE not in ('direct', 'x-accel-redirect', 'x-sendfile'):
+            errors.append(f"Invalid HLS delivery mode: {self.HLS_DELIVERY_MODE}")
+        
+        # 验证准入策略
+        if self.ADMISSION_POLICY not in ('queue', 'reject', 'evict'):
+            errors.append(f"Invalid admission policy: {self.ADMISSION_POLICY}")
+        
+        # 验证多码率阶梯
+        if self.ABR_ENABLED:
+            names = []
+            for variant in self.ABR_VARIANTS:
+                if not isinstance(variant, dict) or not variant.get('name') or not variant.get('bitrate'):
+                    errors.append(f"Invalid ABR variant {variant}: name and bitrate are required")
+                else:
+                    names.append(str(variant['name']))
+            if not names:
+                errors.append("ABR ladder requires at least one variant")
+            elif len(set(names)) != len(names):
+                errors.append(f"Duplicate ABR variant names: {names}")
+        
+        # 验证预热计划
+        for entry in self.PREWARM_SCHEDULE:
+            try:
+                if not entry['channel_id'] or not entry['stream_url']:
+                    raise ValueError('channel_id and stream_url are required')
+                for key in ('start', 'end'):
+                    datetime.strptime(entry[key], '%H:%M')
+            except (KeyError, TypeError, ValueError) as e:
+                errors.append(f"Invalid prewarm schedule entry {entry}: {str(e)}")
+        
         if errors:
             error_msg = "Configuration validation failed:\\n" + "\\n".join(errors)
             raise ValueError(error_msg)
@@ -241,6 +413,85 @@ class AudioServiceConfig:
     def FFMPEG_TUNE(self) -> str:
         return self._config['ffmpeg']['tune']
     
+    @property
+    def FFMPEG_LOG_BUFFER_LINES(self) -> int:
+        return self._config['ffmpeg']['log_buffer_lines']
+    
+    @property
+    def FFMPEG_PROGRESS_ENABLED(self) -> bool:
+        return self._config['ffmpeg']['progress']
+    
+    # 编码直通配置属性
+    @property
+    def PASSTHROUGH_ENABLED(self) -> bool:
+        return self._config['passthrough']['enabled']
+    
+    @property
+    def FFPROBE_PATH(self) -> str:
+        return self._config['passthrough']['ffprobe_path'] or os.path.join(os.path.dirname(self.FFMPEG_PATH), 'ffprobe')
+    
+    @property
+    def PASSTHROUGH_CODECS(self) -> list:
+        return self._config['passthrough']['codecs'] or []
+    
+    @property
+    def PASSTHROUGH_MAX_BITRATE(self) -> int:
+        return self._config['passthrough']['max_bitrate']
+    
+    @property
+    def PASSTHROUGH_PROBE_TIMEOUT(self) -> float:
+        return self._config['passthrough']['probe_timeout']
+    
+    @property
+    def PASSTHROUGH_CACHE_TTL(self) -> float:
+        return self._config['passthrough']['cache_ttl']
+    
+    @property
+    def PASSTHROUGH_FAILURE_TTL(self) -> float:
+        return self._config['passthrough']['failure_ttl']
+    
+    @property
+    def PASSTHROUGH_COST_PERCENT(self) -> float:
+        return self._config['passthrough']['cost_percent']
+    
+    # 探测结果缓存配置属性
+    @property
+    def PROBE_CACHE_ENABLED(self) -> bool:
+        return self._config['probe_cache']['enabled']
+    
+    @property
+    def PROBE_CACHE_PATH(self) -> str:
+        return self._config['probe_cache']['path'] or os.path.join(self.LOCK_DIR, 'probe_cache.json')
+    
+    @property
+    def PROBE_CACHE_FAST_START(self) -> bool:
+        return self._config['probe_cache']['fast_start']
+    
+    @property
+    def FAST_START_PROBESIZE(self) -> int:
+        return self._config['probe_cache']['probesize']
+    
+    @property
+    def FAST_START_ANALYZEDURATION(self) -> int:
+        return self._config['probe_cache']['analyzeduration']
+    
+    # 多码率阶梯配置属性
+    @property
+    def ABR_ENABLED(self) -> bool:
+        return self._config['abr']['enabled']
+    
+    @property
+    def ABR_CHANNELS(self) -> list:
+        return [str(channel_id) for channel_id in self._config['abr']['channels'] or []]
+    
+    @property
+    def ABR_COST_PERCENT(self) -> float:
+        return self._config['abr']['cost_percent']
+    
+    @property
+    def ABR_VARIANTS(self) -> list:
+        return self._config['abr']['variants'] or []
+    
     # HLS 配置属性
     @property
     def HLS_OUTPUT_DIR(self) -> str:
@@ -270,6 +521,157 @@ class AudioServiceConfig:
     def HLS_CLEANUP_INTERVAL(self) -> int:
         return self._config['hls']['cleanup_interval']
     
+    @property
+    def HLS_WATCHER_BACKEND(self) -> str:
+        return self._config['hls']['watcher_backend']
+    
+    @property
+    def HLS_WATCHER_POLL_INTERVAL(self) -> float:
+        return self._config['hls']['watcher_poll_interval']
+    
+    @property
+    def HLS_PLAYLIST_WAIT_TIMEOUT(self) -> float:
+        return self._config['hls']['playlist_wait_timeout']
+    
+    @property
+    def HLS_BLOCKING_RELOAD(self) -> bool:
+        return self._config['hls']['blocking_reload']
+    
+    @property
+    def HLS_DELIVERY_MODE(self) -> str:
+        return self._config['hls']['delivery_mode']
+    
+    @property
+    def HLS_X_ACCEL_PREFIX(self) -> str:
+        return self._config['hls']['x_accel_prefix']
+    
+    # 切片缓存配置属性
+    @property
+    def SEGMENT_CACHE_ENABLED(self) -> bool:
+        return self._config['segment_cache']['enabled']
+    
+    @property
+    def SEGMENT_CACHE_MAX_BYTES(self) -> int:
+        return self._config['segment_cache']['max_size_mb'] * 1024 * 1024
+    
+    @property
+    def SEGMENT_CACHE_MAX_ENTRY_BYTES(self) -> int:
+        return self._config['segment_cache']['max_segment_size_kb'] * 1024
+    
+    # 进程自动重启配置属性
+    @property
+    def RESTART_ENABLED(self) -> bool:
+        return self._config['restart']['enabled']
+    
+    @property
+    def RESTART_MAX_RETRIES(self) -> int:
+        return self._config['restart']['max_retries']
+    
+    @property
+    def RESTART_INITIAL_DELAY(self) -> float:
+        return self._config['restart']['initial_delay']
+    
+    @property
+    def RESTART_MAX_DELAY(self) -> float:
+        return self._config['restart']['max_delay']
+    
+    @property
+    def RESTART_JITTER(self) -> float:
+        return self._config['restart']['jitter']
+    
+    @property
+    def RESTART_STABLE_AFTER(self) -> float:
+        return self._config['restart']['stable_after']
+    
+    # 上游主机熔断配置属性
+    @property
+    def CIRCUIT_BREAKER_ENABLED(self) -> bool:
+        return self._config['circuit_breaker']['enabled']
+    
+    @property
+    def CIRCUIT_BREAKER_FAILURE_THRESHOLD(self) -> int:
+        return self._config['circuit_breaker']['failure_threshold']
+    
+    @property
+    def CIRCUIT_BREAKER_OPEN_SECONDS(self) -> float:
+        return self._config['circuit_breaker']['open_seconds']
+    
+    @property
+    def CIRCUIT_BREAKER_MAX_OPEN_SECONDS(self) -> float:
+        return self._config['circuit_breaker']['max_open_seconds']
+    
+    # 转码准入控制配置属性
+    @property
+    def ADMISSION_ENABLED(self) -> bool:
+        return self._config['admission']['enabled']
+    
+    @property
+    def ADMISSION_MAX_PROCESSES(self) -> int:
+        return self._config['admission']['max_processes']
+    
+    @property
+    def ADMISSION_CPU_BUDGET(self) -> float:
+        return self._config['admission']['cpu_budget_percent']
+    
+    @property
+    def ADMISSION_TRANSCODE_COST(self) -> float:
+        return self._config['admission']['transcode_cost_percent']
+    
+    @property
+    def ADMISSION_POLICY(self) -> str:
+        return self._config['admission']['policy']
+    
+    @property
+    def ADMISSION_QUEUE_TIMEOUT(self) -> float:
+        return self._config['admission']['queue_timeout']
+    
+    @property
+    def ADMISSION_PINNED_CHANNELS(self) -> list:
+        return [str(channel_id) for channel_id in self._config['admission']['pinned_channels'] or []]
+    
+    @property
+    def ADMISSION_VIP_CHANNELS(self) -> list:
+        return [str(channel_id) for channel_id in self._config['admission']['vip_channels'] or []]
+    
+    # 进程资源采样配置属性
+    @property
+    def PROCESS_SAMPLER_ENABLED(self) -> bool:
+        return self._config['process_sampler']['enabled']
+    
+    @property
+    def PROCESS_SAMPLER_INTERVAL(self) -> float:
+        return self._config['process_sampler']['interval']
+    
+    @property
+    def PROCESS_SAMPLER_HISTORY_SIZE(self) -> int:
+        return self._config['process_sampler']['history_size']
+    
+    # 进程注册表配置属性
+    @property
+    def PROCESS_REGISTRY_ENABLED(self) -> bool:
+        return self._config['process_registry']['enabled']
+    
+    @property
+    def PROCESS_REGISTRY_PATH(self) -> str:
+        return self._config['process_registry']['path'] or os.path.join(self.LOCK_DIR, 'ffmpeg_registry.json')
+    
+    @property
+    def PROCESS_REGISTRY_DETACH_ON_SHUTDOWN(self) -> bool:
+        return self._config['process_registry']['detach_on_shutdown']
+    
+    # 独立听众估算配置属性
+    @property
+    def LISTENER_HLL_PRECISION(self) -> int:
+        return self._config['listeners']['hll_precision']
+    
+    @property
+    def LISTENER_WINDOW_SECONDS(self) -> int:
+        return self._config['listeners']['window_seconds']
+    
+    @property
+    def LISTENER_WINDOW_BUCKETS(self) -> int:
+        return self._config['listeners']['window_buckets']
+    
     # 并发控制配置属性
     @property
     def LOCK_DIR(self) -> str:
@@ -288,6 +690,84 @@ class AudioServiceConfig:
     def IDLE_CHECK_INTERVAL(self) -> int:
         return self._config['idle_process']['check_interval']
     
+    @property
+    def IDLE_ADAPTIVE_ENABLED(self) -> bool:
+        return self._config['idle_process']['adaptive']
+    
+    @property
+    def IDLE_MIN_LINGER(self) -> float:
+        return self._config['idle_process']['min_linger']
+    
+    @property
+    def IDLE_MAX_LINGER(self) -> float:
+        return self._config['idle_process']['max_linger']
+    
+    @property
+    def IDLE_BUSY_REQUESTS_PER_HOUR(self) -> float:
+        return self._config['idle_process']['busy_requests_per_hour']
+    
+    @property
+    def IDLE_REJOIN_WINDOW(self) -> float:
+        return self._config['idle_process']['rejoin_window']
+    
+    # 输出停滞看门狗配置属性
+    @property
+    def STALL_WATCHDOG_ENABLED(self) -> bool:
+        return self._config['stall_watchdog']['enabled']
+    
+    @property
+    def STALL_TIMEOUT(self) -> float:
+        return self._config['stall_watchdog']['stall_factor'] * self.HLS_SEGMENT_DURATION
+    
+    @property
+    def STALL_STARTUP_GRACE(self) -> float:
+        return self._config['stall_watchdog']['startup_grace']
+    
+    @property
+    def STALL_CHECK_INTERVAL(self) -> float:
+        return self._config['stall_watchdog']['check_interval']
+    
+    # 频道预热配置属性
+    @property
+    def PREWARM_ENABLED(self) -> bool:
+        return self._config['prewarm']['enabled']
+    
+    @property
+    def PREWARM_INTERVAL(self) -> float:
+        return self._config['prewarm']['interval']
+    
+    @property
+    def PREWARM_LEAD_TIME(self) -> float:
+        return self._config['prewarm']['lead_time']
+    
+    @property
+    def PREWARM_JOIN_GRACE(self) -> float:
+        return self._config['prewarm']['join_grace']
+    
+    @property
+    def PREWARM_MIN_REQUESTS_PER_HOUR(self) -> float:
+        return self._config['prewarm']['min_requests_per_hour']
+    
+    @property
+    def PREWARM_MAX_CHANNELS(self) -> int:
+        return self._config['prewarm']['max_channels']
+    
+    @property
+    def PREWARM_MAX_UTILIZATION(self) -> float:
+        return self._config['prewarm']['max_utilization']
+    
+    @property
+    def PREWARM_HISTORY_DECAY(self) -> float:
+        return self._config['prewarm']['history_decay']
+    
+    @property
+    def PREWARM_STATE_PATH(self) -> str:
+        return self._config['prewarm']['state_path'] or os.path.join(self.LOCK_DIR, 'prewarm_state.json')
+    
+    @property
+    def PREWARM_SCHEDULE(self) -> list:
+        return self._config['prewarm']['schedule'] or []
+    
     # 资源清理配置属性
     @property
     def CLEANUP_INTERVAL(self) -> int:
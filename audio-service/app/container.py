@@ -4,6 +4,7 @@
 管理所有组件的生命周期和依赖关系。
 """
 
+import os
 import logging
 import threading
 from typing import Optional, Dict, Any
@@ -13,8 +14,26 @@ from app.config import config
 from app.concurrency_control import ConcurrencyControl
 from app.process_manager import ProcessManager
 from app.idle_process_monitor import IdleProcessMonitor
+from app.linger_policy import LingerPolicy
 from app.resource_cleaner import ResourceCleaner
-from app.error_handler import ErrorHandler
+from app.error_handler import ErrorHandler, ErrorType
+from app.hls_watcher import HLSWatcher
+from app.segment_cache import SegmentCache
+from app.playlist_tracker import PlaylistTracker
+from app.activity_tracker import ActivityTracker
+from app.listener_estimator import ListenerEstimator
+from app.stderr_drainer import StderrDrainer
+from app.process_supervisor import ProcessSupervisor
+from app.restart_policy import RestartPolicy
+from app.circuit_breaker import CircuitBreaker
+from app.admission_controller import AdmissionController
+from app.process_sampler import ProcessSampler
+from app.prewarmer import ChannelPrewarmer, ScheduleEntry
+from app.stall_watchdog import StallWatchdog
+from app.process_registry import ProcessRegistry
+from app.progress_monitor import ProgressMonitor
+from app.stream_probe import StreamProbe
+from app.abr_ladder import AbrLadder, Variant
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +50,10 @@ class ServiceContainer:
         self._initialized = False
         self._lock = threading.RLock()
         self._shutdown_event = threading.Event()
+        # 初始状态视为已停止，start() 时清除
+        self._shutdown_event.set()
+        # 本次关闭是否为重启（保留 FFmpeg 进程，由重启后的服务接管）
+        self._restart_pending = False
         
         logger.info("ServiceContainer initialized")
     
@@ -58,22 +81,129 @@ class ServiceContainer:
                 )
                 logger.debug("ErrorHandler initialized")
                 
-                # 3. 初始化进程管理器
+                # 3. 初始化上游熔断器（由网络错误恢复回调驱动）
+                if config.CIRCUIT_BREAKER_ENABLED:
+                    self._services['circuit_breaker'] = CircuitBreaker(
+                        failure_threshold=config.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                        open_seconds=config.CIRCUIT_BREAKER_OPEN_SECONDS,
+                        max_open_seconds=config.CIRCUIT_BREAKER_MAX_OPEN_SECONDS
+                    )
+                    self._services['error_handler'].register_recovery_callback(
+                        ErrorType.NETWORK_ERROR, self._services['circuit_breaker'].handle_network_error
+                    )
+                    logger.debug("CircuitBreaker initialized")
+                
+                # 4. 初始化转码准入控制、stderr 读取器、进程监督器和进程管理器
+                if config.ADMISSION_ENABLED:
+                    self._services['admission_controller'] = AdmissionController(
+                        max_processes=config.ADMISSION_MAX_PROCESSES,
+                        cpu_budget=config.ADMISSION_CPU_BUDGET,
+                        default_cost=config.ADMISSION_TRANSCODE_COST,
+                        policy=config.ADMISSION_POLICY,
+                        queue_timeout=config.ADMISSION_QUEUE_TIMEOUT,
+                        pinned_channels=config.ADMISSION_PINNED_CHANNELS,
+                        vip_channels=config.ADMISSION_VIP_CHANNELS
+                    )
+                self._services['stderr_drainer'] = StderrDrainer(
+                    max_lines=config.FFMPEG_LOG_BUFFER_LINES
+                )
+                self._services['process_supervisor'] = ProcessSupervisor()
+                if config.FFMPEG_PROGRESS_ENABLED:
+                    self._services['progress_monitor'] = ProgressMonitor()
+                if config.PROCESS_REGISTRY_ENABLED:
+                    self._services['process_registry'] = ProcessRegistry(config.PROCESS_REGISTRY_PATH)
+                if config.PASSTHROUGH_ENABLED or config.PROBE_CACHE_ENABLED:
+                    if os.access(config.FFPROBE_PATH, os.X_OK):
+                        self._services['stream_probe'] = StreamProbe(
+                            ffprobe_path=config.FFPROBE_PATH,
+                            copy_codecs=config.PASSTHROUGH_CODECS,
+                            max_copy_bitrate=config.PASSTHROUGH_MAX_BITRATE,
+                            probe_timeout=config.PASSTHROUGH_PROBE_TIMEOUT,
+                            cache_ttl=config.PASSTHROUGH_CACHE_TTL,
+                            failure_ttl=config.PASSTHROUGH_FAILURE_TTL,
+                            copy_enabled=config.PASSTHROUGH_ENABLED,
+                            cache_path=config.PROBE_CACHE_PATH if config.PROBE_CACHE_ENABLED else None
+                        )
+                    else:
+                        logger.warning(f"ffprobe not found at {config.FFPROBE_PATH}, "
+                                       f"codec passthrough and probe cache disabled")
+                if config.ABR_ENABLED:
+                    self._services['abr_ladder'] = AbrLadder(
+                        variants=[Variant(**variant) for variant in config.ABR_VARIANTS],
+                        channels=config.ABR_CHANNELS,
+                        playlist_name=config.HLS_PLAYLIST_NAME
+                    )
                 self._services['process_manager'] = ProcessManager(
                     concurrency_control=self._services['concurrency_control'],
-                    error_handler=self._services['error_handler']
+                    error_handler=self._services['error_handler'],
+                    stderr_drainer=self._services['stderr_drainer'],
+                    supervisor=self._services['process_supervisor'],
+                    restart_policy=RestartPolicy(
+                        enabled=config.RESTART_ENABLED,
+                        max_retries=config.RESTART_MAX_RETRIES,
+                        initial_delay=config.RESTART_INITIAL_DELAY,
+                        max_delay=config.RESTART_MAX_DELAY,
+                        jitter=config.RESTART_JITTER,
+                        stable_after=config.RESTART_STABLE_AFTER
+                    ),
+                    circuit_breaker=self._services.get('circuit_breaker'),
+                    admission_controller=self._services.get('admission_controller'),
+                    process_registry=self._services.get('process_registry'),
+                    progress_monitor=self._services.get('progress_monitor'),
+                    stream_probe=self._services.get('stream_probe'),
+                    abr_ladder=self._services.get('abr_ladder')
                 )
                 logger.debug("ProcessManager initialized")
                 
-                # 4. 初始化空闲进程监控器
+                # 5. 初始化活动跟踪器、听众估算器和空闲进程监控器
+                self._services['activity_tracker'] = ActivityTracker()
+                self._services['listener_estimator'] = ListenerEstimator(
+                    precision=config.LISTENER_HLL_PRECISION,
+                    window_seconds=config.LISTENER_WINDOW_SECONDS,
+                    buckets=config.LISTENER_WINDOW_BUCKETS
+                )
                 self._services['idle_monitor'] = IdleProcessMonitor(
                     process_manager=self._services['process_manager'],
                     idle_timeout=config.IDLE_TIMEOUT,
-                    check_interval=config.IDLE_CHECK_INTERVAL
+                    check_interval=config.IDLE_CHECK_INTERVAL,
+                    activity_tracker=self._services['activity_tracker'],
+                    linger_policy=LingerPolicy(
+                        enabled=config.IDLE_ADAPTIVE_ENABLED,
+                        min_linger=config.IDLE_MIN_LINGER,
+                        max_linger=config.IDLE_MAX_LINGER,
+                        busy_requests_per_hour=config.IDLE_BUSY_REQUESTS_PER_HOUR,
+                        rejoin_window=config.IDLE_REJOIN_WINDOW
+                    )
                 )
+                # 进程启动即开始跟踪空闲时间
+                self._services['process_manager'].on_process_started = self._services['idle_monitor'].track
                 logger.debug("IdleProcessMonitor initialized")
                 
-                # 5. 初始化资源清理器
+                # 驱逐策略按独立听众数选择频道
+                if 'admission_controller' in self._services:
+                    self._services['admission_controller'].popularity = self._services['listener_estimator'].estimate
+                    self._services['admission_controller'].evict = self._services['process_manager'].stop_process
+                
+                # 频道预热器
+                if config.PREWARM_ENABLED:
+                    self._services['prewarmer'] = ChannelPrewarmer(
+                        process_manager=self._services['process_manager'],
+                        activity_tracker=self._services['activity_tracker'],
+                        idle_monitor=self._services['idle_monitor'],
+                        admission_controller=self._services.get('admission_controller'),
+                        schedule=[ScheduleEntry.from_config(entry) for entry in config.PREWARM_SCHEDULE],
+                        interval=config.PREWARM_INTERVAL,
+                        lead_time=config.PREWARM_LEAD_TIME,
+                        join_grace=config.PREWARM_JOIN_GRACE,
+                        min_requests_per_hour=config.PREWARM_MIN_REQUESTS_PER_HOUR,
+                        max_channels=config.PREWARM_MAX_CHANNELS,
+                        max_utilization=config.PREWARM_MAX_UTILIZATION,
+                        history_decay=config.PREWARM_HISTORY_DECAY,
+                        state_path=config.PREWARM_STATE_PATH
+                    )
+                    logger.debug("ChannelPrewarmer initialized")
+                
+                # 6. 初始化资源清理器
                 self._services['resource_cleaner'] = ResourceCleaner(
                     hls_output_dir=config.HLS_OUTPUT_DIR,
                     cleanup_interval=config.CLEANUP_INTERVAL,
@@ -81,6 +211,55 @@ class ServiceContainer:
                 )
                 logger.debug("ResourceCleaner initialized")
                 
+                # 进程资源采样器
+                if config.PROCESS_SAMPLER_ENABLED:
+                    self._services['process_sampler'] = ProcessSampler(
+                        get_pids=self._services['process_manager'].get_pids,
+                        interval=config.PROCESS_SAMPLER_INTERVAL,
+                        history_size=config.PROCESS_SAMPLER_HISTORY_SIZE
+                    )
+                    logger.debug("ProcessSampler initialized")
+                
+                # 7. 初始化 HLS 目录监视器
+                self._services['hls_watcher'] = HLSWatcher(
+                    hls_output_dir=config.HLS_OUTPUT_DIR,
+                    backend=config.HLS_WATCHER_BACKEND,
+                    poll_interval=config.HLS_WATCHER_POLL_INTERVAL
+                )
+                logger.debug("HLSWatcher initialized")
+                
+                # 8. 初始化切片缓存（切片交由前端服务器发送时无需缓存）
+                if config.SEGMENT_CACHE_ENABLED and config.HLS_DELIVERY_MODE == 'direct':
+                    self._services['segment_cache'] = SegmentCache(
+                        max_bytes=config.SEGMENT_CACHE_MAX_BYTES,
+                        max_entry_bytes=config.SEGMENT_CACHE_MAX_ENTRY_BYTES
+                    )
+                    self._services['hls_watcher'].subscribe(self._services['segment_cache'].handle_file_event)
+                    logger.debug("SegmentCache initialized")
+                
+                # 9. 初始化播放列表跟踪器
+                self._services['playlist_tracker'] = PlaylistTracker(
+                    playlist_name=config.HLS_PLAYLIST_NAME,
+                    blocking_reload=config.HLS_BLOCKING_RELOAD
+                )
+                self._services['hls_watcher'].subscribe(self._services['playlist_tracker'].handle_file_event)
+                logger.debug("PlaylistTracker initialized")
+                
+                # 进程管理器在播放列表跟踪器之后订阅，就绪 Future 完成时快照已可用
+                self._services['hls_watcher'].subscribe(self._services['process_manager'].handle_file_event)
+                
+                # 10. 初始化输出停滞看门狗
+                if config.STALL_WATCHDOG_ENABLED:
+                    self._services['stall_watchdog'] = StallWatchdog(
+                        process_manager=self._services['process_manager'],
+                        stall_timeout=config.STALL_TIMEOUT,
+                        startup_timeout=config.STALL_STARTUP_GRACE,
+                        check_interval=config.STALL_CHECK_INTERVAL,
+                        progress_monitor=self._services.get('progress_monitor')
+                    )
+                    self._services['hls_watcher'].subscribe(self._services['stall_watchdog'].handle_file_event)
+                    logger.debug("StallWatchdog initialized")
+                
                 self._initialized = True
                 logger.info("All service components initialized successfully")
                 
@@ -108,6 +287,15 @@ class ServiceContainer:
                 # 启动后台服务
                 self._services['idle_monitor'].start()
                 self._services['resource_cleaner'].start()
+                self._services['hls_watcher'].start()
+                self._services['stderr_drainer'].start()
+                self._services['process_supervisor'].start()
+                if 'process_sampler' in self._services:
+                    self._services['process_sampler'].start()
+                if 'stall_watchdog' in self._services:
+                    self._services['stall_watchdog'].start()
+                if 'prewarmer' in self._services:
+                    self._services['prewarmer'].start()
                 
                 logger.info("All background services started successfully")
                 
@@ -133,11 +321,21 @@ class ServiceContainer:
                 # 设置关闭事件
                 self._shutdown_event.set()
                 
-                # 停止所有活跃进程
-                if 'process_manager' in self._services:
+                # 先停止看门狗，避免关闭过程中触发重启
+                if 'stall_watchdog' in self._services:
+                    self._services['stall_watchdog'].stop()
+                
+                if 'prewarmer' in self._services:
+                    self._services['prewarmer'].stop()
+                
+                # 停止所有活跃进程（重启时保留进程，由重启后的服务通过进程注册表接管）
+                detach = self._restart_pending or config.PROCESS_REGISTRY_DETACH_ON_SHUTDOWN
+                if 'process_registry' in self._services and detach:
+                    self._services['process_manager'].detach_processes()
+                elif 'process_manager' in self._services:
                     processes = self._services['process_manager'].list_processes()
                     for process_info in processes:
-                        if process_info.status.value == "running":
+                        if process_info.status.value in ("running", "starting"):
                             logger.info(f"Stopping process for channel {process_info.channel_id}")
                             self._services['process_manager'].stop_process(process_info.channel_id)
                 
@@ -148,11 +346,29 @@ class ServiceContainer:
                 if 'resource_cleaner' in self._services:
                     self._services['resource_cleaner'].stop()
                 
+                if 'process_sampler' in self._services:
+                    self._services['process_sampler'].stop()
+                
+                if 'hls_watcher' in self._services:
+                    self._services['hls_watcher'].stop()
+                
+                if 'stderr_drainer' in self._services:
+                    self._services['stderr_drainer'].stop()
+                
+                if 'process_supervisor' in self._services:
+                    self._services['process_supervisor'].stop()
+                
                 logger.info("All services stopped successfully")
                 
             except Exception as e:
                 logger.error(f"Error stopping services: {str(e)}")
     
+    def request_restart(self):
+        """将接下来的关闭标记为重启：FFmpeg 进程继续运行，由重启后的服务接管"""
+        if 'process_registry' not in self._services:
+            logger.warning("Process registry is disabled, FFmpeg processes will be stopped on restart")
+        self._restart_pending = True
+    
     def shutdown(self):
         """关闭容器并清理所有资源"""
         with self._lock:
@@ -193,14 +409,15 @@ class ServiceContainer:
     
     def get_service(self, service_name: str):
         """获取指定的服务实例"""
-        with self._lock:
-            if not self._initialized:
-                raise RuntimeError("ServiceContainer is not initialized")
-            
-            if service_name not in self._services:
-                raise ValueError(f"Service '{service_name}' not found")
-            
-            return self._services[service_name]
+        # 只读查找不加锁：HLS 请求热路径会频繁调用，而 get_status() 持锁期间会采样 CPU
+        if not self._initialized:
+            raise RuntimeError("ServiceContainer is not initialized")
+        
+        service = self._services.get(service_name)
+        if service is None:
+            raise ValueError(f"Service '{service_name}' not found")
+        
+        return service
     
     def is_running(self) -> bool:
         """检查服务是否在运行"""
@@ -226,17 +443,33 @@ class ServiceContainer:
                 health_status = error_handler.check_system_health()
                 error_stats = error_handler.get_error_statistics()
                 
+                segment_cache = self._services.get('segment_cache')
+                circuit_breaker = self._services.get('circuit_breaker')
+                admission_controller = self._services.get('admission_controller')
+                process_sampler = self._services.get('process_sampler')
+                process_registry = self._services.get('process_registry')
+                progress_monitor = self._services.get('progress_monitor')
+                stall_watchdog = self._services.get('stall_watchdog')
+                abr_ladder = self._services.get('abr_ladder')
+                prewarmer = self._services.get('prewarmer')
+                stream_probe = self._services.get('stream_probe')
+                
                 return {
                     'initialized': self._initialized,
                     'running': self.is_running(),
                     'services': {
                         'process_manager': {
                             'total_processes': len(processes),
-                            'active_processes': len(active_processes)
-                        },
-                        'idle_monitor': {
-                            'running': self._services['idle_monitor'].is_running()
+                            'active_processes': len(active_processes),
+                            'adopted_processes': sum(1 for p in processes if p.adopted),
+                            'copy_mode_processes': sum(1 for p in active_processes if p.mode == 'copy'),
+                            'fast_start_processes': sum(1 for p in active_processes if p.input_format),
+                            'abr_processes': sum(1 for p in active_processes if p.variants),
+                            'process_startup': process_manager.get_startup_stats()
                         },
+                        'idle_monitor': self._services['idle_monitor'].get_status(),
+                        'activity_tracker': self._services['activity_tracker'].get_status(),
+                        'listener_estimator': self._services['listener_estimator'].get_status(),
                         'resource_cleaner': {
                             'running': self._services['resource_cleaner'].is_running()
                         },
@@ -246,7 +479,21 @@ class ServiceContainer:
                         'error_handler': {
                             'total_errors': error_stats['total_errors'],
                             'recovery_rate': error_stats['recovery_rate']
-                        }
+                        },
+                        'hls_watcher': self._services['hls_watcher'].get_status(),
+                        'stderr_drainer': self._services['stderr_drainer'].get_status(),
+                        'process_supervisor': self._services['process_supervisor'].get_status(),
+                        'process_sampler': process_sampler.get_status() if process_sampler else {'enabled': False},
+                        'process_registry': process_registry.get_status() if process_registry else {'enabled': False},
+                        'progress_monitor': progress_monitor.get_status() if progress_monitor else {'enabled': False},
+                        'stall_watchdog': stall_watchdog.get_status() if stall_watchdog else {'enabled': False},
+                        'prewarmer': prewarmer.get_status() if prewarmer else {'enabled': False},
+                        'stream_probe': stream_probe.get_status() if stream_probe else {'enabled': False},
+                        'abr_ladder': abr_ladder.get_status() if abr_ladder else {'enabled': False},
+                        'playlist_tracker': self._services['playlist_tracker'].get_status(),
+                        'segment_cache': segment_cache.get_stats() if segment_cache else {'enabled': False},
+                        'circuit_breaker': circuit_breaker.get_status() if circuit_breaker else {'enabled': False},
+                        'admission_controller': admission_controller.get_status() if admission_controller else {'enabled': False}
                     },
                     'system_health': health_status
                 }
@@ -25,6 +25,7 @@ class ErrorType(Enum):
     DISK_SPACE_ERROR = "disk_space_error"
     PROCESS_CRASH = "process_crash"
     FFMPEG_ERROR = "ffmpeg_error"
+    OUTPUT_STALL = "output_stall"
     SYSTEM_ERROR = "system_error"
 
 
@@ -220,9 +221,11 @@ class ProcessCrashDetector:
     
     @staticmethod
     def is_process_alive(pid: int) -> bool:
-        """检查进程是否存活"""
+        """检查进程是否存活（僵尸进程视为已退出：接管的进程由 init 回收，可能短暂处于僵尸状态）"""
         try:
-            return psutil.pid_exists(pid)
+            return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+        except psutil.NoSuchProcess:
+            return False
         except Exception:
             return False
     
@@ -291,6 +294,7 @@ class ErrorHandler:
             ErrorType.DISK_SPACE_ERROR: [],
             ErrorType.PROCESS_CRASH: [],
             ErrorType.FFMPEG_ERROR: [],
+            ErrorType.OUTPUT_STALL: [],
             ErrorType.SYSTEM_ERROR: []
         }
         self.lock = threading.RLock()
@@ -344,6 +348,10 @@ class ErrorHandler:
     
     def _detect_error_type(self, error_message: str, context: Optional[Dict] = None) -> ErrorType:
         """检测错误类型"""
+        # 输出停滞由看门狗主动终止进程，退出时的 stderr 不反映真实原因
+        if context and context.get('output_stalled'):
+            return ErrorType.OUTPUT_STALL
+        
         if NetworkErrorDetector.is_network_error(error_message):
             return ErrorType.NETWORK_ERROR
         
@@ -389,6 +397,8 @@ class ErrorHandler:
                 success = self._recover_process_crash(error_info)
             elif error_info.error_type == ErrorType.FFMPEG_ERROR:
                 success = self._recover_ffmpeg_error(error_info)
+            elif error_info.error_type == ErrorType.OUTPUT_STALL:
+                success = self._recover_output_stall(error_info)
             else:
                 success = self._recover_system_error(error_info)
             
@@ -474,10 +484,10 @@ class ErrorHandler:
                 channel_output_dir = os.path.join(self.hls_output_dir, error_info.channel_id)
                 if os.path.exists(channel_output_dir):
                     try:
-                        # 清理可能损坏的文件
-                        for file in os.listdir(channel_output_dir):
-                            file_path = os.path.join(channel_output_dir, file)
-                            if os.path.isfile(file_path):
+                        # 清理可能损坏的文件（包括多码率频道各档子目录中的文件）
+                        for root, _dirs, files in os.walk(channel_output_dir):
+                            for file in files:
+                                file_path = os.path.join(root, file)
                                 # 检查文件是否可能损坏（大小为0或修改时间很近）
                                 stat = os.stat(file_path)
                                 if stat.st_size == 0 or (time.time() - stat.st_mtime) < 10:
@@ -523,6 +533,20 @@ class ErrorHandler:
         
         return True
     
+    def _recover_output_stall(self, error_info: ErrorInfo) -> bool:
+        """恢复输出停滞"""
+        logger.info(f"Attempting output stall recovery for channel {error_info.channel_id}")
+        
+        # 停滞的进程已由看门狗终止，重启由上层逻辑处理
+        # 同一频道频繁停滞通常说明上游只接受连接不发送数据
+        
+        error_info.additional_info = error_info.additional_info or {}
+        error_info.additional_info.update({
+            'suggested_action': 'Check whether the upstream stream is still sending data'
+        })
+        
+        return True
+    
     def _recover_system_error(self, error_info: ErrorInfo) -> bool:
         """恢复系统错误"""
         logger.info(f"Attempting system error recovery for channel {error_info.channel_id}")
@@ -4,12 +4,25 @@ import time
 import logging
 import os
 import shutil
+import glob
 import psutil
 import fcntl
 from app.config import config
+from app.process_registry import (
+    ProcessRegistry, read_start_ticks, read_pid_index, LEGACY_LOCK_FILE_PATTERN as LOCK_FILE_PATTERN
+)
 
 logger = logging.getLogger(__name__)
 
+
+def _write_pid_index(lock_file, pid):
+    """在频道锁文件中记录 FFmpeg 的 PID 和启动时间（持有锁时调用）"""
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(f"{pid} {read_start_ticks(pid)}\n")
+    lock_file.flush()
+
+
 class FFmpegManager:
     def __init__(self):
         self.processes = {}
@@ -24,15 +37,21 @@ class FFmpegManager:
         self._start_hls_cleanup_thread()
     
     def _cleanup_existing_processes(self):
-        """清理系统中现有的FFmpeg进程，防止僵尸进程积累"""
+        """清理锁已释放但 FFmpeg 仍在运行的频道（按锁文件中的 PID 索引，不扫描进程表）"""
         try:
             logger.info("Cleaning up existing FFmpeg processes...")
-            for proc in psutil.process_iter(['pid', 'name']):
+            # 进程注册表中的 FFmpeg 由 ProcessManager 接管，不在此终止
+            registered_pids = set(ProcessRegistry(config.PROCESS_REGISTRY_PATH).load_pids())
+            for lock_file_path in glob.glob(LOCK_FILE_PATTERN.format('*')):
                 try:
-                    if proc.info['name'] == 'ffmpeg':
-                        logger.info(f"Killing existing FFmpeg process with PID {proc.info['pid']}")
-                        self._terminate_process(proc)
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                    with open(lock_file_path, 'a') as lock_file:
+                        # 锁仍被持有说明频道正由其他 worker 管理
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        pid = read_pid_index(lock_file_path)
+                        if pid is not None and pid not in registered_pids:
+                            logger.info(f"Killing existing FFmpeg process with PID {pid}")
+                            self._terminate_process(psutil.Process(pid))
+                except (BlockingIOError, OSError, psutil.NoSuchProcess, psutil.AccessDenied):
                     continue
             logger.info("Existing FFmpeg processes cleanup completed")
         except Exception as e:
@@ -40,11 +59,12 @@ class FFmpegManager:
     
     def start_process(self, channel_id, stream_url, use_hls=False):
         # 检查进程是否已经在运行（使用文件锁确保跨进程唯一性）
-        lock_file_path = f"/tmp/ffmpeg_lock_{channel_id}.lock"
+        lock_file_path = LOCK_FILE_PATTERN.format(channel_id)
         
         # 尝试获取文件锁，确保每个频道只有一个进程运行
+        # 以追加模式打开：锁文件中记录着持有者的 PID 索引，不能在获取锁之前清空
         try:
-            lock_file = open(lock_file_path, 'w')
+            lock_file = open(lock_file_path, 'a+')
             try:
                 # 尝试获取非阻塞锁
                 fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
@@ -68,8 +88,8 @@ class FFmpegManager:
                         logger.info(f"Removing terminated FFmpeg process for channel {channel_id}")
                         del self.processes[channel_id]
                 
-                # 检查系统中是否存在该频道的其他FFmpeg进程，如果有则清理
-                self._cleanup_channel_processes(channel_id)
+                # 清理该频道上一个持有者遗留的FFmpeg进程
+                self._cleanup_channel_processes(channel_id, lock_file_path)
                 
                 # 创建频道专用的HLS输出目录
                 channel_hls_dir = os.path.join(config.HLS_OUTPUT_DIR, str(channel_id))
@@ -156,8 +176,9 @@ class FFmpegManager:
                         
                         raise Exception(f'FFmpeg failed with code {process.returncode}: {stderr_output}')
                     
-                    # 将进程添加到字典中
+                    # 将进程添加到字典中，并在锁文件中记录 PID 索引
                     self.processes[channel_id] = process
+                    _write_pid_index(lock_file, process.pid)
                     logger.info(f'Started FFmpeg process for channel {channel_id}, use_hls={use_hls}, PID: {process.pid}')
                     
                     # 启动错误监控线程
@@ -208,33 +229,19 @@ class FFmpegManager:
                 pass
             raise
     
-    def _cleanup_channel_processes(self, channel_id):
-        """清理系统中指定频道的FFmpeg进程"""
+    def _cleanup_channel_processes(self, channel_id, lock_file_path):
+        """清理指定频道上一个锁持有者遗留的FFmpeg进程（调用方已持有频道锁）"""
         try:
-            logger.info(f"Cleaning up FFmpeg processes for channel {channel_id}...")
-            channel_hls_dir = os.path.join(config.HLS_OUTPUT_DIR, str(channel_id))
-            found_process = False
-            
-            for proc in psutil.process_iter(['pid', 'name']):
-                try:
-                    if proc.info['name'] == 'ffmpeg':
-                        try:
-                            cmdline = proc.cmdline()
-                            cmdline_str = ' '.join(cmdline)
-                            if channel_hls_dir in cmdline_str:
-                                found_process = True
-                                logger.info(f"Found existing FFmpeg process for channel {channel_id} with PID {proc.info['pid']}")
-                                self._terminate_process(proc)
-                                logger.info(f"Successfully terminated FFmpeg process for channel {channel_id} with PID {proc.info['pid']}")
-                        except (psutil.NoSuchProcess, psutil.AccessDenied):
-                            continue
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                    continue
-            
-            if not found_process:
+            pid = read_pid_index(lock_file_path)
+            if pid is None:
                 logger.info(f"No existing FFmpeg processes found for channel {channel_id}")
+                return
             
-            logger.info(f"FFmpeg processes cleanup for channel {channel_id} completed")
+            logger.info(f"Found existing FFmpeg process for channel {channel_id} with PID {pid}")
+            self._terminate_process(psutil.Process(pid))
+            logger.info(f"Successfully terminated FFmpeg process for channel {channel_id} with PID {pid}")
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
         except Exception as e:
             logger.error(f"Error cleaning up FFmpeg processes for channel {channel_id}: {str(e)}")
     
@@ -331,26 +338,16 @@ class FFmpegManager:
                     # 进程已终止，从字典中移除
                     del self.processes[channel_id]
         
-        # 然后检查系统中是否存在该频道的其他FFmpeg进程
-        channel_hls_dir = os.path.join(config.HLS_OUTPUT_DIR, str(channel_id))
-        for proc in psutil.process_iter(['pid', 'name']):
-            try:
-                if proc.info['name'] == 'ffmpeg':
-                    try:
-                        cmdline_str = ' '.join(proc.cmdline())
-                        if channel_hls_dir in cmdline_str and proc.status() != 'zombie':
-                            return True
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        continue
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                continue
+        # 然后按锁文件中的 PID 索引检查其他 worker 启动的进程（O(1)，不扫描进程表）
+        lock_file_path = LOCK_FILE_PATTERN.format(channel_id)
+        if read_pid_index(lock_file_path) is not None:
+            return True
         
         # 最后检查锁文件是否存在，如果存在，说明其他进程正在处理该频道
-        lock_file_path = f"/tmp/ffmpeg_lock_{channel_id}.lock"
         if os.path.exists(lock_file_path):
             # 检查锁文件是否被其他进程持有
             try:
-                with open(lock_file_path, 'w') as lock_file:
+                with open(lock_file_path, 'a') as lock_file:
                     fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
                     # 如果能获取锁，说明锁文件是残留的，删除它
                     os.remove(lock_file_path)
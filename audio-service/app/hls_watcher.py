@@ -0,0 +1,395 @@
+"""
+HLS 输出目录监视器
+
+监视 HLS 输出目录中各频道的文件变化（切片写入、播放列表更新、切片删除），
+并将事件分发给订阅者。优先使用 inotify，不可用时退化为单线程轮询扫描。
+
+多码率频道的各档输出位于频道目录下一级子目录中，事件的文件名为相对频道目录的路径
+（如 64k/segment_001.ts），事件仍归属于频道本身。
+"""
+
+import os
+import ctypes
+import ctypes.util
+import errno
+import select
+import struct
+import threading
+import logging
+from enum import Enum
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class HLSFileEvent(Enum):
+    """HLS 文件事件类型"""
+    WRITTEN = "written"  # 文件写入完成（新建或被原子替换）
+    DELETED = "deleted"  # 文件被删除
+
+
+# 订阅回调签名: callback(event, channel_id, filename, file_path)
+# filename 为相对频道目录的路径，子目录中的文件形如 "<子目录>/<文件名>"
+HLSEventCallback = Callable[[HLSFileEvent, str, str, str], None]
+
+
+# inotify 常量（见 <sys/inotify.h>）
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = os.O_CLOEXEC
+
+_ROOT_MASK = _IN_CREATE | _IN_MOVED_TO | _IN_ONLYDIR
+_CHANNEL_MASK = (_IN_CREATE | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_DELETE | _IN_MOVED_FROM | _IN_DELETE_SELF
+                 | _IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class _Inotify:
+    """基于 ctypes 的最小 inotify 封装"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError("inotify is not supported on this platform")
+
+        self.fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self) -> List[Tuple[int, int, str]]:
+        """读取所有待处理事件，返回 (wd, mask, name) 列表"""
+        events = []
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buf):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = buf[offset:offset + length].rstrip(b'\0').decode('utf-8', errors='replace')
+                offset += length
+                events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class HLSWatcher:
+    """
+    HLS 输出目录监视器
+
+    以频道目录为单位监视文件事件（包括频道目录下一级子目录中的文件）：
+    - 切片写入完成 / 播放列表被替换 -> WRITTEN
+    - 文件删除（ffmpeg delete_segments 或资源清理器）-> DELETED
+
+    所有订阅回调均在监视线程中同步执行，回调应保持轻量。
+    """
+
+    def __init__(self, hls_output_dir: str, backend: str = 'auto', poll_interval: float = 0.1):
+        self.hls_output_dir = Path(hls_output_dir)
+        self.requested_backend = backend
+        self.poll_interval = poll_interval
+        self.backend: Optional[str] = None
+
+        self._subscribers: List[HLSEventCallback] = []
+        self._subscribers_lock = threading.Lock()
+        self._events_dispatched = 0
+
+        self._running = False
+        self._thread: threading.Thread = None
+        self._stop_event = threading.Event()
+
+        logger.info(f"HLSWatcher initialized with backend={backend}, poll_interval={poll_interval}s")
+
+    def subscribe(self, callback: HLSEventCallback):
+        """注册文件事件回调"""
+        with self._subscribers_lock:
+            self._subscribers.append(callback)
+
+    def start(self):
+        """启动监视器"""
+        if self._running:
+            logger.warning("HLSWatcher is already running")
+            return
+
+        self.hls_output_dir.mkdir(parents=True, exist_ok=True)
+
+        inotify = None
+        if self.requested_backend in ('auto', 'inotify'):
+            try:
+                inotify = _Inotify()
+            except OSError as e:
+                if self.requested_backend == 'inotify':
+                    raise
+                logger.warning(f"inotify unavailable ({str(e)}), falling back to polling")
+
+        self.backend = 'inotify' if inotify else 'polling'
+        self._running = True
+        self._stop_event.clear()
+
+        if inotify:
+            target, args = self._inotify_loop, (inotify,)
+        else:
+            target, args = self._polling_loop, ()
+
+        self._thread = threading.Thread(target=target, args=args, name="HLSWatcher", daemon=True)
+        self._thread.start()
+
+        logger.info(f"HLSWatcher started ({self.backend})")
+
+    def stop(self):
+        """停止监视器"""
+        if not self._running:
+            logger.warning("HLSWatcher is not running")
+            return
+
+        logger.info("Stopping HLSWatcher...")
+
+        self._running = False
+        self._stop_event.set()
+
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+            if self._thread.is_alive():
+                logger.warning("HLSWatcher thread did not stop gracefully")
+
+        logger.info("HLSWatcher stopped")
+
+    def is_running(self) -> bool:
+        """检查监视器是否在运行"""
+        return self._running and self._thread and self._thread.is_alive()
+
+    def get_status(self) -> dict:
+        """获取监视器状态"""
+        return {
+            'running': self.is_running(),
+            'backend': self.backend,
+            'hls_output_dir': str(self.hls_output_dir),
+            'subscribers': len(self._subscribers),
+            'events_dispatched': self._events_dispatched
+        }
+
+    def _dispatch(self, event: HLSFileEvent, channel_id: str, filename: str):
+        """分发事件给所有订阅者"""
+        if filename.endswith('.tmp'):
+            return
+
+        file_path = str(self.hls_output_dir / channel_id / filename)
+        self._events_dispatched += 1
+
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+
+        for callback in subscribers:
+            try:
+                callback(event, channel_id, filename, file_path)
+            except Exception as e:
+                logger.error(f"Error in HLS event callback for {channel_id}/{filename}: {str(e)}")
+
+    def _list_channel_dirs(self) -> List[str]:
+        try:
+            return [entry.name for entry in os.scandir(self.hls_output_dir) if entry.is_dir()]
+        except OSError as e:
+            logger.error(f"Failed to list HLS output directory: {str(e)}")
+            return []
+
+    def _list_subdirs(self, channel_id: str) -> List[str]:
+        """列出频道目录下的子目录（多码率频道的各档输出）"""
+        try:
+            return [entry.name for entry in os.scandir(self.hls_output_dir / channel_id) if entry.is_dir()]
+        except OSError:
+            return []
+
+    def _list_files(self, channel_id: str, subdir: Optional[str] = None) -> Dict[str, Tuple[int, int]]:
+        """列出频道目录（或其子目录）中的文件及其 (mtime_ns, size)，键为相对频道目录的路径"""
+        files = {}
+        directory = self.hls_output_dir / channel_id
+        prefix = ''
+        if subdir:
+            directory = directory / subdir
+            prefix = f"{subdir}/"
+        try:
+            for entry in os.scandir(directory):
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files[prefix + entry.name] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    continue
+        except OSError:
+            pass
+        return files
+
+    # ---- inotify 后端 ----
+
+    def _inotify_loop(self, inotify: _Inotify):
+        """inotify 事件循环"""
+        logger.info("HLSWatcher loop started")
+
+        # wd -> (channel_id, 子目录)，频道目录本身的子目录为 None，根目录为 None
+        watches: Dict[int, Optional[Tuple[str, Optional[str]]]] = {}
+
+        def watch_directory(channel_id: str, subdir: Optional[str] = None):
+            path = self.hls_output_dir / channel_id
+            if subdir:
+                path = path / subdir
+            try:
+                wd = inotify.add_watch(str(path), _CHANNEL_MASK)
+            except OSError as e:
+                logger.debug(f"Failed to watch directory {path}: {str(e)}")
+                return
+            if wd in watches:
+                return
+            watches[wd] = (channel_id, subdir)
+            # 添加监视前可能已有文件写入，补发一次事件
+            for filename in self._list_files(channel_id, subdir):
+                self._dispatch(HLSFileEvent.WRITTEN, channel_id, filename)
+
+        def watch_channel(channel_id: str):
+            watch_directory(channel_id)
+            for subdir in self._list_subdirs(channel_id):
+                watch_directory(channel_id, subdir)
+
+        def rescan():
+            for channel_id in self._list_channel_dirs():
+                watch_channel(channel_id)
+
+        try:
+            root_wd = inotify.add_watch(str(self.hls_output_dir), _ROOT_MASK)
+            watches[root_wd] = None
+            rescan()
+
+            poller = select.poll()
+            poller.register(inotify.fd, select.POLLIN)
+
+            while self._running and not self._stop_event.is_set():
+                try:
+                    if not poller.poll(500):
+                        continue
+
+                    for wd, mask, name in inotify.read_events():
+                        if mask & _IN_Q_OVERFLOW:
+                            logger.warning("inotify queue overflow, rescanning HLS directories")
+                            rescan()
+                            continue
+
+                        if mask & _IN_IGNORED:
+                            watches.pop(wd, None)
+                            continue
+
+                        target = watches.get(wd)
+                        if wd == root_wd:
+                            if mask & _IN_ISDIR and name:
+                                watch_channel(name)
+                            continue
+
+                        if target is None or not name:
+                            continue
+
+                        channel_id, subdir = target
+                        if mask & _IN_ISDIR:
+                            # 只监视频道目录下一级子目录
+                            if subdir is None and mask & (_IN_CREATE | _IN_MOVED_TO):
+                                watch_directory(channel_id, name)
+                            continue
+
+                        filename = f"{subdir}/{name}" if subdir else name
+                        if mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO):
+                            self._dispatch(HLSFileEvent.WRITTEN, channel_id, filename)
+                        elif mask & (_IN_DELETE | _IN_MOVED_FROM):
+                            self._dispatch(HLSFileEvent.DELETED, channel_id, filename)
+
+                except Exception as e:
+                    logger.error(f"Error in HLS watcher loop: {str(e)}")
+                    if self._stop_event.wait(timeout=1):
+                        break
+        finally:
+            inotify.close()
+
+        logger.info("HLSWatcher loop stopped")
+
+    # ---- 轮询后端 ----
+
+    def _polling_loop(self):
+        """轮询扫描循环（inotify 不可用时使用）"""
+        logger.info("HLSWatcher loop started")
+
+        snapshots: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        pending: Dict[Tuple[str, str], Tuple[int, int]] = {}
+
+        while self._running and not self._stop_event.is_set():
+            try:
+                channel_ids = self._list_channel_dirs()
+
+                for channel_id in channel_ids:
+                    current = self._list_files(channel_id)
+                    for subdir in self._list_subdirs(channel_id):
+                        current.update(self._list_files(channel_id, subdir))
+                    previous = snapshots.get(channel_id, {})
+
+                    for filename, signature in current.items():
+                        key = (channel_id, filename)
+                        if previous.get(filename) == signature:
+                            # 上一轮发现的变化已稳定，视为写入完成
+                            if pending.get(key) == signature:
+                                del pending[key]
+                                self._dispatch(HLSFileEvent.WRITTEN, channel_id, filename)
+                        elif filename.endswith('.m3u8'):
+                            # 播放列表通过重命名原子替换，无需等待稳定
+                            self._dispatch(HLSFileEvent.WRITTEN, channel_id, filename)
+                        else:
+                            pending[key] = signature
+
+                    for filename in previous.keys() - current.keys():
+                        pending.pop((channel_id, filename), None)
+                        self._dispatch(HLSFileEvent.DELETED, channel_id, filename)
+
+                    snapshots[channel_id] = current
+
+                for channel_id in snapshots.keys() - set(channel_ids):
+                    for filename in snapshots.pop(channel_id):
+                        pending.pop((channel_id, filename), None)
+                        self._dispatch(HLSFileEvent.DELETED, channel_id, filename)
+
+            except Exception as e:
+                logger.error(f"Error in HLS watcher loop: {str(e)}")
+
+            if self._stop_event.wait(timeout=self.poll_interval):
+                break
+
+        logger.info("HLSWatcher loop stopped")
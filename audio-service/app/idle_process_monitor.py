@@ -2,35 +2,61 @@
 空闲进程监控器
 
 监控进程活动时间，自动停止长时间无活动的进程。
+
+每个频道在最小堆中保存一个空闲截止时间，监控线程睡眠到最早的截止时间再检查该频道；
+截止时间到达时如果期间有新的活动，按最新活动时间重新计算截止时间放回堆中（惰性更新），
+热路径上的活动上报无需接触堆。频道按时停止，且每次只检查到期的频道。
+
+启用 LingerPolicy 时，每个频道的保留时间按其请求速率和冷启动历史在上下限之间自适应。
 """
 
+import heapq
 import threading
 import time
 import logging
 from datetime import datetime, timezone
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from app.linger_policy import LingerPolicy, ChannelPopularity
 
 if TYPE_CHECKING:
     from app.process_manager import ProcessManager
+    from app.activity_tracker import ActivityTracker
 
 logger = logging.getLogger(__name__)
 
+# 不再运行的频道保留热度统计的时长 (秒)
+_POPULARITY_RETENTION = 86400
+
 
 class IdleProcessMonitor:
     """
     空闲进程监控器
     
-    定期检查进程的最后活动时间，自动停止超过空闲时间的进程。
+    按空闲截止时间检查进程的最后活动时间，自动停止超过空闲时间的进程。
+    活动时间取显式上报的活动时间与 HLS 请求计数中较新的一个。
+    进程启动（STARTING）时加入截止时间堆，从未产生输出的进程同样会按时停止；进程停止后移出。
     """
     
-    def __init__(self, process_manager: 'ProcessManager', idle_timeout: int = 300, check_interval: int = 60):
+    def __init__(self, process_manager: 'ProcessManager', idle_timeout: int = 300, check_interval: int = 60,
+                 activity_tracker: Optional['ActivityTracker'] = None,
+                 linger_policy: Optional[LingerPolicy] = None):
         self.process_manager = process_manager
-        self.idle_timeout = idle_timeout  # 空闲超时时间（秒）
-        self.check_interval = check_interval  # 检查间隔（秒）
+        self.activity_tracker = activity_tracker
+        self.idle_timeout = idle_timeout  # 空闲超时时间（秒），未启用自适应策略时对所有频道生效
+        self.linger_policy = linger_policy
+        self._popularity: Dict[str, ChannelPopularity] = {}
+        self._holds: Dict[str, float] = {}  # 频道 -> 保持运行到的时间（单调时钟），用于预热
+        self.check_interval = check_interval  # 请求计数清理间隔（秒）
+        
+        # (截止时间, 频道) 最小堆（单调时钟），与 _deadlines 不一致的条目已过期
+        self._heap: List[Tuple[float, str]] = []
+        self._deadlines: Dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._stopped_count = 0
         
         self._running = False
         self._thread: threading.Thread = None
-        self._stop_event = threading.Event()
         
         logger.info(f"IdleProcessMonitor initialized with idle_timeout={idle_timeout}s, check_interval={check_interval}s")
     
@@ -41,7 +67,10 @@ class IdleProcessMonitor:
             return
         
         self._running = True
-        self._stop_event.clear()
+        
+        # 接管的进程或启动前已在运行的进程
+        for channel_id in self.process_manager.get_pids():
+            self.track(channel_id, cold_start=False)
         
         self._thread = threading.Thread(
             target=self._monitor_loop,
@@ -60,8 +89,9 @@ class IdleProcessMonitor:
         
         logger.info("Stopping IdleProcessMonitor...")
         
-        self._running = False
-        self._stop_event.set()
+        with self._cond:
+            self._running = False
+            self._cond.notify()
         
         if self._thread and self._thread.is_alive():
             self._thread.join(timeout=5)
@@ -74,77 +104,235 @@ class IdleProcessMonitor:
         """检查监控器是否在运行"""
         return self._running and self._thread and self._thread.is_alive()
     
+    def track(self, channel_id: str, cold_start: bool = True):
+        """开始跟踪频道（已在跟踪时忽略）"""
+        with self._cond:
+            if channel_id in self._deadlines:
+                return
+            now = time.monotonic()
+            if cold_start and self._is_adaptive():
+                self._get_popularity(channel_id, now).record_cold_start(self.linger_policy.rejoin_window, now)
+            self._schedule(channel_id, now + self.get_linger(channel_id, now))
+    
+    def hold(self, channel_id: str, seconds: float):
+        """
+        在指定时间内不因空闲停止频道（预热的频道在预计的收听时间之前没有请求）
+        
+        Args:
+            channel_id: 频道 ID
+            seconds: 保持运行的秒数
+        """
+        with self._cond:
+            self._holds[channel_id] = time.monotonic() + seconds
+    
+    def release_hold(self, channel_id: str):
+        """取消频道的保持运行，之后按正常的空闲策略处理"""
+        with self._cond:
+            self._holds.pop(channel_id, None)
+    
+    def _is_adaptive(self) -> bool:
+        return self.linger_policy is not None and self.linger_policy.enabled
+    
+    def _get_popularity(self, channel_id: str, now: float) -> ChannelPopularity:
+        """获取频道热度统计（调用方持有 _cond）"""
+        popularity = self._popularity.get(channel_id)
+        if popularity is None:
+            popularity = self._popularity[channel_id] = ChannelPopularity(now)
+        return popularity
+    
+    def get_linger(self, channel_id: str, now: Optional[float] = None) -> float:
+        """
+        获取频道当前的空闲保留时间
+        
+        Returns:
+            float: 保留时间（秒），未启用自适应策略时为全局空闲超时
+        """
+        if not self._is_adaptive():
+            return self.idle_timeout
+        
+        now = now if now is not None else time.monotonic()
+        with self._cond:
+            popularity = self._get_popularity(channel_id, now)
+            if self.activity_tracker:
+                popularity.observe_requests(
+                    self.activity_tracker.get_request_count(channel_id), self.linger_policy.half_life, now
+                )
+            linger, reason = self.linger_policy.decide(self.idle_timeout, popularity, now)
+            if popularity.linger is None or abs(linger - popularity.linger) >= 1:
+                logger.debug(f"Linger time for channel {channel_id} set to {linger:.0f}s ({reason})")
+            popularity.linger = linger
+            popularity.reason = reason
+            return linger
+    
+    def _schedule(self, channel_id: str, deadline: float):
+        """设置频道的截止时间（调用方持有 _cond）"""
+        self._deadlines[channel_id] = deadline
+        heapq.heappush(self._heap, (deadline, channel_id))
+        if self._heap[0][1] == channel_id:
+            # 新的最早截止时间，唤醒监控线程重新计算睡眠时间
+            self._cond.notify()
+    
     def _monitor_loop(self):
-        """监控循环"""
+        """监控循环：睡眠到最早的截止时间"""
         logger.info("IdleProcessMonitor loop started")
         
-        while self._running and not self._stop_event.is_set():
+        next_prune = time.monotonic() + self.check_interval
+        
+        while True:
+            with self._cond:
+                if not self._running:
+                    break
+                now = time.monotonic()
+                wake_at = next_prune
+                if self._heap:
+                    wake_at = min(wake_at, self._heap[0][0])
+                if wake_at > now:
+                    self._cond.wait(timeout=wake_at - now)
+                    continue
+                due = self._pop_due(now)
+            
             try:
-                self._check_idle_processes()
+                for channel_id in due:
+                    self._check_channel(channel_id)
+                
+                if now >= next_prune:
+                    next_prune = now + self.check_interval
+                    # 清理已无进程且长时间无请求的频道计数
+                    self._prune(now)
             except Exception as e:
                 logger.error(f"Error in idle process monitoring: {str(e)}")
-            
-            # 等待下一次检查
-            if self._stop_event.wait(timeout=self.check_interval):
-                break
         
         logger.info("IdleProcessMonitor loop stopped")
     
-    def _check_idle_processes(self):
-        """检查空闲进程"""
-        current_time = datetime.now(timezone.utc)
-        stopped_count = 0
+    def _prune(self, now: float):
+        """清理长时间无请求的频道计数和热度统计"""
+        max_linger = self.idle_timeout
+        if self._is_adaptive():
+            max_linger = max(max_linger, self.linger_policy.max_linger)
+        # 计数只能在最长保留时间之后清理，否则仍在保留期内的频道会丢失最近的请求时间
+        if self.activity_tracker:
+            self.activity_tracker.prune(max_linger, self.process_manager.get_pids())
         
-        try:
-            processes = self.process_manager.list_processes()
-            running_processes = [p for p in processes if p.status.value == "running"]
-            
-            if not running_processes:
-                logger.debug("No running processes to check")
-                return
-            
-            logger.debug(f"Checking {len(running_processes)} running processes for idle timeout")
-            
-            for process_info in running_processes:
-                try:
-                    # 计算空闲时间
-                    idle_seconds = (current_time - process_info.last_activity_time).total_seconds()
-                    
-                    if idle_seconds > self.idle_timeout:
-                        logger.info(
-                            f"Process for channel {process_info.channel_id} has been idle for "
-                            f"{idle_seconds:.0f}s (threshold: {self.idle_timeout}s), stopping..."
-                        )
-                        
-                        # 停止空闲进程
-                        success = self.process_manager.stop_process(process_info.channel_id)
-                        if success:
-                            stopped_count += 1
-                            logger.info(f"Successfully stopped idle process for channel {process_info.channel_id}")
-                        else:
-                            logger.warning(f"Failed to stop idle process for channel {process_info.channel_id}")
-                    else:
-                        logger.debug(
-                            f"Channel {process_info.channel_id} idle for {idle_seconds:.0f}s "
-                            f"(threshold: {self.idle_timeout}s)"
-                        )
-                
-                except Exception as e:
-                    logger.error(f"Error checking idle status for channel {process_info.channel_id}: {str(e)}")
-            
-            if stopped_count > 0:
-                logger.info(f"Stopped {stopped_count} idle processes")
-            else:
-                logger.debug("No idle processes found")
-                
-        except Exception as e:
-            logger.error(f"Error during idle process check: {str(e)}")
+        with self._cond:
+            stale = [channel_id for channel_id, popularity in self._popularity.items()
+                     if channel_id not in self._deadlines and now - popularity.last_seen > _POPULARITY_RETENTION]
+            for channel_id in stale:
+                del self._popularity[channel_id]
+    
+    def _pop_due(self, now: float) -> List[str]:
+        """取出所有已到期的频道（调用方持有 _cond）"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, channel_id = heapq.heappop(self._heap)
+            if self._deadlines.get(channel_id) != deadline:
+                continue  # 已被重新安排
+            del self._deadlines[channel_id]
+            due.append(channel_id)
+        return due
+    
+    def _idle_seconds(self, process_info) -> float:
+        """计算频道的空闲时间"""
+        idle_seconds = (datetime.now(timezone.utc) - process_info.last_activity_time).total_seconds()
+        if self.activity_tracker:
+            request_idle = self.activity_tracker.idle_seconds(process_info.channel_id)
+            if request_idle is not None:
+                idle_seconds = min(idle_seconds, request_idle)
+        return idle_seconds
+    
+    def _check_channel(self, channel_id: str):
+        """检查到期的频道：空闲超时则停止，否则按最新活动时间重新安排"""
+        process_info = self.process_manager.get_process_status(channel_id)
+        if process_info is None or process_info.status.value not in ("running", "starting"):
+            # 进程已停止，重新启动时再次跟踪
+            return
+        
+        now = time.monotonic()
+        with self._cond:
+            hold_until = self._holds.get(channel_id)
+            if hold_until is not None:
+                if hold_until > now:
+                    self._schedule(channel_id, hold_until)
+                    return
+                del self._holds[channel_id]
+        
+        linger = self.get_linger(channel_id, now)
+        
+        if process_info.status.value == "starting":
+            with self._cond:
+                self._schedule(channel_id, now + linger)
+            return
+        
+        idle_seconds = self._idle_seconds(process_info)
+        if idle_seconds < linger:
+            logger.debug(
+                f"Channel {channel_id} idle for {idle_seconds:.0f}s "
+                f"(threshold: {linger:.0f}s)"
+            )
+            with self._cond:
+                self._schedule(channel_id, now + linger - idle_seconds)
+            return
+        
+        logger.info(
+            f"Process for channel {channel_id} has been idle for "
+            f"{idle_seconds:.0f}s (threshold: {linger:.0f}s), stopping..."
+        )
+        
+        # 停止空闲进程
+        if self.process_manager.stop_process(channel_id):
+            self._stopped_count += 1
+            if self._is_adaptive():
+                with self._cond:
+                    self._get_popularity(channel_id, now).record_idle_stop(now)
+            logger.info(f"Successfully stopped idle process for channel {channel_id}")
+        else:
+            logger.warning(f"Failed to stop idle process for channel {channel_id}")
     
     def get_status(self) -> dict:
         """获取监控器状态"""
+        with self._cond:
+            next_deadline = min(self._deadlines.values()) if self._deadlines else None
+            now = time.monotonic()
+            channels = {channel_id: popularity.to_dict(now) for channel_id, popularity in self._popularity.items()}
+        next_deadline_in = round(max(0.0, next_deadline - time.monotonic()), 1) if next_deadline is not None else None
         return {
             'running': self.is_running(),
             'idle_timeout': self.idle_timeout,
             'check_interval': self.check_interval,
-            'thread_alive': self._thread.is_alive() if self._thread else False
+            'thread_alive': self._thread.is_alive() if self._thread else False,
+            'tracked_channels': len(self._deadlines),
+            'held_channels': len(self._holds),
+            'next_deadline_in': next_deadline_in,
+            'stopped_total': self._stopped_count,
+            'linger_policy': self._get_policy_status(channels)
+        }
+    
+    def get_channel_status(self, channel_id: str) -> Optional[dict]:
+        """
+        获取频道的空闲保留状态
+        
+        Returns:
+            dict: 保留时间决策和距停止检查的秒数，频道未被跟踪且没有热度统计时返回 None
+        """
+        now = time.monotonic()
+        with self._cond:
+            deadline = self._deadlines.get(channel_id)
+            popularity = self._popularity.get(channel_id)
+            if deadline is None and popularity is None:
+                return None
+            status = popularity.to_dict(now) if popularity is not None else {'linger': self.idle_timeout}
+        status['next_check_in'] = round(max(0.0, deadline - now), 1) if deadline is not None else None
+        return status
+    
+    def _get_policy_status(self, channels: Dict[str, dict]) -> dict:
+        """获取自适应保留时间策略状态"""
+        if not self._is_adaptive():
+            return {'enabled': False}
+        policy = self.linger_policy
+        return {
+            'enabled': True,
+            'min_linger': policy.min_linger,
+            'max_linger': policy.max_linger,
+            'busy_requests_per_hour': policy.busy_requests_per_hour,
+            'rejoin_window': policy.rejoin_window,
+            'channels': channels
         }
\ No newline at end of file
@@ -0,0 +1,136 @@
+"""
+按频道热度自适应的空闲保留时间策略
+
+固定的空闲超时对热门频道太短：听众短暂离开后进程被停止，下一个听众要承担冷启动；
+对没有听众的频道又太长：空转整个超时时间。本策略为每个频道统计请求速率
+（指数加权平均，单位：请求 / 小时）和最近一小时内的冷启动次数，其中在空闲停止后
+不久就被重新请求的冷启动视为过早停止，据此在配置的上下限之间为每个频道选择保留时间。
+"""
+
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Optional
+
+# 冷启动次数的统计窗口 (秒)
+_HISTORY_WINDOW = 3600
+
+
+@dataclass
+class LingerPolicy:
+    """空闲保留时间策略"""
+    enabled: bool = True
+    min_linger: float = 60.0  # 保留时间下限 (秒)
+    max_linger: float = 1800.0  # 保留时间上限 (秒)
+    busy_requests_per_hour: float = 1200.0  # 约一个持续收听的听众产生的请求速率
+    rejoin_window: float = 600.0  # 空闲停止后该时间内重新启动视为过早停止 (秒)
+    half_life: float = 3600.0  # 请求速率平均的半衰期 (秒)
+
+    def decide(self, base_timeout: float, popularity: 'ChannelPopularity', now: Optional[float] = None) -> tuple:
+        """
+        为频道选择保留时间
+
+        Args:
+            base_timeout: 全局空闲超时
+            popularity: 频道热度统计
+            now: 当前时间（单调时钟）
+
+        Returns:
+            tuple: (保留时间秒数, 原因)
+        """
+        now = now if now is not None else time.monotonic()
+        rate = popularity.requests_per_hour
+        premature_stops = popularity.premature_stops(now)
+
+        if rate <= 0 and premature_stops == 0:
+            # 启动后从未被请求：无人收听，尽快释放
+            linger, reason = self.min_linger, 'dead_air'
+        else:
+            # 热度每翻一倍保留时间增加一个基础超时，过早停止一次保留时间翻倍
+            linger = base_timeout * (1 + math.log2(1 + rate / self.busy_requests_per_hour))
+            reason = 'popular' if rate >= self.busy_requests_per_hour else 'default'
+            if premature_stops:
+                linger *= 2 ** min(premature_stops, 3)
+                reason = 'premature_stops'
+
+        return min(max(linger, self.min_linger), self.max_linger), reason
+
+
+class ChannelPopularity:
+    """单个频道的热度统计"""
+
+    def __init__(self, now: Optional[float] = None):
+        now = now if now is not None else time.monotonic()
+        self.requests_per_hour = 0.0
+        self._last_count = 0
+        self._last_update = now
+        self._cold_starts: Deque[float] = deque()
+        self._premature_stops: Deque[float] = deque()
+        self._last_idle_stop: Optional[float] = None
+        self.last_seen = now
+        self.linger: Optional[float] = None
+        self.reason: Optional[str] = None
+
+    def observe_requests(self, request_count: int, half_life: float, now: Optional[float] = None):
+        """
+        根据累计请求数更新请求速率
+
+        Args:
+            request_count: ActivityTracker 的累计请求数（计数被清理后会从 0 重新开始）
+            half_life: 平均的半衰期 (秒)
+        """
+        now = now if now is not None else time.monotonic()
+        elapsed = now - self._last_update
+        delta = request_count - self._last_count if request_count >= self._last_count else request_count
+        self._last_count = request_count
+        self.last_seen = now
+        if elapsed <= 0:
+            return
+
+        self._last_update = now
+        rate = delta * 3600.0 / elapsed
+        weight = 1 - 0.5 ** (elapsed / half_life)
+        self.requests_per_hour += (rate - self.requests_per_hour) * weight
+
+    def record_cold_start(self, rejoin_window: float, now: Optional[float] = None):
+        """记录一次冷启动，空闲停止后不久的冷启动同时记为过早停止"""
+        now = now if now is not None else time.monotonic()
+        self._cold_starts.append(now)
+        if self._last_idle_stop is not None and now - self._last_idle_stop <= rejoin_window:
+            self._premature_stops.append(now)
+        self._last_idle_stop = None
+        self.last_seen = now
+
+    def record_idle_stop(self, now: Optional[float] = None):
+        """记录一次空闲停止"""
+        now = now if now is not None else time.monotonic()
+        self._last_idle_stop = now
+        self.last_seen = now
+
+    def _expire(self, now: float):
+        cutoff = now - _HISTORY_WINDOW
+        for events in (self._cold_starts, self._premature_stops):
+            while events and events[0] < cutoff:
+                events.popleft()
+
+    def cold_starts(self, now: Optional[float] = None) -> int:
+        """最近一小时的冷启动次数"""
+        self._expire(now if now is not None else time.monotonic())
+        return len(self._cold_starts)
+
+    def premature_stops(self, now: Optional[float] = None) -> int:
+        """最近一小时的过早停止次数"""
+        self._expire(now if now is not None else time.monotonic())
+        return len(self._premature_stops)
+
+    def to_dict(self, now: Optional[float] = None) -> dict:
+        """转换为状态字典"""
+        now = now if now is not None else time.monotonic()
+        return {
+            'linger': round(self.linger, 1) if self.linger is not None else None,
+            'reason': self.reason,
+            'requests_per_hour': round(self.requests_per_hour, 1),
+            'cold_starts_last_hour': self.cold_starts(now),
+            'premature_stops_last_hour': self.premature_stops(now)
+        }
@@ -0,0 +1,151 @@
+"""
+独立听众数估算
+
+使用滑动窗口 HyperLogLog 按频道估算一段时间内的独立听众数。
+每个频道占用固定内存（窗口分片数 × 2^precision 字节），与听众数量无关。
+"""
+
+import math
+import time
+import hashlib
+import threading
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SlidingHyperLogLog:
+    """
+    滑动窗口 HyperLogLog
+
+    时间窗口被划分为若干分片，每个分片维护一组寄存器；估算时合并窗口内的分片，
+    过期分片在被复用时清零。
+    """
+
+    def __init__(self, precision: int = 10, window_seconds: int = 3600, buckets: int = 6):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+
+        self.precision = precision
+        self.register_count = 1 << precision
+        self.window_seconds = window_seconds
+        self.buckets = buckets
+        self.slice_seconds = window_seconds / buckets
+
+        self._registers: List[bytearray] = [bytearray(self.register_count) for _ in range(buckets)]
+        self._epochs: List[int] = [-1] * buckets
+        self._rotate_lock = threading.Lock()
+        self.last_update = 0.0
+
+        m = self.register_count
+        self._alpha = 0.7213 / (1 + 1.079 / m)
+
+    def add(self, hash_value: int, now: Optional[float] = None):
+        """添加一个 64 位哈希值"""
+        now = now if now is not None else time.time()
+        epoch = int(now // self.slice_seconds)
+        slot = epoch % self.buckets
+
+        if self._epochs[slot] != epoch:
+            with self._rotate_lock:
+                if self._epochs[slot] != epoch:
+                    self._registers[slot] = bytearray(self.register_count)
+                    self._epochs[slot] = epoch
+
+        index = hash_value >> (64 - self.precision)
+        remaining_bits = 64 - self.precision
+        remaining = hash_value & ((1 << remaining_bits) - 1)
+        rank = remaining_bits - remaining.bit_length() + 1
+
+        registers = self._registers[slot]
+        if rank > registers[index]:
+            registers[index] = rank
+        self.last_update = now
+
+    def estimate(self, now: Optional[float] = None) -> int:
+        """估算窗口内的基数"""
+        now = now if now is not None else time.time()
+        current_epoch = int(now // self.slice_seconds)
+
+        live = [registers for registers, epoch in zip(self._registers, self._epochs)
+                if 0 <= current_epoch - epoch < self.buckets]
+        if not live:
+            return 0
+
+        merged = bytes(map(max, *live)) if len(live) > 1 else bytes(live[0])
+
+        m = self.register_count
+        raw = self._alpha * m * m / sum(2.0 ** -value for value in merged)
+
+        zeros = merged.count(0)
+        if raw <= 2.5 * m and zeros:
+            # 小基数修正（线性计数）
+            return int(round(m * math.log(m / zeros)))
+        return int(round(raw))
+
+
+class ListenerEstimator:
+    """
+    按频道维护独立听众估算
+
+    听众标识优先使用上游（Laravel）透传的会话标识，否则使用 IP + User-Agent。
+    """
+
+    def __init__(self, precision: int = 10, window_seconds: int = 3600, buckets: int = 6):
+        self.precision = precision
+        self.window_seconds = window_seconds
+        self.buckets = buckets
+
+        self._sketches: Dict[str, SlidingHyperLogLog] = {}
+        self._lock = threading.Lock()
+
+        logger.info(
+            f"ListenerEstimator initialized with precision={precision}, "
+            f"window_seconds={window_seconds}, buckets={buckets}"
+        )
+
+    @staticmethod
+    def hash_client(client_id: str) -> int:
+        """将听众标识哈希为 64 位整数"""
+        digest = hashlib.blake2b(client_id.encode('utf-8', errors='replace'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big')
+
+    def record(self, channel_id: str, client_id: str):
+        """记录一次听众请求"""
+        sketch = self._sketches.get(channel_id)
+        if sketch is None:
+            with self._lock:
+                sketch = self._sketches.get(channel_id)
+                if sketch is None:
+                    sketch = SlidingHyperLogLog(self.precision, self.window_seconds, self.buckets)
+                    self._sketches[channel_id] = sketch
+        sketch.add(self.hash_client(client_id))
+
+    def estimate(self, channel_id: str) -> int:
+        """估算频道窗口内的独立听众数"""
+        sketch = self._sketches.get(channel_id)
+        return sketch.estimate() if sketch is not None else 0
+
+    def estimates(self) -> Dict[str, int]:
+        """估算所有频道的独立听众数，并移除整个窗口内无请求的频道"""
+        now = time.time()
+        with self._lock:
+            for channel_id, sketch in list(self._sketches.items()):
+                if now - sketch.last_update > self.window_seconds:
+                    del self._sketches[channel_id]
+            sketches = list(self._sketches.items())
+        return {channel_id: sketch.estimate(now) for channel_id, sketch in sketches}
+
+    def get_status(self) -> dict:
+        """获取估算器状态"""
+        estimates = self.estimates()
+        sketch_bytes = self.buckets * (1 << self.precision)
+        return {
+            'window_seconds': self.window_seconds,
+            'precision': self.precision,
+            'standard_error_percent': round(104 / math.sqrt(1 << self.precision), 2),
+            'tracked_channels': len(estimates),
+            'memory_bytes_per_channel': sketch_bytes,
+            'unique_listeners': estimates
+        }
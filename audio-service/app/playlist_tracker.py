@@ -0,0 +1,225 @@
+"""
+播放列表跟踪器
+
+基于 HLSWatcher 事件跟踪各频道播放列表的状态：
+- 为等待播放列表生成的请求提供事件驱动的就绪通知，取代轮询等待
+- 在内存中维护每个频道最新的播放列表内容和媒体序列号，
+  支持 LL-HLS 阻塞式播放列表重载（_HLS_msn / _HLS_part）
+- 为播放列表快照计算 ETag / Last-Modified，条件请求无需读盘即可返回 304
+
+多码率频道的各档媒体播放列表以 "<频道>/<档位>" 为键独立跟踪，频道键对应主播放列表。
+"""
+
+import os
+import re
+import hashlib
+import threading
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from app.hls_watcher import HLSFileEvent
+
+logger = logging.getLogger(__name__)
+
+_MEDIA_SEQUENCE_RE = re.compile(rb'^#EXT-X-MEDIA-SEQUENCE:(\d+)', re.MULTILINE)
+_TARGET_DURATION_RE = re.compile(rb'^#EXT-X-TARGETDURATION:(\d+)', re.MULTILINE)
+_SEGMENT_RE = re.compile(rb'^#EXTINF:', re.MULTILINE)
+
+SERVER_CONTROL_TAG = b'#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES'
+MASTER_PLAYLIST_TAG = b'#EXT-X-STREAM-INF:'
+
+
+@dataclass
+class PlaylistSnapshot:
+    """播放列表快照"""
+    body: bytes
+    media_sequence: int
+    last_msn: int  # 最后一个已发布切片的媒体序列号，无切片时为 media_sequence - 1
+    target_duration: int
+    etag: str  # 基于内容哈希
+    last_modified: datetime
+
+
+class _ChannelPlaylist:
+    """单个频道的播放列表状态"""
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.condition = threading.Condition()
+        self.snapshot: Optional[PlaylistSnapshot] = None
+        self.waiters = 0
+
+
+class PlaylistTracker:
+    """
+    播放列表跟踪器
+
+    播放列表首次出现时唤醒所有等待者；每次 ffmpeg 重写播放列表时更新快照，
+    并唤醒等待指定媒体序列号的阻塞式重载请求。播放列表被删除后重新进入未就绪状态。
+
+    频道停止后播放列表由重启（删除旧播放列表）或资源清理器移除，此时无等待者的状态随之
+    丢弃；等待超时且从未就绪的状态也会丢弃，跟踪的键数不超过磁盘上现存播放列表数加等待中的请求。
+    """
+
+    def __init__(self, playlist_name: str = 'playlist.m3u8', blocking_reload: bool = True):
+        self.playlist_name = playlist_name
+        self.blocking_reload = blocking_reload
+        self._channels: Dict[str, _ChannelPlaylist] = {}
+        self._lock = threading.Lock()
+
+        logger.info(f"PlaylistTracker initialized for {playlist_name}, blocking_reload={blocking_reload}")
+
+    def _get_channel(self, channel_id: str, waiter: bool = False) -> _ChannelPlaylist:
+        with self._lock:
+            state = self._channels.get(channel_id)
+            if state is None:
+                state = _ChannelPlaylist()
+                self._channels[channel_id] = state
+            # 等待者与获取状态在同一把锁内登记，避免状态在登记前被丢弃
+            if waiter:
+                state.waiters += 1
+            return state
+
+    def _release(self, key: str, state: _ChannelPlaylist):
+        """等待结束，无其他等待者且没有播放列表时丢弃状态"""
+        with self._lock:
+            state.waiters -= 1
+            if state.waiters == 0 and state.snapshot is None and not state.ready.is_set():
+                if self._channels.get(key) is state:
+                    del self._channels[key]
+
+    def handle_file_event(self, event: HLSFileEvent, channel_id: str, filename: str, file_path: str):
+        """HLSWatcher 事件回调"""
+        key = channel_id
+        if '/' in filename:
+            subdir, filename = filename.rsplit('/', 1)
+            key = f"{channel_id}/{subdir}"
+        if filename != self.playlist_name:
+            return
+
+        state = self._get_channel(key)
+        if event == HLSFileEvent.WRITTEN:
+            snapshot = self._read_snapshot(file_path)
+            if snapshot is not None:
+                with state.condition:
+                    state.snapshot = snapshot
+                    state.condition.notify_all()
+
+            if not state.ready.is_set():
+                logger.debug(f"Playlist ready for {key}")
+                state.ready.set()
+        elif event == HLSFileEvent.DELETED:
+            state.ready.clear()
+            with state.condition:
+                state.snapshot = None
+            with self._lock:
+                if state.waiters == 0 and self._channels.get(key) is state:
+                    del self._channels[key]
+
+    def _read_snapshot(self, file_path: str) -> Optional[PlaylistSnapshot]:
+        """读取并解析播放列表"""
+        try:
+            with open(file_path, 'rb') as f:
+                body = f.read()
+                mtime = os.fstat(f.fileno()).st_mtime
+        except OSError as e:
+            logger.debug(f"Failed to read playlist {file_path}: {str(e)}")
+            return None
+
+        match = _MEDIA_SEQUENCE_RE.search(body)
+        media_sequence = int(match.group(1)) if match else 0
+        match = _TARGET_DURATION_RE.search(body)
+        target_duration = int(match.group(1)) if match else 0
+        segment_count = len(_SEGMENT_RE.findall(body))
+
+        if self.blocking_reload:
+            body = self._add_server_control(body)
+
+        return PlaylistSnapshot(
+            body=body,
+            media_sequence=media_sequence,
+            last_msn=media_sequence + segment_count - 1,
+            target_duration=target_duration,
+            etag=hashlib.blake2b(body, digest_size=16).hexdigest(),
+            last_modified=datetime.fromtimestamp(int(mtime), timezone.utc)
+        )
+
+    @staticmethod
+    def _add_server_control(body: bytes) -> bytes:
+        """在播放列表头部声明支持阻塞式重载（主播放列表不适用）"""
+        if SERVER_CONTROL_TAG in body or MASTER_PLAYLIST_TAG in body:
+            return body
+
+        lines = body.split(b'\n')
+        insert_at = 1
+        for index, line in enumerate(lines):
+            if line.startswith(b'#EXT-X-TARGETDURATION:'):
+                insert_at = index + 1
+                break
+        lines.insert(insert_at, SERVER_CONTROL_TAG)
+        return b'\n'.join(lines)
+
+    def is_ready(self, channel_id: str) -> bool:
+        """检查频道播放列表是否已生成"""
+        state = self._channels.get(channel_id)
+        return state is not None and state.ready.is_set()
+
+    def wait_until_ready(self, channel_id: str, timeout: float) -> bool:
+        """
+        等待频道播放列表生成
+
+        Args:
+            channel_id: 频道 ID
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            bool: 播放列表是否已就绪
+        """
+        state = self._get_channel(channel_id, waiter=True)
+        try:
+            if state.ready.is_set():
+                return True
+            return state.ready.wait(timeout=timeout)
+        finally:
+            self._release(channel_id, state)
+
+    def get_snapshot(self, channel_id: str) -> Optional[PlaylistSnapshot]:
+        """获取频道最新的播放列表快照"""
+        state = self._channels.get(channel_id)
+        return state.snapshot if state is not None else None
+
+    def wait_for_msn(self, channel_id: str, msn: int, timeout: float) -> Optional[PlaylistSnapshot]:
+        """
+        阻塞等待指定媒体序列号的切片发布
+
+        Args:
+            channel_id: 频道 ID
+            msn: 需要等待的媒体序列号
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            PlaylistSnapshot: 包含该切片的播放列表快照，超时返回 None
+        """
+        state = self._get_channel(channel_id, waiter=True)
+        try:
+            with state.condition:
+                published = state.condition.wait_for(
+                    lambda: state.snapshot is not None and state.snapshot.last_msn >= msn,
+                    timeout=timeout
+                )
+                return state.snapshot if published else None
+        finally:
+            self._release(channel_id, state)
+
+    def get_status(self) -> dict:
+        """获取跟踪器状态"""
+        with self._lock:
+            channels = list(self._channels.values())
+        return {
+            'blocking_reload': self.blocking_reload,
+            'tracked_channels': len(channels),
+            'ready_channels': sum(1 for state in channels if state.ready.is_set()),
+            'waiting_requests': sum(state.waiters for state in channels)
+        }
@@ -0,0 +1,466 @@
+"""
+频道预热
+
+冷启动需要等待 FFmpeg 连接上游、探测输入并生成首个切片，听众能明显感觉到。
+预热器在预计有人收听之前提前启动频道：
+
+- 按星期 × 小时（共 168 个时段）统计每个频道的请求数，按周指数衰减，
+  预计下一时段的请求数达到阈值时提前 lead_time 秒启动
+- 配置中的预热计划（如早高峰节目）在计划开始前 lead_time 秒启动
+
+预热只使用空闲的转码预算，不排队也不驱逐其他频道；预热的频道在预计开始收听后
+join_grace 秒内仍无人请求时停止。统计数据定期写入状态文件，服务重启后继续使用。
+"""
+
+import os
+import json
+import time
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+if TYPE_CHECKING:
+    from app.process_manager import ProcessManager
+    from app.activity_tracker import ActivityTracker
+    from app.idle_process_monitor import IdleProcessMonitor
+    from app.admission_controller import AdmissionController
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+
+_HOURS_PER_WEEK = 168
+_SECONDS_PER_WEEK = 7 * 86400
+_DAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+# 状态文件写入间隔 (秒)
+_SAVE_INTERVAL = 600
+
+
+def hour_of_week(ts: float) -> int:
+    """本地时间的星期 × 小时时段编号（周一 0 点为 0）"""
+    local = time.localtime(ts)
+    return local.tm_wday * 24 + local.tm_hour
+
+
+class HourOfWeekHistogram:
+    """
+    单个频道按星期 × 小时的请求统计
+
+    每进入新的一周，所有时段按 decay 衰减，同时累计衰减后的周数作为归一化权重，
+    expected() 返回该时段平均每周的请求数，只观察了一周时即为该周的请求数。
+    """
+
+    def __init__(self, decay: float = 0.8):
+        self.decay = decay
+        self.buckets: List[float] = [0.0] * _HOURS_PER_WEEK
+        self.week: Optional[int] = None
+        self.weight = 1.0
+
+    def _roll(self, ts: float):
+        week = int(ts // _SECONDS_PER_WEEK)
+        if self.week is None:
+            self.week = week
+        elif week > self.week:
+            factor = self.decay ** (week - self.week)
+            self.buckets = [value * factor for value in self.buckets]
+            self.weight = self.weight * factor + 1
+            self.week = week
+
+    def add(self, ts: float, count: float):
+        """记录 ts 所在时段的请求数"""
+        self._roll(ts)
+        self.buckets[hour_of_week(ts)] += count
+
+    def expected(self, ts: float) -> float:
+        """预计 ts 所在时段的请求数"""
+        self._roll(ts)
+        return self.buckets[hour_of_week(ts)] / self.weight
+
+    def total(self) -> float:
+        return sum(self.buckets)
+
+    def to_dict(self) -> dict:
+        return {
+            'week': self.week,
+            'weight': round(self.weight, 4),
+            'buckets': [round(value, 2) for value in self.buckets]
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, decay: float) -> 'HourOfWeekHistogram':
+        histogram = cls(decay)
+        buckets = data.get('buckets') or []
+        if len(buckets) == _HOURS_PER_WEEK:
+            histogram.buckets = [float(value) for value in buckets]
+        histogram.week = data.get('week')
+        histogram.weight = float(data.get('weight') or 1.0)
+        return histogram
+
+
+class ScheduleEntry:
+    """配置的预热计划"""
+
+    def __init__(self, channel_id: str, stream_url: str, start: str, end: str,
+                 days: Optional[Iterable] = None):
+        self.channel_id = str(channel_id)
+        self.stream_url = stream_url
+        self.start = datetime.strptime(start, '%H:%M').time()
+        self.end = datetime.strptime(end, '%H:%M').time()
+        self.days = self._parse_days(days)
+
+    @staticmethod
+    def _parse_days(days: Optional[Iterable]) -> frozenset:
+        """解析星期：0-6（周一为 0）或 mon-sun，为空时每天生效"""
+        if not days:
+            return frozenset(range(7))
+        parsed = set()
+        for day in days:
+            if isinstance(day, str) and day[:3].lower() in _DAY_NAMES:
+                parsed.add(_DAY_NAMES.index(day[:3].lower()))
+            else:
+                parsed.add(int(day) % 7)
+        return frozenset(parsed)
+
+    @classmethod
+    def from_config(cls, entry: dict) -> 'ScheduleEntry':
+        return cls(entry['channel_id'], entry['stream_url'], entry['start'], entry['end'], entry.get('days'))
+
+    def next_window(self, now: datetime, lead_time: float) -> Optional[tuple]:
+        """
+        获取正在预热或进行中的计划时段
+
+        Returns:
+            tuple: (开始时间, 结束时间)，不在 [开始 - lead_time, 结束) 内时返回 None
+        """
+        # 跨午夜的计划可能从昨天开始
+        for offset in (-1, 0, 1):
+            day = now.date() + timedelta(days=offset)
+            if day.weekday() not in self.days:
+                continue
+            start = datetime.combine(day, self.start)
+            end = datetime.combine(day, self.end)
+            if end <= start:
+                end += timedelta(days=1)
+            if start - timedelta(seconds=lead_time) <= now < end:
+                return start, end
+        return None
+
+
+class _Prewarmed:
+    """预热中的频道"""
+
+    __slots__ = ('reason', 'started', 'keep_until')
+
+    def __init__(self, reason: str, started: float, keep_until: float):
+        self.reason = reason
+        self.started = started  # 单调时钟
+        self.keep_until = keep_until  # 单调时钟
+
+
+class ChannelPrewarmer:
+    """
+    频道预热器
+
+    每 interval 秒：
+    1. 把 ActivityTracker 的请求数增量计入当前时段
+    2. 检查预热的频道：有人请求后交给空闲监控器，超过保留时间仍无人请求则停止
+    3. 按统计和计划启动即将有人收听的频道
+    """
+
+    def __init__(self, process_manager: 'ProcessManager', activity_tracker: 'ActivityTracker',
+                 idle_monitor: Optional['IdleProcessMonitor'] = None,
+                 admission_controller: Optional['AdmissionController'] = None,
+                 schedule: Iterable[ScheduleEntry] = (), interval: float = 60, lead_time: float = 300,
+                 join_grace: float = 600, min_requests_per_hour: float = 600, max_channels: int = 10,
+                 max_utilization: float = 70, history_decay: float = 0.8, state_path: Optional[str] = None):
+        self.process_manager = process_manager
+        self.activity_tracker = activity_tracker
+        self.idle_monitor = idle_monitor
+        self.admission_controller = admission_controller
+        self.schedule = list(schedule)
+        self.interval = interval
+        self.lead_time = lead_time
+        self.join_grace = join_grace
+        self.min_requests_per_hour = min_requests_per_hour
+        self.max_channels = max_channels
+        self.max_utilization = max_utilization
+        self.history_decay = history_decay
+        self.state_path = state_path
+
+        self._histograms: Dict[str, HourOfWeekHistogram] = {}
+        self._stream_urls: Dict[str, str] = {}
+        self._last_counts: Dict[str, int] = {}
+        self._prewarmed: Dict[str, _Prewarmed] = {}
+        self._suppressed_until: Dict[str, float] = {}  # 频道 -> 本时段不再预热（单调时钟）
+        self._lock = threading.Lock()
+        self._last_save = time.monotonic()
+
+        # 统计计数
+        self._prewarmed_total = 0
+        self._joined_total = 0
+        self._wasted_total = 0
+        self._skipped_total = 0
+
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        self._load_state()
+
+        logger.info(
+            f"ChannelPrewarmer initialized with lead_time={lead_time}s, join_grace={join_grace}s, "
+            f"min_requests_per_hour={min_requests_per_hour}, schedule_entries={len(self.schedule)}"
+        )
+
+    def start(self):
+        """启动预热器"""
+        if self._running:
+            logger.warning("ChannelPrewarmer is already running")
+            return
+
+        self._running = True
+        self._stop_event.clear()
+        self._last_counts = self.activity_tracker.get_request_counts()
+
+        self._thread = threading.Thread(target=self._prewarm_loop, name="ChannelPrewarmer", daemon=True)
+        self._thread.start()
+
+        logger.info("ChannelPrewarmer started")
+
+    def stop(self):
+        """停止预热器"""
+        if not self._running:
+            return
+
+        self._running = False
+        self._stop_event.set()
+
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+
+        self._save_state()
+        logger.info("ChannelPrewarmer stopped")
+
+    def is_running(self) -> bool:
+        """检查预热器是否在运行"""
+        return self._running and self._thread is not None and self._thread.is_alive()
+
+    def _prewarm_loop(self):
+        """预热循环"""
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Error in channel prewarmer: {str(e)}")
+
+    def run_once(self, now: Optional[float] = None):
+        """执行一轮统计、检查和预热"""
+        now = now if now is not None else time.time()
+        monotonic_now = time.monotonic()
+
+        self._learn(now)
+        self._check_prewarmed(monotonic_now)
+        self._prewarm(now, monotonic_now)
+
+        if monotonic_now - self._last_save >= _SAVE_INTERVAL:
+            self._save_state()
+
+    def _learn(self, now: float):
+        """把上一轮以来的请求数计入当前时段"""
+        counts = self.activity_tracker.get_request_counts()
+        with self._lock:
+            for channel_id, count in counts.items():
+                last = self._last_counts.get(channel_id, 0)
+                # 计数被清理后从 0 重新开始
+                delta = count - last if count >= last else count
+                if delta <= 0:
+                    continue
+                histogram = self._histograms.get(channel_id)
+                if histogram is None:
+                    histogram = self._histograms[channel_id] = HourOfWeekHistogram(self.history_decay)
+                histogram.add(now, delta)
+
+                # 记录频道最近使用的流地址，预热时使用
+                process_info = self.process_manager.get_process_status(channel_id)
+                if process_info is not None:
+                    self._stream_urls[channel_id] = process_info.stream_url
+            self._last_counts = counts
+
+    def _check_prewarmed(self, monotonic_now: float):
+        """检查预热的频道是否有人收听"""
+        with self._lock:
+            prewarmed = list(self._prewarmed.items())
+
+        for channel_id, state in prewarmed:
+            idle = self.activity_tracker.idle_seconds(channel_id)
+            if idle is not None and idle < monotonic_now - state.started:
+                # 预热后收到了请求，交给空闲监控器按正常策略处理
+                logger.info(f"Prewarmed channel {channel_id} got its first listener")
+                self._joined_total += 1
+                self._finish(channel_id)
+            elif not self.process_manager.is_running(channel_id):
+                # 已被停止、驱逐或启动失败
+                self._finish(channel_id)
+            elif monotonic_now >= state.keep_until:
+                logger.info(f"Stopping prewarmed channel {channel_id}: nobody joined ({state.reason})")
+                self._wasted_total += 1
+                self._finish(channel_id)
+                self.process_manager.stop_process(channel_id)
+
+    def _finish(self, channel_id: str):
+        with self._lock:
+            self._prewarmed.pop(channel_id, None)
+        if self.idle_monitor is not None:
+            self.idle_monitor.release_hold(channel_id)
+
+    def _candidates(self, now: float, monotonic_now: float) -> List[tuple]:
+        """
+        获取需要预热的频道
+
+        Returns:
+            List[tuple]: (频道, 流地址, 原因, 保持运行的秒数, 本时段剩余的秒数)，计划优先，其余按预计请求数排序
+        """
+        candidates = []
+        seen = set()
+
+        local_now = datetime.fromtimestamp(now)
+        for entry in self.schedule:
+            window = entry.next_window(local_now, self.lead_time)
+            if window is None or entry.channel_id in seen:
+                continue
+            start, end = window
+            keep = max((start - local_now).total_seconds(), 0.0) + self.join_grace
+            candidates.append((entry.channel_id, entry.stream_url, 'schedule', keep,
+                               (end - local_now).total_seconds()))
+            seen.add(entry.channel_id)
+
+        learned = []
+        target = now + self.lead_time
+        hour_end = (target // 3600 + 1) * 3600
+        with self._lock:
+            for channel_id, histogram in self._histograms.items():
+                stream_url = self._stream_urls.get(channel_id)
+                if channel_id in seen or not stream_url:
+                    continue
+                expected = histogram.expected(target)
+                if expected >= self.min_requests_per_hour:
+                    learned.append((expected, channel_id, stream_url))
+        learned.sort(reverse=True)
+        for expected, channel_id, stream_url in learned:
+            candidates.append((channel_id, stream_url, f'history ({expected:.0f} req/h)',
+                               self.lead_time + self.join_grace, hour_end - now))
+
+        return candidates
+
+    def _prewarm(self, now: float, monotonic_now: float):
+        """启动即将有人收听的频道"""
+        for channel_id, suppressed_until in list(self._suppressed_until.items()):
+            if suppressed_until <= monotonic_now:
+                del self._suppressed_until[channel_id]
+
+        for channel_id, stream_url, reason, keep, window_left in self._candidates(now, monotonic_now):
+            if channel_id in self._prewarmed or channel_id in self._suppressed_until:
+                continue
+            if self.process_manager.is_running(channel_id):
+                continue
+            if len(self._prewarmed) >= self.max_channels:
+                self._skipped_total += 1
+                logger.debug(f"Not prewarming channel {channel_id}: {self.max_channels} channels already prewarmed")
+                break
+            if (self.admission_controller is not None
+                    and self.admission_controller.get_utilization() >= self.max_utilization):
+                self._skipped_total += 1
+                logger.debug(f"Not prewarming channel {channel_id}: transcode budget above {self.max_utilization}%")
+                break
+
+            # 无论是否成功，本时段内只尝试一次
+            self._suppressed_until[channel_id] = monotonic_now + max(window_left, self.interval)
+            try:
+                self.process_manager.start_process(channel_id, stream_url, admission_timeout=0, opportunistic=True)
+            except Exception as e:
+                self._skipped_total += 1
+                logger.info(f"Failed to prewarm channel {channel_id}: {str(e)}")
+                continue
+
+            logger.info(f"Prewarming channel {channel_id} ({reason}), keeping it for {keep:.0f}s")
+            self._prewarmed_total += 1
+            with self._lock:
+                self._prewarmed[channel_id] = _Prewarmed(reason, monotonic_now, monotonic_now + keep)
+            if self.idle_monitor is not None:
+                self.idle_monitor.hold(channel_id, keep)
+
+    def _load_state(self):
+        """读取上次保存的统计数据"""
+        if not self.state_path:
+            return
+        try:
+            with open(self.state_path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read prewarm state {self.state_path}: {str(e)}")
+            return
+
+        if not isinstance(data, dict) or data.get('version') != STATE_VERSION:
+            logger.warning(f"Ignoring prewarm state {self.state_path} with unsupported format")
+            return
+        for channel_id, entry in (data.get('channels') or {}).items():
+            self._histograms[channel_id] = HourOfWeekHistogram.from_dict(entry, self.history_decay)
+            if entry.get('stream_url'):
+                self._stream_urls[channel_id] = entry['stream_url']
+        logger.info(f"Loaded prewarm history for {len(self._histograms)} channels")
+
+    def _save_state(self):
+        """原子写入统计数据（丢弃已衰减到可忽略的频道）"""
+        self._last_save = time.monotonic()
+        if not self.state_path:
+            return
+
+        with self._lock:
+            for channel_id in [channel_id for channel_id, histogram in self._histograms.items()
+                               if histogram.total() < 1]:
+                del self._histograms[channel_id]
+                self._stream_urls.pop(channel_id, None)
+            channels = {}
+            for channel_id, histogram in self._histograms.items():
+                entry = histogram.to_dict()
+                entry['stream_url'] = self._stream_urls.get(channel_id)
+                channels[channel_id] = entry
+
+        data = {'version': STATE_VERSION, 'channels': channels}
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            logger.error(f"Failed to write prewarm state {self.state_path}: {str(e)}")
+
+    def get_status(self) -> dict:
+        """获取预热器状态"""
+        now = time.monotonic()
+        with self._lock:
+            prewarmed = {
+                channel_id: {
+                    'reason': state.reason,
+                    'prewarmed_for': round(now - state.started, 1),
+                    'keep_for': round(max(0.0, state.keep_until - now), 1)
+                }
+                for channel_id, state in self._prewarmed.items()
+            }
+            learned_channels = len(self._histograms)
+        return {
+            'running': self.is_running(),
+            'lead_time': self.lead_time,
+            'join_grace': self.join_grace,
+            'schedule_entries': len(self.schedule),
+            'learned_channels': learned_channels,
+            'prewarmed': prewarmed,
+            'prewarmed_total': self._prewarmed_total,
+            'joined_total': self._joined_total,
+            'wasted_total': self._wasted_total,
+            'skipped_total': self._skipped_total
+        }
@@ -6,17 +6,34 @@ FFmpeg 进程管理器 - 重构版本
 
 import subprocess
 import threading
-import time
+import functools
+import random
 import logging
 import os
+import glob
+import fcntl
+from collections import deque
+from concurrent.futures import Future
 from datetime import datetime, timezone
-from typing import Dict, Optional, List
-from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Optional, List, Set
+from dataclasses import dataclass, field
 from enum import Enum
 
 from app.concurrency_control import ConcurrencyControl
 from app.config import config
 from app.error_handler import ErrorHandler, ErrorType
+from app.hls_watcher import HLSFileEvent
+from app.stderr_drainer import StderrDrainer, StderrStream
+from app.process_supervisor import ProcessSupervisor
+from app.restart_policy import RestartPolicy, RestartState
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.admission_controller import AdmissionController, AdmissionRejectedError
+from app.process_registry import (
+    ProcessRegistry, AdoptedProcess, LEGACY_LOCK_FILE_PATTERN, read_cmdline, read_pid_index, read_start_ticks
+)
+from app.progress_monitor import ProgressMonitor
+from app.stream_probe import StreamProbe, MODE_COPY, MODE_TRANSCODE
+from app.abr_ladder import AbrLadder
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +57,15 @@ class ProcessInfo:
     last_activity_time: datetime
     error_message: Optional[str] = None
     hls_output_dir: Optional[str] = None
+    priority: Optional[str] = None  # 启动请求指定的准入优先级
+    adopted: bool = False  # 是否为服务重启后接管的进程
+    stalled_for: Optional[float] = None  # 因输出停滞被看门狗终止时，停滞的秒数
+    mode: str = MODE_TRANSCODE  # 运行模式：transcode 转码 / copy 直接重新封装
+    input_format: Optional[str] = None  # 按缓存的探测结果指定的输入格式（以最小探测量快速启动）
+    startup_seconds: Optional[float] = None  # 启动到生成首个播放列表的耗时
+    variants: List[str] = field(default_factory=list)  # 多码率阶梯的档位（子目录名），单码率为空
+    # 就绪 Future：首个播放列表生成时完成，启动失败时以 RuntimeError 结束
+    ready: Future = field(default_factory=Future, repr=False, compare=False)
 
 
 class ProcessManager:
@@ -49,15 +75,49 @@ class ProcessManager:
     职责：
     - 管理 FFmpeg 进程的生命周期
     - 跟踪进程状态和错误
+    - 进程意外退出后按重启策略自动重启
     - 提供进程查询接口
+    
+    锁策略：
+    - 每个频道一把锁，串行化该频道的启动、停止和退出处理；
+      一个频道停止时等待进程退出不会阻塞其他频道
+    - 注册表锁只在读写 processes / subprocess_handles / 频道锁表时短暂持有
+    - 状态查询只获取注册表锁，不等待任何频道锁
     """
     
-    def __init__(self, concurrency_control: ConcurrencyControl, error_handler: Optional[ErrorHandler] = None):
+    def __init__(self, concurrency_control: ConcurrencyControl, error_handler: Optional[ErrorHandler] = None,
+                 stderr_drainer: Optional[StderrDrainer] = None,
+                 supervisor: Optional[ProcessSupervisor] = None,
+                 restart_policy: Optional[RestartPolicy] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 admission_controller: Optional[AdmissionController] = None,
+                 process_registry: Optional[ProcessRegistry] = None,
+                 progress_monitor: Optional[ProgressMonitor] = None,
+                 stream_probe: Optional[StreamProbe] = None,
+                 abr_ladder: Optional[AbrLadder] = None):
         self.concurrency_control = concurrency_control
         self.error_handler = error_handler
+        self.stderr_drainer = stderr_drainer or StderrDrainer()
+        self.supervisor = supervisor or ProcessSupervisor()
+        self.restart_policy = restart_policy or RestartPolicy()
+        self.circuit_breaker = circuit_breaker
+        self.admission_controller = admission_controller
+        self.process_registry = process_registry
+        self.progress_monitor = progress_monitor
+        self.stream_probe = stream_probe
+        self.abr_ladder = abr_ladder
+        # 进程启动后的回调（参数为频道 ID），由容器连接到空闲监控器
+        self.on_process_started: Optional[Callable[[str], None]] = None
+        self._restart_states: Dict[str, RestartState] = {}
         self.processes: Dict[str, ProcessInfo] = {}
         self.subprocess_handles: Dict[str, subprocess.Popen] = {}
-        self.lock = threading.RLock()
+        self._registry_lock = threading.Lock()
+        self._channel_locks: Dict[str, threading.RLock] = {}
+        # 最近的启动耗时（秒），按是否快速启动分别统计
+        self._startup_samples: Dict[str, Deque[float]] = {
+            'fast_start': deque(maxlen=200),
+            'full_probe': deque(maxlen=200)
+        }
         
         # 清理残留进程和锁文件
         self._cleanup_on_startup()
@@ -72,22 +132,166 @@ class ProcessManager:
             # 清理残留的锁文件
             self.concurrency_control.cleanup_stale_locks()
             
-            # 清理残留的 FFmpeg 进程
-            self._cleanup_existing_ffmpeg_processes()
+            # 接管上一个服务进程留下的 FFmpeg，无法接管的进程按注册表中的 PID 直接终止。
+            # 只有注册表不完整时（未启用、首次启动或有未写入 PID 的待创建记录）才扫描整个进程表
+            full_scan = self.process_registry is None or not self.process_registry.exists()
+            if not full_scan and self.process_registry.has_pending():
+                logger.warning("Process registry has entries without PID (service stopped while spawning FFmpeg), "
+                               "scanning for residual FFmpeg processes")
+                full_scan = True
+            adopted_pids = self._adopt_registered_processes()
+            if full_scan:
+                self._cleanup_existing_ffmpeg_processes(adopted_pids)
+            else:
+                # 旧版 FFmpegManager 不写注册表，按其锁文件中的 PID 清理
+                self._cleanup_legacy_ffmpeg_processes(adopted_pids)
             
             logger.info("Startup cleanup completed")
         except Exception as e:
             logger.error(f"Error during startup cleanup: {str(e)}")
     
-    def _cleanup_existing_ffmpeg_processes(self):
-        """清理系统中现有的 FFmpeg 进程"""
+    def _adopt_registered_processes(self) -> Set[int]:
+        """
+        接管进程注册表中仍在运行的 FFmpeg 进程
+        
+        Returns:
+            Set[int]: 已接管的 PID
+        """
+        if self.process_registry is None:
+            return set()
+        
+        adopted_entries = {}
+        for channel_id, entry in self.process_registry.load().items():
+            if entry.get('pid') is None:
+                # 待创建记录没有可接管的进程，由全面扫描清理
+                continue
+            output_dir = os.path.join(config.HLS_OUTPUT_DIR, channel_id)
+            process = self.process_registry.verify(channel_id, entry, output_dir)
+            if process is None:
+                logger.info(f"Registered FFmpeg process for channel {channel_id} (PID {entry.get('pid')}) is gone")
+                continue
+            
+            if not self.concurrency_control.acquire_lock(channel_id):
+                # 频道由另一个服务实例管理，不接管也不终止
+                logger.warning(f"Cannot adopt FFmpeg process for channel {channel_id}: lock is held by another process")
+                continue
+            
+            try:
+                if self._adopt_process(channel_id, entry, process, output_dir):
+                    adopted_entries[channel_id] = entry
+                    continue
+            except Exception as e:
+                logger.error(f"Failed to adopt FFmpeg process for channel {channel_id}: {str(e)}")
+            
+            # 无法接管的进程按残留进程处理
+            self._release_admission(channel_id)
+            self.concurrency_control.release_lock(channel_id)
+            self._terminate_adopted(channel_id, process)
+        
+        # 注册表只保留成功接管的进程
+        self.process_registry.replace_all(adopted_entries)
+        if adopted_entries:
+            logger.info(f"Adopted {len(adopted_entries)} running FFmpeg processes")
+        return {entry['pid'] for entry in adopted_entries.values()}
+    
+    def _adopt_process(self, channel_id: str, entry: dict, process: AdoptedProcess, output_dir: str) -> bool:
+        """接管单个 FFmpeg 进程（调用方已获取频道并发锁），返回是否成功"""
+        priority = entry.get('priority')
+        mode = entry.get('mode') or MODE_TRANSCODE
+        variants = entry.get('variants') or []
+        if self.admission_controller is not None:
+            try:
+                self.admission_controller.admit(channel_id, cost=self._admission_cost(mode, variants), priority=priority,
+                                                timeout=0)
+            except AdmissionRejectedError:
+                return False
+        
+        try:
+            start_time = datetime.fromisoformat(entry['start_time'])
+        except (KeyError, TypeError, ValueError):
+            start_time = datetime.now(timezone.utc)
+        
+        # 播放列表已存在说明进程已就绪，否则等待首个播放列表
+        playlist_ready = os.path.exists(os.path.join(output_dir, config.HLS_PLAYLIST_NAME))
+        process_info = ProcessInfo(
+            channel_id=channel_id,
+            pid=process.pid,
+            status=ProcessStatus.RUNNING if playlist_ready else ProcessStatus.STARTING,
+            stream_url=entry['stream_url'],
+            start_time=start_time,
+            last_activity_time=datetime.now(timezone.utc),
+            hls_output_dir=output_dir,
+            priority=priority,
+            adopted=True,
+            mode=mode,
+            variants=variants
+        )
+        if playlist_ready:
+            process_info.ready.set_result(process_info)
+        
+        with self._registry_lock:
+            self.processes[channel_id] = process_info
+            self.subprocess_handles[channel_id] = process
+        
+        self.supervisor.watch(
+            channel_id, process,
+            functools.partial(self._handle_process_exit, channel_id, process_info, None)
+        )
+        
+        logger.info(f"Adopted FFmpeg process for channel {channel_id}, PID: {process.pid}")
+        return True
+    
+    def _terminate_adopted(self, channel_id: str, process: AdoptedProcess):
+        """终止无法接管的进程"""
+        logger.info(f"Killing unadoptable FFmpeg process for channel {channel_id}, PID {process.pid}")
+        try:
+            process.terminate()
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    
+    def detach_processes(self) -> int:
+        """
+        服务关闭时与 FFmpeg 进程脱离而不终止它们
+        
+        进程记录保留在注册表中，由下一个服务进程接管；FFmpeg 忽略 SIGPIPE，
+        stderr 管道随本进程关闭后仍会继续转码。
+        
+        Returns:
+            int: 脱离的进程数
+        """
+        with self._registry_lock:
+            channel_ids = list(self.subprocess_handles.keys())
+        
+        # 取消所有待执行的自动重启
+        for restart_state in list(self._restart_states.values()):
+            restart_state.cancel_pending()
+        
+        detached = 0
+        for channel_id in channel_ids:
+            with self._get_channel_lock(channel_id):
+                with self._registry_lock:
+                    # 移除句柄后，监督器的退出回调会忽略该进程
+                    process = self.subprocess_handles.pop(channel_id, None)
+                if process is None or process.poll() is not None:
+                    continue
+                self.concurrency_control.release_lock(channel_id)
+                self._release_admission(channel_id)
+                detached += 1
+        
+        logger.info(f"Detached {detached} FFmpeg processes, they will be adopted on next startup")
+        return detached
+    
+    def _cleanup_existing_ffmpeg_processes(self, keep_pids: Optional[Set[int]] = None):
+        """清理系统中现有的 FFmpeg 进程（跳过已接管的进程）"""
+        keep_pids = keep_pids or set()
         try:
             import psutil
             killed_count = 0
             
             for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
                 try:
-                    if proc.info['name'] == 'ffmpeg':
+                    if proc.info['name'] == 'ffmpeg' and proc.info['pid'] not in keep_pids:
                         # 检查是否是我们的 HLS 输出进程
                         cmdline = ' '.join(proc.info.get('cmdline', []))
                         if config.HLS_OUTPUT_DIR in cmdline:
@@ -111,13 +315,69 @@ class ProcessManager:
         except Exception as e:
             logger.error(f"Error cleaning up FFmpeg processes: {str(e)}")
     
-    def start_process(self, channel_id: str, stream_url: str) -> ProcessInfo:
+    def _cleanup_legacy_ffmpeg_processes(self, keep_pids: Set[int]):
+        """
+        清理旧版 FFmpegManager 留下的 FFmpeg 进程（跳过已接管的进程）
+        
+        只检查旧版锁文件中记录的 PID：锁未被持有（旧版服务已退出）、进程仍在运行
+        且命令行输出到本服务 HLS 目录时才终止，不扫描整个进程表。
+        """
+        hls_prefix = os.path.join(config.HLS_OUTPUT_DIR, '')
+        killed_count = 0
+        for lock_file_path in glob.glob(LEGACY_LOCK_FILE_PATTERN.format('*')):
+            try:
+                with open(lock_file_path, 'r') as lock_file:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        # 旧版服务仍在运行并管理该频道
+                        continue
+                    pid = read_pid_index(lock_file_path)
+            except OSError:
+                continue
+            if pid is None or pid in keep_pids:
+                continue
+            cmdline = read_cmdline(pid) or []
+            if not any(arg.startswith(hls_prefix) for arg in cmdline):
+                continue
+            
+            logger.info(f"Killing residual legacy FFmpeg process PID {pid}")
+            process = AdoptedProcess(pid, read_start_ticks(pid), cmdline)
+            try:
+                process.terminate()
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            killed_count += 1
+        
+        if killed_count > 0:
+            logger.info(f"Cleaned up {killed_count} residual legacy FFmpeg processes")
+    
+    def _get_channel_lock(self, channel_id: str) -> threading.RLock:
+        """获取频道锁（不存在时创建）"""
+        channel_lock = self._channel_locks.get(channel_id)
+        if channel_lock is None:
+            with self._registry_lock:
+                channel_lock = self._channel_locks.setdefault(channel_id, threading.RLock())
+        return channel_lock
+    
+    def start_process(self, channel_id: str, stream_url: str, priority: Optional[str] = None,
+                      admission_timeout: Optional[float] = None, opportunistic: bool = False,
+                      probe_upstream: bool = True) -> ProcessInfo:
         """
-        启动 FFmpeg 进程
+        启动 FFmpeg 进程（非阻塞）
+        
+        立即返回 STARTING 状态的进程信息，不等待 FFmpeg 初始化。
+        ProcessInfo.ready 在 FFmpeg 生成首个播放列表时完成（状态变为 RUNNING），
+        若进程在此之前退出，则以解析后的 stderr 错误信息抛出 RuntimeError。
         
         Args:
             channel_id: 频道 ID
             stream_url: 音频流 URL
+            priority: 准入优先级（pinned / vip / normal）
+            admission_timeout: 转码预算不足时的最长排队时间，默认使用准入控制配置
+            opportunistic: 只使用空闲的转码预算，不排队也不驱逐其他频道（预热使用）
+            probe_upstream: 探测结果未缓存时是否在后台探测上游编码（本次启动均直接转码）
             
         Returns:
             ProcessInfo: 进程信息
@@ -126,21 +386,53 @@ class ProcessManager:
             ValueError: 参数无效
             RuntimeError: 进程启动失败
             ProcessAlreadyRunningError: 进程已在运行
+            CircuitOpenError: 上游主机已熔断
+            AdmissionRejectedError: 转码预算不足
         """
         if not channel_id or not stream_url:
             raise ValueError("channel_id and stream_url are required")
         
-        with self.lock:
-            # 检查进程是否已在运行
+        with self._get_channel_lock(channel_id):
+            # 检查进程是否已在运行或正在启动
             if self._is_process_running_internal(channel_id):
-                existing_info = self.processes.get(channel_id)
-                if existing_info:
-                    raise ProcessAlreadyRunningError(f"Process for channel {channel_id} is already running")
+                raise ProcessAlreadyRunningError(f"Process for channel {channel_id} is already running")
+            
+            # 上游主机熔断时直接拒绝，不再创建注定失败的进程
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.before_start(channel_id, stream_url)
+            
+            # 上游已是兼容编码时直接重新封装，否则转码（只查缓存，不在频道锁内等待 ffprobe）
+            mode = MODE_TRANSCODE
+            input_format = None
+            if self.stream_probe is not None:
+                mode, probe_result = self.stream_probe.select_mode(stream_url, probe=probe_upstream)
+                # 上游格式已知时跳过 FFmpeg 自身的格式探测
+                if probe_result is not None and config.PROBE_CACHE_FAST_START:
+                    input_format = probe_result.input_format
+            
+            # 多码率阶梯需要解码后分别编码，不能直接重新封装
+            ladder = self.abr_ladder if self.abr_ladder is not None and self.abr_ladder.applies_to(channel_id) else None
+            variants = ladder.variant_names if ladder is not None else []
+            if ladder is not None:
+                mode = MODE_TRANSCODE
+            
+            # 申请转码预算（可能按优先级排队或驱逐其他频道）
+            if self.admission_controller is not None:
+                self.admission_controller.admit(channel_id, cost=self._admission_cost(mode, variants), priority=priority,
+                                                timeout=admission_timeout, opportunistic=opportunistic)
             
             # 尝试获取并发控制锁
             if not self.concurrency_control.acquire_lock(channel_id):
+                self._release_admission(channel_id)
                 raise ProcessAlreadyRunningError(f"Another process is already handling channel {channel_id}")
             
+            # 外部启动请求取代待执行的自动重启
+            restart_state = self._restart_states.get(channel_id)
+            if restart_state is not None:
+                restart_state.cancel_pending()
+                restart_state.gave_up = False
+            
+            process_info = None
             try:
                 # 创建进程信息
                 now = datetime.now(timezone.utc)
@@ -151,71 +443,143 @@ class ProcessManager:
                     stream_url=stream_url,
                     start_time=now,
                     last_activity_time=now,
-                    hls_output_dir=os.path.join(config.HLS_OUTPUT_DIR, channel_id)
+                    hls_output_dir=os.path.join(config.HLS_OUTPUT_DIR, channel_id),
+                    priority=priority,
+                    mode=mode,
+                    input_format=input_format,
+                    variants=variants
                 )
                 
-                self.processes[channel_id] = process_info
+                with self._registry_lock:
+                    self.processes[channel_id] = process_info
                 
-                # 创建 HLS 输出目录
+                # 创建 HLS 输出目录，并移除上次运行残留的播放列表，
+                # 确保就绪信号来自本次启动的 FFmpeg
                 os.makedirs(process_info.hls_output_dir, exist_ok=True)
+                playlist_path = os.path.join(process_info.hls_output_dir, config.HLS_PLAYLIST_NAME)
+                if os.path.exists(playlist_path):
+                    os.remove(playlist_path)
+                if ladder is not None:
+                    ladder.prepare_output_dir(process_info.hls_output_dir)
                 
                 # 构建 FFmpeg 命令
-                command = self._build_ffmpeg_command(channel_id, stream_url, process_info.hls_output_dir)
+                command = self._build_ffmpeg_command(channel_id, stream_url, process_info.hls_output_dir, mode,
+                                                     input_format, ladder)
                 
-                # 启动进程
-                logger.info(f"Starting FFmpeg process for channel {channel_id}")
+                # 启动进程（只持有本频道的锁，不同频道的启动可以并行进行）
+                logger.info(f"Starting FFmpeg process for channel {channel_id} in {mode} mode"
+                            + (f" (input format {input_format})" if input_format else '')
+                            + (f" with ABR variants {variants}" if variants else ''))
                 logger.debug(f"FFmpeg command: {' '.join(command)}")
                 
+                # 先写入待创建记录：创建进程后、写入 PID 之前崩溃时，下次启动会全面扫描残留进程
+                if self.process_registry is not None:
+                    self.process_registry.register(channel_id, None, stream_url, now)
+                
+                # 独立会话：终端 Ctrl-C 等发给服务进程组的信号不会波及 FFmpeg，
+                # 服务重启后进程可以继续运行并被接管
                 process = subprocess.Popen(
                     command,
-                    stdout=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE if self.progress_monitor is not None else subprocess.DEVNULL,
                     stderr=subprocess.PIPE,
-                    bufsize=0
+                    bufsize=0,
+                    start_new_session=True
                 )
                 
-                # 等待进程初始化
-                time.sleep(1)  # 减少等待时间到1秒
-                
-                # 检查进程是否立即退出
-                if process.poll() is not None:
-                    stderr_output = process.stderr.read().decode('utf-8', errors='replace')
-                    error_msg = self._parse_ffmpeg_error(stderr_output)
-                    
-                    # 使用错误处理器处理错误
-                    if self.error_handler:
-                        self.error_handler.handle_error(
-                            channel_id=channel_id,
-                            error_message=error_msg,
-                            additional_context={
-                                'process_start_failed': True,
-                                'stderr_output': stderr_output,
-                                'stream_url': stream_url
-                            }
-                        )
-                    
-                    # 清理资源
-                    self.concurrency_control.release_lock(channel_id)
-                    del self.processes[channel_id]
-                    
-                    raise RuntimeError(f"FFmpeg process failed to start: {error_msg}")
-                
                 # 更新进程信息
                 process_info.pid = process.pid
-                process_info.status = ProcessStatus.RUNNING
-                self.subprocess_handles[channel_id] = process
+                with self._registry_lock:
+                    self.subprocess_handles[channel_id] = process
                 
-                # 启动监控线程
-                self._start_process_monitor(channel_id, process)
+                # 持续读取 stderr，避免管道写满阻塞 FFmpeg
+                stderr_stream = self.stderr_drainer.register(channel_id, process.stderr)
+                
+                # -progress 输出由同一读取线程逐行解析
+                if self.progress_monitor is not None:
+                    self.stderr_drainer.register_handler(
+                        channel_id, process.stdout, self.progress_monitor.attach(channel_id, process.pid)
+                    )
+                
+                # 由监督器统一监视进程退出
+                self.supervisor.watch(
+                    channel_id, process,
+                    functools.partial(self._handle_process_exit, channel_id, process_info, stderr_stream)
+                )
                 
-                logger.info(f"FFmpeg process started successfully for channel {channel_id}, PID: {process.pid}")
-                return process_info
+                # 写入持久化注册表，服务重启后据此接管
+                if self.process_registry is not None:
+                    self.process_registry.register(
+                        channel_id, process.pid, stream_url, now,
+                        lock_file=self.concurrency_control.get_lock_file_path(channel_id),
+                        priority=priority,
+                        mode=mode,
+                        variants=variants
+                    )
                 
             except Exception as e:
                 # 清理资源
                 self.concurrency_control.release_lock(channel_id)
-                if channel_id in self.processes:
-                    del self.processes[channel_id]
+                self._release_admission(channel_id)
+                if self.process_registry is not None and (process_info is None or process_info.pid is None):
+                    self.process_registry.unregister(channel_id)
+                with self._registry_lock:
+                    if process_info is not None and self.processes.get(channel_id) is process_info:
+                        del self.processes[channel_id]
+                if process_info is not None:
+                    process_info.ready.set_exception(RuntimeError(f"FFmpeg process failed to start: {str(e)}"))
                 raise
+        
+        logger.info(f"FFmpeg process spawned for channel {channel_id}, PID: {process.pid}, waiting for first playlist")
+        if self.on_process_started is not None:
+            self.on_process_started(channel_id)
+        return process_info
+    
+    def handle_file_event(self, event: HLSFileEvent, channel_id: str, filename: str, file_path: str):
+        """HLSWatcher 事件回调：首个播放列表生成时将进程标记为就绪"""
+        if event != HLSFileEvent.WRITTEN:
+            return
+        if filename != config.HLS_PLAYLIST_NAME:
+            if filename.endswith('/' + config.HLS_PLAYLIST_NAME):
+                self._handle_variant_playlist(channel_id)
+            return
+        
+        # 在 HLSWatcher 线程中调用，只获取注册表锁，避免被正在停止的频道阻塞
+        with self._registry_lock:
+            process_info = self.processes.get(channel_id)
+            if process_info is None or process_info.status != ProcessStatus.STARTING:
+                return
+            process_info.status = ProcessStatus.RUNNING
+            # 接管的进程启动时间早于本服务，不计入启动耗时
+            if not process_info.adopted:
+                process_info.startup_seconds = (datetime.now(timezone.utc) - process_info.start_time).total_seconds()
+                key = 'fast_start' if process_info.input_format else 'full_probe'
+                self._startup_samples[key].append(process_info.startup_seconds)
+        
+        if process_info.startup_seconds is not None:
+            logger.info(f"FFmpeg process for channel {channel_id} is ready in {process_info.startup_seconds:.2f}s, "
+                        f"PID: {process_info.pid}")
+        else:
+            logger.info(f"FFmpeg process for channel {channel_id} is ready, PID: {process_info.pid}")
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record_success(process_info.stream_url)
+        if not process_info.ready.done():
+            process_info.ready.set_result(process_info)
+    
+    def _handle_variant_playlist(self, channel_id: str):
+        """多码率频道的各档都生成首个播放列表后写入主播放列表，主播放列表的写入事件使频道就绪"""
+        with self._registry_lock:
+            process_info = self.processes.get(channel_id)
+            if process_info is None or process_info.status != ProcessStatus.STARTING or not process_info.variants:
+                return
+        
+        if self.abr_ladder is None or not self.abr_ladder.variants_ready(process_info.hls_output_dir):
+            return
+        
+        try:
+            self.abr_ladder.write_master_playlist(process_info.hls_output_dir)
+            logger.debug(f"Wrote master playlist for channel {channel_id}")
+        except OSError as e:
+            logger.error(f"Failed to write master playlist for channel {channel_id}: {str(e)}")
     
     def stop_process(self, channel_id: str) -> bool:
         """
@@ -227,14 +591,15 @@ class ProcessManager:
         Returns:
             bool: 是否成功停止
         """
-        with self.lock:
-            if channel_id not in self.processes:
+        with self._get_channel_lock(channel_id):
+            with self._registry_lock:
+                process_info = self.processes.get(channel_id)
+                subprocess_handle = self.subprocess_handles.get(channel_id)
+            
+            if process_info is None:
                 logger.warning(f"Process for channel {channel_id} not found")
                 return False
             
-            process_info = self.processes[channel_id]
-            subprocess_handle = self.subprocess_handles.get(channel_id)
-            
             if subprocess_handle and subprocess_handle.poll() is None:
                 logger.info(f"Stopping FFmpeg process for channel {channel_id}, PID: {subprocess_handle.pid}")
                 
@@ -249,8 +614,17 @@ class ProcessManager:
                 except Exception as e:
                     logger.error(f"Error stopping process {subprocess_handle.pid}: {str(e)}")
             
+            # 主动停止时取消待执行的自动重启，并恢复重试预算
+            restart_state = self._restart_states.get(channel_id)
+            if restart_state is not None:
+                if restart_state.cancel_pending():
+                    restart_state.record('cancelled', 'process stopped')
+                restart_state.attempts = 0
+            
             # 更新状态
             process_info.status = ProcessStatus.STOPPED
+            if not process_info.ready.done():
+                process_info.ready.set_exception(RuntimeError(f"Process for channel {channel_id} was stopped before it became ready"))
             
             # 清理资源
             self._cleanup_process_resources(channel_id)
@@ -258,6 +632,44 @@ class ProcessManager:
             logger.info(f"FFmpeg process for channel {channel_id} stopped")
             return True
     
+    def kill_stalled_process(self, channel_id: str, pid: int, stalled_for: float) -> bool:
+        """
+        终止输出停滞的进程（由 StallWatchdog 调用）
+        
+        进程退出后按正常的退出流程处理：记录输出停滞错误并按重启策略自动重启。
+        
+        Args:
+            channel_id: 频道 ID
+            pid: 判定停滞时的进程 PID，进程已被替换时不做任何操作
+            stalled_for: 停滞的秒数
+            
+        Returns:
+            bool: 是否终止了进程
+        """
+        with self._get_channel_lock(channel_id):
+            with self._registry_lock:
+                process_info = self.processes.get(channel_id)
+                subprocess_handle = self.subprocess_handles.get(channel_id)
+            
+            if process_info is None or subprocess_handle is None or subprocess_handle.pid != pid:
+                return False
+            if subprocess_handle.poll() is not None:
+                return False
+            process_info.stalled_for = stalled_for
+        
+        # 在频道锁之外等待退出，退出回调需要获取频道锁
+        try:
+            subprocess_handle.terminate()
+            subprocess_handle.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Stalled process {pid} did not terminate gracefully, killing it")
+            subprocess_handle.kill()
+        except Exception as e:
+            logger.error(f"Error killing stalled process {pid}: {str(e)}")
+            return False
+        
+        return True
+    
     def get_process_status(self, channel_id: str) -> Optional[ProcessInfo]:
         """
         获取进程状态
@@ -268,20 +680,20 @@ class ProcessManager:
         Returns:
             ProcessInfo: 进程信息，如果不存在返回 None
         """
-        with self.lock:
-            if channel_id not in self.processes:
-                return None
-            
-            process_info = self.processes[channel_id]
-            
-            # 检查进程是否仍在运行
-            if process_info.status == ProcessStatus.RUNNING:
-                subprocess_handle = self.subprocess_handles.get(channel_id)
-                if subprocess_handle and subprocess_handle.poll() is not None:
-                    # 进程已终止，更新状态
-                    process_info.status = ProcessStatus.STOPPED
-            
-            return process_info
+        with self._registry_lock:
+            process_info = self.processes.get(channel_id)
+            subprocess_handle = self.subprocess_handles.get(channel_id)
+        
+        if process_info is None:
+            return None
+        
+        # 检查进程是否仍在运行
+        if process_info.status == ProcessStatus.RUNNING:
+            if subprocess_handle and subprocess_handle.poll() is not None:
+                # 进程已终止，更新状态
+                process_info.status = ProcessStatus.STOPPED
+        
+        return process_info
     
     def list_processes(self) -> List[ProcessInfo]:
         """
@@ -290,13 +702,55 @@ class ProcessManager:
         Returns:
             List[ProcessInfo]: 进程信息列表
         """
-        with self.lock:
-            # 更新所有进程状态
-            for channel_id in list(self.processes.keys()):
-                self.get_process_status(channel_id)
-            
-            return list(self.processes.values())
+        with self._registry_lock:
+            channel_ids = list(self.processes.keys())
+        
+        # 更新所有进程状态
+        processes = []
+        for channel_id in channel_ids:
+            process_info = self.get_process_status(channel_id)
+            if process_info is not None:
+                processes.append(process_info)
+        
+        return processes
+
+    def get_startup_stats(self) -> dict:
+        """获取最近的启动耗时统计（启动到生成首个播放列表，秒）"""
+        with self._registry_lock:
+            samples = {key: sorted(values) for key, values in self._startup_samples.items()}
+        
+        stats = {}
+        for key, values in samples.items():
+            if not values:
+                stats[key] = {'count': 0}
+                continue
+            stats[key] = {
+                'count': len(values),
+                'avg': round(sum(values) / len(values), 3),
+                'p50': round(values[len(values) // 2], 3),
+                'p90': round(values[min(int(len(values) * 0.9), len(values) - 1)], 3),
+                'max': round(values[-1], 3)
+            }
+        return stats
     
+    def get_pids(self) -> Dict[str, int]:
+        """
+        获取所有受管 FFmpeg 进程的 PID 快照
+
+        Returns:
+            Dict[str, int]: 频道 ID -> PID
+        """
+        with self._registry_lock:
+            return {channel_id: process.pid for channel_id, process in self.subprocess_handles.items()}
+
+    def is_managed(self, channel_id: str) -> bool:
+        """
+        频道是否由本进程管理器启动或接管过（供 HLS 请求热路径使用）
+
+        只读取一次字典成员，不获取任何锁，也不检查进程状态。
+        """
+        return channel_id in self.processes
+
     def is_running(self, channel_id: str) -> bool:
         """
         检查进程是否在运行
@@ -307,8 +761,22 @@ class ProcessManager:
         Returns:
             bool: 是否在运行
         """
-        with self.lock:
-            return self._is_process_running_internal(channel_id)
+        return self._is_process_running_internal(channel_id)
+    
+    def get_process_logs(self, channel_id: str, lines: Optional[int] = None) -> Optional[List[str]]:
+        """
+        获取进程最近的 stderr 输出
+        
+        Args:
+            channel_id: 频道 ID
+            lines: 返回的最大行数
+            
+        Returns:
+            List[str]: 日志行，频道从未启动过返回 None
+        """
+        if not self.stderr_drainer.has_logs(channel_id):
+            return None
+        return self.stderr_drainer.get_lines(channel_id, lines)
     
     def update_activity_time(self, channel_id: str):
         """
@@ -317,20 +785,26 @@ class ProcessManager:
         Args:
             channel_id: 频道 ID
         """
-        with self.lock:
-            if channel_id in self.processes:
-                self.processes[channel_id].last_activity_time = datetime.now(timezone.utc)
+        process_info = self.processes.get(channel_id)
+        if process_info is not None:
+            process_info.last_activity_time = datetime.now(timezone.utc)
     
     def _is_process_running_internal(self, channel_id: str) -> bool:
-        """内部方法：检查进程是否在运行（不加锁）"""
-        if channel_id not in self.processes:
+        """内部方法：检查进程是否在运行或正在启动"""
+        with self._registry_lock:
+            process_info = self.processes.get(channel_id)
+            subprocess_handle = self.subprocess_handles.get(channel_id)
+        
+        if process_info is None:
             return False
         
-        process_info = self.processes[channel_id]
+        if process_info.status == ProcessStatus.STARTING:
+            # 子进程尚未创建，或已创建且未退出（退出由监控线程处理）
+            return subprocess_handle is None or subprocess_handle.poll() is None
+        
         if process_info.status != ProcessStatus.RUNNING:
             return False
         
-        subprocess_handle = self.subprocess_handles.get(channel_id)
         if subprocess_handle and subprocess_handle.poll() is None:
             return True
         
@@ -338,21 +812,56 @@ class ProcessManager:
         process_info.status = ProcessStatus.STOPPED
         return False
     
-    def _build_ffmpeg_command(self, channel_id: str, stream_url: str, output_dir: str) -> List[str]:
+    def _build_ffmpeg_command(self, channel_id: str, stream_url: str, output_dir: str,
+                              mode: str = MODE_TRANSCODE, input_format: Optional[str] = None,
+                              ladder: Optional[AbrLadder] = None) -> List[str]:
         """构建 FFmpeg 命令"""
         playlist_path = os.path.join(output_dir, config.HLS_PLAYLIST_NAME)
         segment_pattern = os.path.join(output_dir, 'segment_%03d.ts')
         
         command = [
             config.FFMPEG_PATH,
-            '-loglevel', 'warning',
-            '-i', stream_url,
-            '-c:a', config.FFMPEG_AUDIO_CODEC,
-            '-b:a', config.FFMPEG_BITRATE,
+            '-loglevel', 'warning'
+        ]
+        
+        # 实时进度以 key=value 形式输出到 stdout
+        if self.progress_monitor is not None:
+            command += ['-progress', 'pipe:1']
+        
+        if input_format:
+            # 上游格式已由探测缓存确定，只需读取极少的数据即可开始输出
+            command += [
+                '-probesize', str(config.FAST_START_PROBESIZE),
+                '-analyzeduration', str(config.FAST_START_ANALYZEDURATION),
+                '-f', input_format
+            ]
+        
+        command += ['-i', stream_url]
+        
+        if ladder is not None:
+            # 一次解码，各档分别编码，输出到各自的子目录
+            command += ladder.build_output_args(output_dir)
+            playlist_path = ladder.build_playlist_path(output_dir)
+        elif mode == MODE_COPY:
+            # 上游已是兼容编码，直接重新封装，不解码 / 编码
+            command += ['-c:a', 'copy']
+        else:
+            command += [
+                '-c:a', config.FFMPEG_AUDIO_CODEC,
+                '-b:a', config.FFMPEG_BITRATE,
+                '-bufsize', '128k',  # 适中的缓冲区大小
+                '-maxrate', '160k',
+                '-minrate', '96k',
+                '-preset', 'fast'  # 平衡编码速度和质量
+            ]
+        
+        if ladder is None:
+            command += ['-hls_segment_filename', segment_pattern]
+        
+        command += [
             '-f', 'hls',
             '-hls_time', str(config.HLS_SEGMENT_DURATION),
             '-hls_list_size', str(config.HLS_SEGMENT_LIST_SIZE),
-            '-hls_segment_filename', segment_pattern,
             '-hls_flags', 'delete_segments+program_date_time+independent_segments+split_by_time',
             '-hls_delete_threshold', '6',  # 匹配新的列表大小，保留足够切片
             '-hls_allow_cache', '0',  # 禁用缓存，确保实时性
@@ -367,15 +876,11 @@ class ProcessManager:
             '-timeout', '5',  # 适中的超时时间
             '-probesize', '1000000',  # 适中的探测大小
             '-analyzeduration', '1000000',  # 适中的分析时间
-            '-bufsize', '128k',  # 适中的缓冲区大小
-            '-maxrate', '160k',
-            '-minrate', '96k',
             '-flags', '+global_header+low_delay',  # 保持低延迟标志
             '-mpegts_flags', 'initial_discontinuity',
             '-hls_start_number_source', 'datetime',
             '-start_number', '0',
             '-flush_packets', '1',  # 立即刷新数据包
-            '-preset', 'fast',  # 平衡编码速度和质量
             playlist_path
         ]
         
@@ -395,55 +900,233 @@ class ProcessManager:
         
         # 提取最后几行错误信息
         lines = stderr_output.strip().split('\n')
-        if lines:
+        if lines and lines[-1]:
             return lines[-1]
         
         return 'Unknown error'
     
-    def _start_process_monitor(self, channel_id: str, process: subprocess.Popen):
-        """启动进程监控线程"""
-        def monitor():
+    def _defer_until_unlocked(self, channel_id: str, callback: Callable[..., None], *args):
+        """
+        频道锁繁忙时在独立线程中重新执行监督线程回调（以 blocking=True 等待频道锁）
+        
+        频道锁可能被排队等待转码预算的 start_process 或等待进程退出的 stop_process 长时间占用，
+        监督线程不等待，继续处理其他频道的进程退出和定时器。
+        """
+        logger.debug(f"Channel {channel_id} is busy, handling {callback.__name__} in a separate thread")
+        threading.Thread(
+            target=callback,
+            args=args,
+            kwargs={'blocking': True},
+            name=f"ProcessManager-{channel_id}",
+            daemon=True
+        ).start()
+    
+    def _handle_process_exit(self, channel_id: str, process_info: ProcessInfo,
+                             stderr_stream: Optional[StderrStream], process: subprocess.Popen,
+                             blocking: bool = False):
+        """子进程退出回调（在 ProcessSupervisor 线程中执行，频道繁忙时转到独立线程；接管的进程没有 stderr）"""
+        # 等待读取器读完剩余输出
+        if stderr_stream is not None:
+            stderr_stream.closed.wait(timeout=1.0)
+            stderr_output = stderr_stream.get_output()
+        else:
+            stderr_output = ''
+        
+        channel_lock = self._get_channel_lock(channel_id)
+        if not channel_lock.acquire(blocking=blocking):
+            self._defer_until_unlocked(channel_id, self._handle_process_exit, channel_id, process_info,
+                                       stderr_stream, process)
+            return
+        try:
+            if self.subprocess_handles.get(channel_id) is not process:
+                # 进程已被主动停止并清理，或已被新进程替换
+                return
+            
+            was_starting = process_info.status == ProcessStatus.STARTING
+            if process_info.stalled_for is not None:
+                error_msg = f"Output stalled for {process_info.stalled_for:.0f}s"
+                process_info.status = ProcessStatus.ERROR
+                process_info.error_message = error_msg
+                logger.error(f"FFmpeg process for channel {channel_id} was killed: {error_msg}")
+            elif process.returncode == 0 and not was_starting:
+                process_info.status = ProcessStatus.STOPPED
+                logger.info(f"FFmpeg process for channel {channel_id} exited normally")
+                error_msg = None
+            else:
+                error_msg = self._parse_ffmpeg_error(stderr_output)
+                process_info.status = ProcessStatus.ERROR
+                process_info.error_message = error_msg
+                if was_starting:
+                    logger.error(f"FFmpeg process for channel {channel_id} failed to start: {error_msg}")
+                else:
+                    logger.error(f"FFmpeg process for channel {channel_id} exited with error: {error_msg}")
+            
+            # 清理资源
+            self._cleanup_process_resources(channel_id)
+        finally:
+            channel_lock.release()
+        
+        # 直通模式或快速启动失败时清除该流地址的探测缓存，重启后回退为转码并由 FFmpeg 自行探测格式
+        if (was_starting and error_msg is not None and (process_info.mode == MODE_COPY or process_info.input_format)
+                and self.stream_probe is not None and process_info.stalled_for is None):
+            logger.warning(f"Channel {channel_id} failed to start with cached probe result "
+                           f"(mode {process_info.mode}, input format {process_info.input_format}), "
+                           f"falling back to transcoding without input hints")
+            self.stream_probe.mark_failed(process_info.stream_url, f'{process_info.mode} mode failed to start: {error_msg}')
+        
+        if was_starting and not process_info.ready.done():
+            process_info.ready.set_exception(RuntimeError(f"FFmpeg process failed to start: {error_msg}"))
+        
+        # 使用错误处理器处理错误（在频道锁之外，恢复回调可能重新启动进程）
+        if error_msg is not None and self.error_handler:
+            if process_info.stalled_for is not None:
+                additional_context = {
+                    'output_stalled': True,
+                    'stalled_seconds': round(process_info.stalled_for, 1),
+                    'stalled_pid': process.pid,
+                    'was_starting': was_starting,
+                    'stream_url': process_info.stream_url
+                }
+            elif was_starting:
+                additional_context = {
+                    'process_start_failed': True,
+                    'stderr_output': stderr_output,
+                    'stream_url': process_info.stream_url
+                }
+            else:
+                additional_context = {
+                    'process_crashed': True,
+                    'crashed_pid': process.pid,
+                    'return_code': process.returncode,
+                    'stderr_output': stderr_output,
+                    'stream_url': process_info.stream_url
+                }
+            self.error_handler.handle_error(
+                channel_id=channel_id,
+                error_message=error_msg,
+                additional_context=additional_context
+            )
+        
+        # 按重启策略安排自动重启
+        uptime = (datetime.now(timezone.utc) - process_info.start_time).total_seconds()
+        reason = f"exit code {process.returncode}" + (f": {error_msg}" if error_msg else '')
+        self._schedule_restart(channel_id, process_info.stream_url, reason, uptime)
+    
+    def _schedule_restart(self, channel_id: str, stream_url: str, reason: str, uptime: float = 0.0):
+        """安排频道的自动重启（指数退避 + 随机抖动）"""
+        policy = self.restart_policy
+        if not policy.enabled:
+            return
+        
+        with self._get_channel_lock(channel_id):
+            if self._is_process_running_internal(channel_id):
+                # 已被外部重新启动
+                return
+            
+            state = self._restart_states.get(channel_id)
+            if state is None:
+                state = self._restart_states[channel_id] = RestartState()
+            
+            # 稳定运行足够长时间后恢复重试预算
+            if uptime >= policy.stable_after:
+                state.attempts = 0
+            
+            if state.attempts >= policy.max_retries:
+                state.gave_up = True
+                state.record('gave_up', reason, state.attempts)
+                logger.error(f"FFmpeg process for channel {channel_id} failed {state.attempts} restarts in a row, giving up")
+                return
+            
+            state.attempts += 1
+            delay = policy.next_delay(state.attempts)
+            state.cancel_pending()
+            state.timer = self.supervisor.call_later(
+                delay, functools.partial(self._restart_process, channel_id, stream_url)
+            )
+            state.record('scheduled', reason, state.attempts, delay)
+            logger.warning(f"Restarting FFmpeg process for channel {channel_id} in {delay:.1f}s "
+                           f"({state.attempts}/{policy.max_retries})")
+    
+    def _restart_process(self, channel_id: str, stream_url: str, blocking: bool = False):
+        """执行自动重启（定时器回调，在 ProcessSupervisor 线程中执行；频道繁忙时转到独立线程）"""
+        channel_lock = self._get_channel_lock(channel_id)
+        if not channel_lock.acquire(blocking=blocking):
+            self._defer_until_unlocked(channel_id, self._restart_process, channel_id, stream_url)
+            return
+        try:
+            # 等待频道锁期间重启可能已被 stop_process 取消
+            state = self._restart_states.get(channel_id)
+            if state is None or state.timer is None:
+                return
+            state.timer = None
+            attempt = state.attempts
+            previous = self.processes.get(channel_id)
+            
             try:
-                # 监控进程状态
-                process.wait()
-                
-                with self.lock:
-                    if channel_id in self.processes:
-                        process_info = self.processes[channel_id]
-                        
-                        if process.returncode == 0:
-                            process_info.status = ProcessStatus.STOPPED
-                            logger.info(f"FFmpeg process for channel {channel_id} exited normally")
-                        else:
-                            # 读取错误信息
-                            stderr_output = process.stderr.read().decode('utf-8', errors='replace')
-                            error_msg = self._parse_ffmpeg_error(stderr_output)
-                            
-                            process_info.status = ProcessStatus.ERROR
-                            process_info.error_message = error_msg
-                            logger.error(f"FFmpeg process for channel {channel_id} exited with error: {error_msg}")
-                            
-                            # 使用错误处理器处理错误
-                            if self.error_handler:
-                                self.error_handler.handle_error(
-                                    channel_id=channel_id,
-                                    error_message=error_msg,
-                                    additional_context={
-                                        'process_crashed': True,
-                                        'crashed_pid': process.pid,
-                                        'return_code': process.returncode,
-                                        'stderr_output': stderr_output
-                                    }
-                                )
-                        
-                        # 清理资源
-                        self._cleanup_process_resources(channel_id)
-                        
+                # 自动重启不排队等待转码预算
+                self.start_process(channel_id, stream_url,
+                                   priority=previous.priority if previous else None,
+                                   admission_timeout=0, probe_upstream=False)
+            except ProcessAlreadyRunningError:
+                state.record('skipped', 'process already running', attempt)
+                return
+            except CircuitOpenError as e:
+                # 上游主机熔断期间推迟重启，不消耗重试预算
+                delay = e.retry_after + random.uniform(0, self.restart_policy.initial_delay)
+                state.timer = self.supervisor.call_later(
+                    delay, functools.partial(self._restart_process, channel_id, stream_url)
+                )
+                state.record('deferred', str(e), attempt, delay)
+                logger.info(f"Deferred restart of channel {channel_id} by {delay:.1f}s: {str(e)}")
+                return
+            except AdmissionRejectedError as e:
+                # 转码预算不足时推迟重启，不消耗重试预算
+                delay = self.restart_policy.next_delay(attempt)
+                state.timer = self.supervisor.call_later(
+                    delay, functools.partial(self._restart_process, channel_id, stream_url)
+                )
+                state.record('deferred', str(e), attempt, delay)
+                logger.info(f"Deferred restart of channel {channel_id} by {delay:.1f}s: {str(e)}")
+                return
             except Exception as e:
-                logger.error(f"Error in process monitor for channel {channel_id}: {str(e)}")
+                state.record('failed', str(e), attempt)
+                logger.error(f"Failed to restart FFmpeg process for channel {channel_id}: {str(e)}")
+                self._schedule_restart(channel_id, stream_url, str(e))
+                return
+            
+            state.total_restarts += 1
+            state.record('restarted', None, attempt)
+            logger.info(f"Restarted FFmpeg process for channel {channel_id} (attempt {attempt})")
+        finally:
+            channel_lock.release()
+    
+    def get_restart_info(self, channel_id: str) -> Optional[dict]:
+        """
+        获取频道的自动重启状态
         
-        thread = threading.Thread(target=monitor, daemon=True, name=f"ProcessMonitor-{channel_id}")
-        thread.start()
+        Args:
+            channel_id: 频道 ID
+            
+        Returns:
+            dict: 重启次数、待执行的重启和重启历史，从未发生重启返回 None
+        """
+        state = self._restart_states.get(channel_id)
+        if state is None:
+            return None
+        return state.to_dict(self.restart_policy)
+    
+    def _admission_cost(self, mode: str, variants: Optional[List[str]] = None) -> Optional[float]:
+        """运行模式对应的准入开销，转码使用准入控制的默认开销"""
+        if variants:
+            return config.ABR_COST_PERCENT
+        if mode == MODE_COPY:
+            return config.PASSTHROUGH_COST_PERCENT
+        return None
+    
+    def _release_admission(self, channel_id: str):
+        """归还频道占用的转码预算"""
+        if self.admission_controller is not None:
+            self.admission_controller.release(channel_id)
     
     def _cleanup_process_resources(self, channel_id: str):
         """清理进程相关资源"""
@@ -452,8 +1135,17 @@ class ProcessManager:
             self.concurrency_control.release_lock(channel_id)
             
             # 清理子进程句柄
-            if channel_id in self.subprocess_handles:
-                del self.subprocess_handles[channel_id]
+            with self._registry_lock:
+                process = self.subprocess_handles.pop(channel_id, None)
+            
+            # 移除持久化记录和进度统计（只移除本次进程的记录）
+            if self.process_registry is not None and process is not None:
+                self.process_registry.unregister(channel_id, process.pid)
+            if self.progress_monitor is not None and process is not None:
+                self.progress_monitor.detach(channel_id, process.pid)
+            
+            # 归还转码预算
+            self._release_admission(channel_id)
             
             logger.debug(f"Cleaned up resources for channel {channel_id}")
             
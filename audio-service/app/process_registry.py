@@ -0,0 +1,286 @@
+"""
+FFmpeg 进程持久化注册表
+
+记录每个受管 FFmpeg 进程的 PID、频道、流地址、启动时间和锁文件，写入 JSON 文件。
+服务重启（部署、systemctl restart、崩溃后拉起）时据此重新接管仍在运行的 FFmpeg，
+听众的播放不会因为服务重启而中断；只有注册表之外的残留进程才会被清理。
+
+PID 可能被复用，接管前会核对 /proc/<pid>/stat 中的进程启动时间和命令行中的输出目录。
+"""
+
+import os
+import json
+import time
+import signal
+import threading
+import subprocess
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_VERSION = 1
+
+# 接管的进程不是本服务的子进程，无法获取真实退出码
+ADOPTED_EXIT_CODE = -1
+
+# 旧版 FFmpegManager 的频道锁文件，内容为其 FFmpeg 的 "<pid> <启动时间>"
+LEGACY_LOCK_FILE_PATTERN = "/tmp/ffmpeg_lock_{}.lock"
+
+
+def read_start_ticks(pid: int, proc_root: str = '/proc') -> Optional[int]:
+    """
+    读取进程启动时间（系统启动后的时钟滴答数，/proc/<pid>/stat 第 22 个字段）
+
+    Returns:
+        int: 启动时间，进程不存在或已成为僵尸进程时返回 None
+    """
+    try:
+        with open(os.path.join(proc_root, str(pid), 'stat'), 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return None
+
+    # comm 字段可能包含空格和括号，从最后一个 ')' 之后开始解析
+    fields = stat[stat.rfind(b')') + 2:].split()
+    try:
+        if fields[0] in (b'Z', b'X'):
+            return None
+        return int(fields[19])
+    except (IndexError, ValueError):
+        return None
+
+
+def read_cmdline(pid: int, proc_root: str = '/proc') -> Optional[List[str]]:
+    """读取进程命令行，进程不存在时返回 None"""
+    try:
+        with open(os.path.join(proc_root, str(pid), 'cmdline'), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    return [arg.decode('utf-8', errors='replace') for arg in data.split(b'\0') if arg]
+
+
+def read_pid_index(lock_file_path: str) -> Optional[int]:
+    """
+    读取旧版 FFmpegManager 在频道锁文件中记录的 FFmpeg 进程（"<pid> <启动时间>"）
+
+    Returns:
+        int: 进程仍在运行时返回 PID（启动时间一致，排除 PID 复用），否则返回 None
+    """
+    try:
+        with open(lock_file_path, 'r') as f:
+            fields = f.read().split()
+        pid, start_ticks = int(fields[0]), int(fields[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pid if read_start_ticks(pid) == start_ticks else None
+
+
+class AdoptedProcess:
+    """
+    接管的 FFmpeg 进程句柄
+
+    提供与 subprocess.Popen 相同的 pid / poll / wait / terminate / kill 接口，
+    可直接交给 ProcessManager 和 ProcessSupervisor（pidfd 不要求是子进程）。
+    原 stderr 管道随上一个服务进程关闭，接管后不再有 stderr 输出。
+    """
+
+    def __init__(self, pid: int, start_ticks: Optional[int], args: Optional[List[str]] = None):
+        self.pid = pid
+        self.start_ticks = start_ticks
+        self.args = args or []
+        self.stderr = None
+        self.returncode: Optional[int] = None
+
+    def _is_alive(self) -> bool:
+        if self.start_ticks is not None:
+            # 启动时间不一致说明 PID 已被复用
+            return read_start_ticks(self.pid) == self.start_ticks
+        try:
+            os.kill(self.pid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+
+    def poll(self) -> Optional[int]:
+        """检查进程是否已退出"""
+        if self.returncode is None and not self._is_alive():
+            self.returncode = ADOPTED_EXIT_CODE
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        """等待进程退出（非子进程无法 waitpid，按短间隔轮询）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(self.args, timeout)
+            time.sleep(0.05)
+        return self.returncode
+
+    def send_signal(self, sig: int):
+        """向进程发送信号（进程已退出时忽略）"""
+        if self.poll() is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class ProcessRegistry:
+    """
+    进程注册表
+
+    每次启动 / 停止进程时整体重写 JSON 文件（先写临时文件再原子替换），
+    服务异常退出时文件内容也始终完整。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        logger.info(f"ProcessRegistry initialized with path={path}")
+
+    def exists(self) -> bool:
+        """注册表文件是否存在"""
+        return os.path.exists(self.path)
+
+    def load(self) -> Dict[str, dict]:
+        """
+        读取上一个服务进程留下的注册表
+
+        Returns:
+            Dict[str, dict]: 频道 ID -> 进程记录，文件不存在或损坏时返回空字典
+        """
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read process registry {self.path}: {str(e)}")
+            return {}
+
+        if not isinstance(data, dict) or data.get('version') != REGISTRY_VERSION:
+            logger.warning(f"Ignoring process registry {self.path} with unsupported format")
+            return {}
+        return dict(data.get('processes') or {})
+
+    def has_pending(self) -> bool:
+        """注册表文件中是否有待创建（尚未写入 PID）的记录"""
+        return any(entry.get('pid') is None for entry in self.load().values())
+
+    def load_pids(self) -> List[int]:
+        """读取注册表文件中记录的所有 PID（不核对进程是否存在）"""
+        pids = []
+        for entry in self.load().values():
+            try:
+                pids.append(int(entry['pid']))
+            except (KeyError, TypeError, ValueError):
+                continue
+        return pids
+
+    def register(self, channel_id: str, pid: Optional[int], stream_url: str, start_time: datetime,
+                 lock_file: Optional[str] = None, priority: Optional[str] = None, mode: Optional[str] = None,
+                 variants: Optional[List[str]] = None):
+        """
+        记录新启动的进程
+
+        pid 为 None 时记录为待创建：在创建进程之前写入，服务在创建进程后、写入 PID 之前
+        崩溃时，下次启动据此得知可能存在未登记的 FFmpeg。
+        """
+        entry = {
+            'pid': pid,
+            'start_ticks': read_start_ticks(pid) if pid is not None else None,
+            'stream_url': stream_url,
+            'start_time': start_time.isoformat(),
+            'lock_file': lock_file,
+            'priority': priority,
+            'mode': mode,
+            'variants': variants or []
+        }
+        with self._lock:
+            self._entries[channel_id] = entry
+            self._save()
+
+    def unregister(self, channel_id: str, pid: Optional[int] = None):
+        """移除进程记录（指定 pid 时只移除匹配的记录）"""
+        with self._lock:
+            entry = self._entries.get(channel_id)
+            if entry is None or (pid is not None and entry['pid'] != pid):
+                return
+            del self._entries[channel_id]
+            self._save()
+
+    def replace_all(self, entries: Dict[str, dict]):
+        """用给定记录整体替换注册表"""
+        with self._lock:
+            self._entries = dict(entries)
+            self._save()
+
+    def get_pids(self) -> Dict[str, int]:
+        """获取注册表中所有进程的 PID"""
+        with self._lock:
+            return {channel_id: entry['pid'] for channel_id, entry in self._entries.items()}
+
+    def _save(self):
+        """原子写入注册表文件（调用方持有 _lock）"""
+        data = {
+            'version': REGISTRY_VERSION,
+            'owner_pid': os.getpid(),
+            'processes': self._entries
+        }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Failed to write process registry {self.path}: {str(e)}")
+
+    def verify(self, channel_id: str, entry: dict, output_dir: str) -> Optional[AdoptedProcess]:
+        """
+        核对注册表记录对应的进程是否仍是该频道的 FFmpeg
+
+        Returns:
+            AdoptedProcess: 可接管的进程句柄，进程已退出或 PID 已被复用时返回 None
+        """
+        try:
+            pid = int(entry['pid'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+        start_ticks = read_start_ticks(pid)
+        if start_ticks is None or start_ticks != entry.get('start_ticks'):
+            return None
+
+        cmdline = read_cmdline(pid)
+        # 输出文件位于频道目录内（加分隔符避免频道 1 匹配到频道 10 的目录）
+        prefix = output_dir.rstrip(os.sep) + os.sep
+        if not cmdline or not any(arg.startswith(prefix) for arg in cmdline):
+            logger.warning(f"PID {pid} from process registry no longer belongs to channel {channel_id}")
+            return None
+
+        return AdoptedProcess(pid, start_ticks, cmdline)
+
+    def get_status(self) -> dict:
+        """获取注册表状态"""
+        with self._lock:
+            return {
+                'path': self.path,
+                'registered_processes': len(self._entries)
+            }
@@ -0,0 +1,228 @@
+"""
+FFmpeg 进程资源采样器
+
+后台线程按固定间隔，在一次遍历中读取所有受管 FFmpeg 进程的 /proc/<pid>/stat、
+statm 和 io，计算每个频道的 CPU 使用率、常驻内存和磁盘读写速率，
+并为每个频道保留一小段滚动历史，用于找出转码开销最高的频道。
+"""
+
+import os
+import threading
+import time
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class _ProcessCounters:
+    """一次采样读取到的累计计数"""
+
+    __slots__ = ('timestamp', 'cpu_ticks', 'rss_bytes', 'read_bytes', 'write_bytes')
+
+    def __init__(self, timestamp: float, cpu_ticks: int, rss_bytes: int,
+                 read_bytes: Optional[int], write_bytes: Optional[int]):
+        self.timestamp = timestamp
+        self.cpu_ticks = cpu_ticks
+        self.rss_bytes = rss_bytes
+        self.read_bytes = read_bytes
+        self.write_bytes = write_bytes
+
+
+class _ChannelSamples:
+    """单个频道的采样历史"""
+
+    def __init__(self, pid: int, history_size: int):
+        self.pid = pid
+        self.last: Optional[_ProcessCounters] = None
+        self.history: Deque[dict] = deque(maxlen=history_size)
+
+
+class ProcessSampler:
+    """
+    进程资源采样器
+
+    只读取 /proc 中的文本文件，不依赖 psutil，也不获取 ProcessManager 的频道锁。
+    """
+
+    def __init__(self, get_pids: Callable[[], Dict[str, int]], interval: float = 5.0, history_size: int = 12,
+                 proc_root: str = '/proc'):
+        self.get_pids = get_pids
+        self.interval = interval
+        self.history_size = history_size
+        self.proc_root = proc_root
+        self.available = os.path.isdir(os.path.join(proc_root, 'self'))
+
+        self._channels: Dict[str, _ChannelSamples] = {}
+        self._lock = threading.Lock()
+        self._last_sweep_ms = 0.0
+
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        logger.info(f"ProcessSampler initialized with interval={interval}s, history_size={history_size}")
+
+    def start(self):
+        """启动采样器"""
+        if self._running:
+            logger.warning("ProcessSampler is already running")
+            return
+
+        if not self.available:
+            logger.warning(f"{self.proc_root} is not available, process sampling disabled")
+            return
+
+        self._running = True
+        self._stop_event.clear()
+
+        self._thread = threading.Thread(target=self._sample_loop, name="ProcessSampler", daemon=True)
+        self._thread.start()
+
+        logger.info("ProcessSampler started")
+
+    def stop(self):
+        """停止采样器"""
+        if not self._running:
+            return
+
+        self._running = False
+        self._stop_event.set()
+
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+
+        logger.info("ProcessSampler stopped")
+
+    def is_running(self) -> bool:
+        """检查采样器是否在运行"""
+        return self._running and self._thread is not None and self._thread.is_alive()
+
+    def _sample_loop(self):
+        """采样循环"""
+        while not self._stop_event.is_set():
+            try:
+                self.sample_once()
+            except Exception as e:
+                logger.error(f"Error in process sampler: {str(e)}")
+
+            self._stop_event.wait(self.interval)
+
+    def sample_once(self):
+        """对所有受管进程执行一次采样"""
+        started = time.perf_counter()
+        pids = self.get_pids()
+
+        samples = {}
+        for channel_id, pid in pids.items():
+            counters = self._read_counters(pid)
+            if counters is not None:
+                samples[channel_id] = (pid, counters)
+
+        with self._lock:
+            # 移除已结束的频道
+            for channel_id in list(self._channels):
+                if channel_id not in samples:
+                    del self._channels[channel_id]
+
+            for channel_id, (pid, counters) in samples.items():
+                state = self._channels.get(channel_id)
+                if state is None or state.pid != pid:
+                    state = self._channels[channel_id] = _ChannelSamples(pid, self.history_size)
+
+                if state.last is not None:
+                    state.history.append(self._compute_rates(state.last, counters))
+                state.last = counters
+
+            self._last_sweep_ms = (time.perf_counter() - started) * 1000
+
+    def _read_counters(self, pid: int) -> Optional[_ProcessCounters]:
+        """读取进程的累计 CPU 时间、常驻内存和 I/O 字节数"""
+        base = os.path.join(self.proc_root, str(pid))
+        try:
+            with open(os.path.join(base, 'stat'), 'rb') as f:
+                stat = f.read()
+            with open(os.path.join(base, 'statm'), 'rb') as f:
+                statm = f.read().split()
+        except OSError:
+            return None
+
+        # comm 字段可能包含空格和括号，从最后一个 ')' 之后开始解析
+        fields = stat[stat.rfind(b')') + 2:].split()
+        try:
+            cpu_ticks = int(fields[11]) + int(fields[12])  # utime + stime
+            rss_bytes = int(statm[1]) * _PAGE_SIZE
+        except (IndexError, ValueError):
+            return None
+
+        read_bytes, write_bytes = self._read_io(base)
+        return _ProcessCounters(time.monotonic(), cpu_ticks, rss_bytes, read_bytes, write_bytes)
+
+    @staticmethod
+    def _read_io(base: str) -> Tuple[Optional[int], Optional[int]]:
+        """读取 /proc/<pid>/io（需要相同用户或 CAP_SYS_PTRACE，不可读时返回 None）"""
+        read_bytes = write_bytes = None
+        try:
+            with open(os.path.join(base, 'io'), 'rb') as f:
+                for line in f:
+                    if line.startswith(b'rchar:'):
+                        read_bytes = int(line.split()[1])
+                    elif line.startswith(b'wchar:'):
+                        write_bytes = int(line.split()[1])
+        except (OSError, ValueError):
+            pass
+        return read_bytes, write_bytes
+
+    @staticmethod
+    def _compute_rates(previous: _ProcessCounters, current: _ProcessCounters) -> dict:
+        """根据两次采样计算速率"""
+        elapsed = max(current.timestamp - previous.timestamp, 1e-6)
+        sample = {
+            'cpu_percent': round((current.cpu_ticks - previous.cpu_ticks) / _CLOCK_TICKS / elapsed * 100, 1),
+            'rss_bytes': current.rss_bytes,
+            'read_bytes_per_sec': None,
+            'write_bytes_per_sec': None
+        }
+        if current.read_bytes is not None and previous.read_bytes is not None:
+            sample['read_bytes_per_sec'] = int((current.read_bytes - previous.read_bytes) / elapsed)
+        if current.write_bytes is not None and previous.write_bytes is not None:
+            sample['write_bytes_per_sec'] = int((current.write_bytes - previous.write_bytes) / elapsed)
+        return sample
+
+    def get_channel_stats(self, channel_id: str, include_history: bool = False) -> Optional[dict]:
+        """
+        获取频道的资源使用情况
+
+        Returns:
+            dict: 最近一次的 CPU / 内存 / I/O 速率及历史平均 CPU，尚无两次采样时返回 None
+        """
+        with self._lock:
+            state = self._channels.get(channel_id)
+            if state is None or not state.history:
+                return None
+            history = list(state.history)
+
+        stats = dict(history[-1])
+        stats['avg_cpu_percent'] = round(sum(sample['cpu_percent'] for sample in history) / len(history), 1)
+        stats['peak_rss_bytes'] = max(sample['rss_bytes'] for sample in history)
+        if include_history:
+            stats['history'] = history
+        return stats
+
+    def get_status(self) -> dict:
+        """获取采样器状态"""
+        with self._lock:
+            latest = [state.history[-1] for state in self._channels.values() if state.history]
+            last_sweep_ms = self._last_sweep_ms
+        return {
+            'running': self.is_running(),
+            'interval': self.interval,
+            'sampled_processes': len(latest),
+            'total_cpu_percent': round(sum(sample['cpu_percent'] for sample in latest), 1),
+            'total_rss_bytes': sum(sample['rss_bytes'] for sample in latest),
+            'last_sweep_ms': round(last_sweep_ms, 2)
+        }
@@ -0,0 +1,258 @@
+"""
+FFmpeg 子进程监督器
+
+单个线程监视所有 FFmpeg 子进程的退出，取代每个进程一个阻塞在 process.wait()
+的监控线程。线程数量不随频道数增长。
+
+- Linux 5.3+ 使用 pidfd：子进程退出时 pidfd 可读，由 selectors (epoll) 统一等待
+- 不支持 pidfd 时退化为定时 poll()（waitpid WNOHANG）
+- 维护一个定时任务堆（用于延迟重启等），在同一线程中按到期时间执行
+"""
+
+import os
+import heapq
+import itertools
+import selectors
+import subprocess
+import threading
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ExitCallback = Callable[[subprocess.Popen], None]
+
+
+class _WatchedProcess:
+    """被监视的子进程"""
+
+    __slots__ = ('channel_id', 'process', 'callback', 'pidfd')
+
+    def __init__(self, channel_id: str, process: subprocess.Popen, callback: ExitCallback, pidfd: Optional[int]):
+        self.channel_id = channel_id
+        self.process = process
+        self.callback = callback
+        self.pidfd = pidfd
+
+
+class TimerHandle:
+    """定时任务句柄"""
+
+    __slots__ = ('deadline', 'callback', 'cancelled')
+
+    def __init__(self, deadline: float, callback: Callable[[], None]):
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        """取消定时任务（已执行的任务无影响）"""
+        self.cancelled = True
+
+    def remaining(self) -> float:
+        """距执行的剩余秒数"""
+        return max(0.0, self.deadline - time.monotonic())
+
+
+class ProcessSupervisor:
+    """
+    子进程监督器
+
+    watch() 注册子进程和退出回调；子进程退出后在监督线程中回收进程并调用回调。
+    call_later() 注册定时任务。回调均在监督线程中执行，应避免长时间阻塞。
+    """
+
+    def __init__(self, poll_interval: float = 0.5):
+        self.poll_interval = poll_interval
+        self.backend = 'pidfd' if self._pidfd_supported() else 'polling'
+
+        self._watched: Dict[int, _WatchedProcess] = {}  # pid -> 子进程
+        self._timers: List[Tuple[float, int, TimerHandle]] = []  # (到期时间, 序号, 句柄) 最小堆
+        self._timer_sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_read, False)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ, None)
+
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+        logger.info(f"ProcessSupervisor initialized with {self.backend} backend")
+
+    @staticmethod
+    def _pidfd_supported() -> bool:
+        """检查当前系统是否支持 pidfd"""
+        if not hasattr(os, 'pidfd_open'):
+            return False
+        try:
+            os.close(os.pidfd_open(os.getpid()))
+            return True
+        except OSError:
+            return False
+
+    def start(self):
+        """启动监督线程"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+
+        self._thread = threading.Thread(target=self._supervise_loop, daemon=True, name="ProcessSupervisor")
+        self._thread.start()
+        logger.info("ProcessSupervisor started")
+
+    def stop(self):
+        """停止监督线程"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+
+        self._wakeup()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        logger.info("ProcessSupervisor stopped")
+
+    def is_running(self) -> bool:
+        """检查监督线程是否在运行"""
+        return self._running
+
+    def watch(self, channel_id: str, process: subprocess.Popen, callback: ExitCallback):
+        """
+        监视子进程退出
+
+        Args:
+            channel_id: 频道 ID
+            process: 子进程
+            callback: 退出回调，参数为已回收的子进程
+        """
+        if not self._running:
+            self.start()
+
+        pidfd = None
+        if self.backend == 'pidfd':
+            try:
+                pidfd = os.pidfd_open(process.pid)
+            except OSError as e:
+                # 进程已退出并被回收，交由轮询路径处理
+                logger.debug(f"pidfd_open failed for PID {process.pid}: {str(e)}")
+
+        watched = _WatchedProcess(channel_id, process, callback, pidfd)
+        with self._lock:
+            self._watched[process.pid] = watched
+            if pidfd is not None:
+                self._selector.register(pidfd, selectors.EVENT_READ, watched)
+        self._wakeup()
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> TimerHandle:
+        """
+        在监督线程中延迟执行回调
+
+        Args:
+            delay: 延迟秒数
+            callback: 回调函数
+
+        Returns:
+            TimerHandle: 可用于取消的句柄
+        """
+        if not self._running:
+            self.start()
+
+        handle = TimerHandle(time.monotonic() + delay, callback)
+        with self._lock:
+            heapq.heappush(self._timers, (handle.deadline, next(self._timer_sequence), handle))
+        self._wakeup()
+        return handle
+
+    def _wakeup(self):
+        try:
+            os.write(self._wakeup_write, b'\0')
+        except OSError:
+            pass
+
+    def _supervise_loop(self):
+        """监督线程主循环"""
+        while self._running:
+            timeout = self.poll_interval
+            with self._lock:
+                if self._timers:
+                    timeout = min(timeout, max(0.0, self._timers[0][0] - time.monotonic()))
+
+            try:
+                events = self._selector.select(timeout=timeout)
+            except Exception as e:
+                logger.error(f"Error in process supervisor select: {str(e)}")
+                continue
+
+            for key, _ in events:
+                if key.data is None:
+                    try:
+                        while os.read(self._wakeup_read, 4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+
+                self._reap(key.data)
+
+            # 没有 pidfd 的子进程通过 waitpid(WNOHANG) 检查
+            with self._lock:
+                polled = [watched for watched in self._watched.values() if watched.pidfd is None]
+            for watched in polled:
+                if watched.process.poll() is not None:
+                    self._reap(watched)
+
+            self._run_due_timers()
+
+    def _run_due_timers(self):
+        """执行到期的定时任务"""
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            while self._timers and self._timers[0][0] <= now:
+                due.append(heapq.heappop(self._timers)[2])
+
+        for handle in due:
+            if handle.cancelled:
+                continue
+            try:
+                handle.callback()
+            except Exception as e:
+                logger.error(f"Error in supervisor timer callback: {str(e)}")
+
+    def _reap(self, watched: _WatchedProcess):
+        """回收已退出的子进程并调用退出回调"""
+        with self._lock:
+            if self._watched.get(watched.process.pid) is not watched:
+                return
+            del self._watched[watched.process.pid]
+            if watched.pidfd is not None:
+                try:
+                    self._selector.unregister(watched.pidfd)
+                except (KeyError, ValueError):
+                    pass
+                os.close(watched.pidfd)
+
+        try:
+            watched.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Process {watched.process.pid} for channel {watched.channel_id} reported exit but could not be reaped")
+
+        try:
+            watched.callback(watched.process)
+        except Exception as e:
+            logger.error(f"Error in exit callback for channel {watched.channel_id}: {str(e)}")
+
+    def get_status(self) -> dict:
+        """获取监督器状态"""
+        with self._lock:
+            watched = len(self._watched)
+            timers = sum(1 for _, _, handle in self._timers if not handle.cancelled)
+        return {
+            'running': self._running,
+            'backend': self.backend,
+            'watched_processes': watched,
+            'pending_timers': timers
+        }
@@ -0,0 +1,189 @@
+"""
+FFmpeg 实时进度统计
+
+FFmpeg 以 -progress pipe:1 启动后，每个统计周期（默认 0.5 秒）向 stdout 输出一组
+key=value 行，以 progress=continue / progress=end 结束。StderrDrainer 的读取线程
+逐行读取 stdout 并交给本模块解析，得到每个频道的实时转码速度、输出时长、码率、
+丢帧 / 重复帧和输出字节数，无需等到进程退出才发现转码异常。
+
+解析只保留固定的几个字段，每个频道的内存占用固定。
+"""
+
+import time
+import threading
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 只解析这些字段，其余行直接丢弃
+_TRACKED_KEYS = frozenset((
+    'speed', 'out_time_us', 'out_time_ms', 'bitrate', 'drop_frames', 'dup_frames', 'total_size'
+))
+
+
+def _parse_float(value: Optional[str], suffix: str = '') -> Optional[float]:
+    """解析数值，N/A 或格式错误时返回 None"""
+    if not value:
+        return None
+    value = value.strip()
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+class ChannelProgress:
+    """单个 FFmpeg 进程的进度统计"""
+
+    def __init__(self, channel_id: str, pid: Optional[int] = None):
+        self.channel_id = channel_id
+        self.pid = pid
+        self._pending: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+        self.speed: Optional[float] = None
+        self.out_time: Optional[float] = None  # 已输出的媒体时长 (秒)
+        self.bitrate: Optional[float] = None  # kbit/s
+        self.drop_frames = 0
+        self.dup_frames = 0
+        self.total_size: Optional[int] = None
+        self.reports = 0
+        self.ended = False
+        self.updated_at: Optional[datetime] = None
+        self.last_report_monotonic: Optional[float] = None
+        # out_time 最近一次增长的时间（单调时钟），用于判断输出是否停滞
+        self.last_advance_monotonic: Optional[float] = None
+
+    def feed(self, line: str):
+        """
+        解析一行 -progress 输出（在 StderrDrainer 线程中调用）
+
+        Args:
+            line: 一行 key=value 文本
+        """
+        key, sep, value = line.partition('=')
+        if not sep:
+            return
+        key = key.strip()
+        if key == 'progress':
+            self._commit(value.strip() == 'end')
+        elif key in _TRACKED_KEYS:
+            self._pending[key] = value
+
+    def _commit(self, ended: bool):
+        """一组统计结束，更新快照"""
+        pending = self._pending
+        self._pending = {}
+
+        # 旧版本 FFmpeg 只输出 out_time_ms，其单位实际也是微秒
+        out_time_us = _parse_int(pending.get('out_time_us') or pending.get('out_time_ms'))
+        now = time.monotonic()
+
+        with self._lock:
+            if out_time_us is not None and out_time_us >= 0:
+                out_time = out_time_us / 1_000_000
+                if self.out_time is None or out_time > self.out_time:
+                    self.last_advance_monotonic = now
+                self.out_time = out_time
+            self.speed = _parse_float(pending.get('speed'), 'x')
+            self.bitrate = _parse_float(pending.get('bitrate'), 'kbits/s')
+            self.drop_frames = _parse_int(pending.get('drop_frames')) or 0
+            self.dup_frames = _parse_int(pending.get('dup_frames')) or 0
+            self.total_size = _parse_int(pending.get('total_size'))
+            self.reports += 1
+            self.ended = ended
+            self.updated_at = datetime.now(timezone.utc)
+            self.last_report_monotonic = now
+
+    def to_dict(self) -> dict:
+        """转换为状态字典"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'pid': self.pid,
+                'speed': self.speed,
+                'out_time': round(self.out_time, 3) if self.out_time is not None else None,
+                'bitrate_kbps': self.bitrate,
+                'drop_frames': self.drop_frames,
+                'dup_frames': self.dup_frames,
+                'total_size': self.total_size,
+                'reports': self.reports,
+                'ended': self.ended,
+                'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+                'seconds_since_report': (
+                    round(now - self.last_report_monotonic, 1) if self.last_report_monotonic is not None else None
+                )
+            }
+
+
+class ProgressMonitor:
+    """
+    进度统计注册表
+
+    attach() 为新启动的进程创建统计对象，返回交给 StderrDrainer 的逐行回调；
+    进程结束后 detach() 移除统计。
+    """
+
+    def __init__(self):
+        self._channels: Dict[str, ChannelProgress] = {}
+        self._lock = threading.Lock()
+
+        logger.info("ProgressMonitor initialized")
+
+    def attach(self, channel_id: str, pid: Optional[int] = None) -> Callable[[str], None]:
+        """
+        开始跟踪频道的进度
+
+        Returns:
+            Callable[[str], None]: 逐行解析回调
+        """
+        progress = ChannelProgress(channel_id, pid)
+        with self._lock:
+            self._channels[channel_id] = progress
+        return progress.feed
+
+    def detach(self, channel_id: str, pid: Optional[int] = None):
+        """停止跟踪频道（指定 pid 时只移除该进程的统计）"""
+        with self._lock:
+            progress = self._channels.get(channel_id)
+            if progress is not None and (pid is None or progress.pid == pid):
+                del self._channels[channel_id]
+
+    def get_progress(self, channel_id: str) -> Optional[ChannelProgress]:
+        """获取频道的进度统计对象"""
+        return self._channels.get(channel_id)
+
+    def get_stats(self, channel_id: str) -> Optional[dict]:
+        """获取频道的进度统计"""
+        progress = self._channels.get(channel_id)
+        return progress.to_dict() if progress is not None else None
+
+    def get_all_stats(self) -> Dict[str, dict]:
+        """获取所有频道的进度统计"""
+        with self._lock:
+            channels = list(self._channels.values())
+        return {progress.channel_id: progress.to_dict() for progress in channels}
+
+    def get_status(self) -> dict:
+        """获取进度统计状态"""
+        with self._lock:
+            channels = list(self._channels.values())
+        speeds = [progress.speed for progress in channels if progress.speed is not None]
+        return {
+            'tracked_channels': len(channels),
+            'slow_channels': sum(1 for speed in speeds if speed < 0.95),
+            'min_speed': min(speeds) if speeds else None
+        }
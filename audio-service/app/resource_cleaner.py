@@ -19,8 +19,8 @@ class ResourceCleaner:
     资源清理器
     
     定期清理系统资源，包括：
-    - 过期的 HLS 切片文件
-    - 空的频道目录
+    - 过期的 HLS 切片文件（包括多码率频道各档子目录中的切片）
+    - 空的频道目录及档位子目录
     - 残留的锁文件
     - 过期的日志文件
     """
@@ -136,11 +136,8 @@ class ResourceCleaner:
                     continue
                 
                 try:
-                    # 遍历频道目录中的文件
-                    for file_path in channel_dir.iterdir():
-                        if not file_path.is_file():
-                            continue
-                        
+                    # 遍历频道目录及各档子目录中的文件
+                    for file_path in self._iter_channel_files(channel_dir):
                         stats['total_files'] += 1
                         
                         try:
@@ -164,6 +161,17 @@ class ResourceCleaner:
         
         return stats
     
+    @staticmethod
+    def _iter_channel_files(channel_dir: Path):
+        """列出频道目录及其下一级子目录（多码率频道的各档）中的文件"""
+        for path in list(channel_dir.iterdir()):
+            if path.is_file():
+                yield path
+            elif path.is_dir():
+                for file_path in list(path.iterdir()):
+                    if file_path.is_file():
+                        yield file_path
+    
     def _should_delete_hls_file(self, file_path: Path, current_time: float) -> bool:
         """判断是否应该删除 HLS 文件"""
         filename = file_path.name
@@ -206,6 +214,13 @@ class ResourceCleaner:
                     continue
                 
                 try:
+                    # 先移除空的档位子目录，频道的各档随频道目录一起清理
+                    for variant_dir in channel_dir.iterdir():
+                        if variant_dir.is_dir() and not any(variant_dir.iterdir()):
+                            variant_dir.rmdir()
+                            removed_count += 1
+                            logger.debug(f"Removed empty directory: {variant_dir}")
+                    
                     # 检查目录是否为空
                     if not any(channel_dir.iterdir()):
                         channel_dir.rmdir()
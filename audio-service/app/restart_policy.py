@@ -0,0 +1,87 @@
+"""
+FFmpeg 进程自动重启策略
+
+进程意外退出后，按指数退避（带随机抖动）延迟重启，连续重启次数受重试预算限制；
+进程稳定运行一段时间后重试预算恢复。每个频道保留最近的重启历史，供状态接口展示。
+"""
+
+import random
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Deque, Optional
+
+from app.process_supervisor import TimerHandle
+
+
+@dataclass
+class RestartPolicy:
+    """重启策略"""
+    enabled: bool = True
+    max_retries: int = 5  # 连续重启次数上限
+    initial_delay: float = 2.0  # 首次重启延迟 (秒)
+    max_delay: float = 30.0  # 最大重启延迟 (秒)
+    jitter: float = 0.2  # 延迟随机抖动比例 (0-1)
+    stable_after: float = 60.0  # 进程运行超过该时长后重置重试预算 (秒)
+
+    def next_delay(self, attempt: int) -> float:
+        """
+        计算第 attempt 次重启的延迟
+
+        Args:
+            attempt: 重启次数，从 1 开始
+
+        Returns:
+            float: 延迟秒数
+        """
+        delay = min(self.initial_delay * (2 ** (attempt - 1)), self.max_delay)
+        if self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(0.0, delay)
+
+
+class RestartState:
+    """单个频道的重启状态"""
+
+    def __init__(self, history_size: int = 20):
+        self.attempts = 0
+        self.total_restarts = 0
+        self.gave_up = False
+        self.timer: Optional[TimerHandle] = None
+        self.history: Deque[dict] = deque(maxlen=history_size)
+
+    def record(self, event: str, reason: Optional[str] = None, attempt: Optional[int] = None,
+               delay: Optional[float] = None):
+        """记录一条重启历史"""
+        entry = {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'event': event
+        }
+        if reason is not None:
+            entry['reason'] = reason
+        if attempt is not None:
+            entry['attempt'] = attempt
+        if delay is not None:
+            entry['delay'] = round(delay, 2)
+        self.history.append(entry)
+
+    def cancel_pending(self) -> bool:
+        """取消待执行的重启"""
+        if self.timer is None:
+            return False
+        self.timer.cancel()
+        self.timer = None
+        return True
+
+    def to_dict(self, policy: RestartPolicy) -> dict:
+        """转换为状态字典"""
+        timer = self.timer
+        return {
+            'attempts': self.attempts,
+            'max_retries': policy.max_retries,
+            'total_restarts': self.total_restarts,
+            'gave_up': self.gave_up,
+            'pending': timer is not None,
+            'next_restart_in': round(timer.remaining(), 2) if timer is not None else None,
+            'history': list(self.history)
+        }
@@ -6,13 +6,15 @@ Flask 路由定义
 
 import logging
 import os
-import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from flask import request, jsonify, send_file, Response
 from datetime import datetime
 
 from app import app
 from app.audio_service import get_audio_service, initialize_service
 from app.process_manager import ProcessAlreadyRunningError
+from app.circuit_breaker import CircuitOpenError
+from app.admission_controller import AdmissionRejectedError
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +46,17 @@ def get_service():
     return audio_service
 
 
+def get_listener_id() -> str:
+    """获取听众标识：优先使用 Laravel 透传的会话标识，否则使用 IP + User-Agent"""
+    listener_id = request.headers.get('X-Listener-Id')
+    if listener_id:
+        return listener_id
+    
+    forwarded_for = request.headers.get('X-Forwarded-For', '')
+    client_ip = forwarded_for.split(',')[0].strip() or request.remote_addr or ''
+    return f"{client_ip}|{request.headers.get('User-Agent', '')}"
+
+
 @app.route('/api/process/<channel_id>/start', methods=['POST'])
 def start_process(channel_id):
     """启动 FFmpeg 进程"""
@@ -58,15 +71,34 @@ def start_process(channel_id):
                 'message': 'Missing required parameter: stream_url'
             }), 400
         
+        # 可选：等待进程就绪的秒数，默认立即返回 STARTING 状态
+        wait = data.get('wait', request.args.get('wait'))
+        try:
+            wait = min(max(float(wait), 0.0), 30.0) if wait is not None else 0.0
+        except (TypeError, ValueError):
+            return jsonify({
+                'code': 400,
+                'message': 'Invalid parameter: wait'
+            }), 400
+        
+        # 可选：准入优先级 (pinned / vip / normal)
+        priority = data.get('priority') or request.args.get('priority')
+        
         # 启动进程
         service = get_service()
-        process_info = service.process_manager.start_process(channel_id, stream_url)
+        process_info = service.process_manager.start_process(channel_id, stream_url, priority=priority)
         
         logger.info(f"Started process for channel {channel_id}, PID: {process_info.pid}")
         
+        if wait > 0:
+            try:
+                process_info.ready.result(timeout=wait)
+            except FutureTimeoutError:
+                pass
+        
         return jsonify({
             'code': 200,
-            'message': 'Process started successfully',
+            'message': 'Process started successfully' if process_info.ready.done() else 'Process starting',
             'data': {
                 'channel_id': process_info.channel_id,
                 'pid': process_info.pid,
@@ -83,6 +115,35 @@ def start_process(channel_id):
             'message': str(e)
         }), 409
     
+    except CircuitOpenError as e:
+        logger.warning(f"Rejected start for channel {channel_id}: {str(e)}")
+        response = jsonify({
+            'code': 503,
+            'message': str(e),
+            'data': {
+                'channel_id': channel_id,
+                'status': 'circuit_open',
+                'upstream_host': e.host,
+                'circuit_state': e.state.value,
+                'retry_after': round(e.retry_after, 1),
+                'last_error': e.last_error
+            }
+        })
+        response.headers['Retry-After'] = str(max(1, int(e.retry_after + 0.999)))
+        return response, 503
+    
+    except AdmissionRejectedError as e:
+        return jsonify({
+            'code': 503,
+            'message': str(e),
+            'data': {
+                'channel_id': channel_id,
+                'status': 'capacity_exceeded',
+                'policy': e.policy,
+                'priority': e.priority
+            }
+        }), 503
+    
     except ValueError as e:
         logger.error(f"Invalid parameters for channel {channel_id}: {str(e)}")
         return jsonify({
@@ -136,6 +197,7 @@ def get_process_status(channel_id):
     try:
         service = get_service()
         process_info = service.process_manager.get_process_status(channel_id)
+        progress_monitor = service.progress_monitor
         
         if process_info is None:
             return jsonify({
@@ -154,7 +216,15 @@ def get_process_status(channel_id):
                 'start_time': process_info.start_time.isoformat(),
                 'last_activity_time': process_info.last_activity_time.isoformat(),
                 'error_message': process_info.error_message,
-                'hls_output_dir': process_info.hls_output_dir
+                'hls_output_dir': process_info.hls_output_dir,
+                'adopted': process_info.adopted,
+                'mode': process_info.mode,
+                'input_format': process_info.input_format,
+                'variants': process_info.variants,
+                'startup_seconds': process_info.startup_seconds,
+                'progress': progress_monitor.get_stats(channel_id) if progress_monitor else None,
+                'idle': service.idle_monitor.get_channel_status(channel_id),
+                'restart': service.process_manager.get_restart_info(channel_id)
             }
         })
     
@@ -173,6 +243,11 @@ def list_processes():
         service = get_service()
         processes = service.process_manager.list_processes()
         
+        activity_tracker = service.activity_tracker
+        listener_estimates = service.listener_estimator.estimates()
+        process_sampler = service.process_sampler
+        include_history = request.args.get('history', 'false').lower() == 'true'
+        
         process_list = []
         for process_info in processes:
             process_data = {
@@ -180,9 +255,23 @@ def list_processes():
                 'pid': process_info.pid,
                 'status': process_info.status.value,
                 'start_time': process_info.start_time.isoformat(),
-                'last_activity_time': process_info.last_activity_time.isoformat()
+                'last_activity_time': process_info.last_activity_time.isoformat(),
+                'hls_requests': activity_tracker.get_request_count(process_info.channel_id),
+                'hls_idle_seconds': activity_tracker.idle_seconds(process_info.channel_id),
+                'unique_listeners': listener_estimates.get(process_info.channel_id, 0),
+                'adopted': process_info.adopted,
+                'mode': process_info.mode,
+                'variants': process_info.variants,
+                'startup_seconds': process_info.startup_seconds
             }
             
+            restart_info = service.process_manager.get_restart_info(process_info.channel_id)
+            if restart_info:
+                process_data['restart'] = restart_info
+            
+            if process_sampler is not None:
+                process_data['resources'] = process_sampler.get_channel_stats(process_info.channel_id, include_history)
+            
             if process_info.error_message:
                 process_data['error_message'] = process_info.error_message
             
@@ -205,23 +294,58 @@ def list_processes():
         }), 500
 
 
+@app.route('/api/processes/progress', methods=['GET'])
+def list_process_progress():
+    """批量获取所有频道的 FFmpeg 实时进度统计"""
+    try:
+        service = get_service()
+        progress_monitor = service.progress_monitor
+        
+        if progress_monitor is None:
+            return jsonify({
+                'code': 404,
+                'message': 'Progress telemetry is disabled'
+            }), 404
+        
+        stats = progress_monitor.get_all_stats()
+        return jsonify({
+            'code': 200,
+            'message': 'success',
+            'data': {
+                'total': len(stats),
+                'channels': stats
+            }
+        })
+    
+    except Exception as e:
+        logger.error(f"Failed to get process progress: {str(e)}")
+        return jsonify({
+            'code': 500,
+            'message': f'Failed to get process progress: {str(e)}'
+        }), 500
+
+
 @app.route('/api/process/<channel_id>/logs', methods=['GET'])
 def get_process_logs(channel_id):
-    """获取进程日志"""
+    """获取进程日志（FFmpeg 最近的 stderr 输出）"""
     try:
         lines = request.args.get('lines', 100, type=int)
         
-        # TODO: 实现日志读取功能
-        # 这里暂时返回占位符响应
+        service = get_service()
+        logs = service.process_manager.get_process_logs(channel_id, lines)
+        
+        if logs is None:
+            return jsonify({
+                'code': 404,
+                'message': f'No logs found for channel {channel_id}'
+            }), 404
+        
         return jsonify({
             'code': 200,
             'message': 'success',
             'data': {
                 'channel_id': channel_id,
-                'logs': [
-                    f"[{datetime.now().isoformat()}] Log functionality not yet implemented",
-                    f"[{datetime.now().isoformat()}] Requested {lines} lines for channel {channel_id}"
-                ]
+                'logs': logs
             }
         })
     
@@ -494,8 +618,9 @@ def force_cleanup():
 
 
 @app.route('/hls/<channel_id>/<filename>', methods=['GET', 'OPTIONS'])
-def serve_hls_file(channel_id, filename):
-    """提供 HLS 播放列表和切片文件"""
+@app.route('/hls/<channel_id>/<variant>/<filename>', methods=['GET', 'OPTIONS'])
+def serve_hls_file(channel_id, filename, variant=None):
+    """提供 HLS 播放列表和切片文件（多码率频道的各档位于 variant 子目录）"""
     
     # 处理 CORS 预检请求
     if request.method == 'OPTIONS':
@@ -508,35 +633,139 @@ def serve_hls_file(channel_id, filename):
     
     try:
         # 验证文件名格式，防止路径遍历
-        if '..' in filename or '/' in filename:
+        if '..' in filename or '/' in filename or '..' in channel_id or (variant is not None and '..' in variant):
             return jsonify({
                 'code': 400,
                 'message': 'Invalid file name'
             }), 400
         
+        # 各档的文件以相对频道目录的路径标识，活动和听众仍按频道统计
+        relative_path = f"{variant}/{filename}" if variant else filename
+        # 播放列表跟踪器中各档独立跟踪
+        playlist_key = f"{channel_id}/{variant}" if variant else channel_id
+        
         # 获取服务实例
         service = get_service()
         
+        # 记录听众活动，供空闲进程监控器使用（无锁）；
+        # 只为进程管理器管理的频道记录，任意频道 ID 的请求不会创建跟踪记录
+        if service.process_manager.is_managed(channel_id):
+            service.activity_tracker.touch(channel_id)
+            
+            # 切片请求计入独立听众估算
+            if filename.endswith('.ts'):
+                service.listener_estimator.record(channel_id, get_listener_id())
+        
         # 构建文件路径
         from app.config import config
-        file_path = os.path.join(config.HLS_OUTPUT_DIR, channel_id, filename)
+        file_path = os.path.join(config.HLS_OUTPUT_DIR, channel_id, relative_path)
         
-        # 对于播放列表文件，等待其生成
-        if filename.endswith('.m3u8'):
-            max_wait_time = 0.5  # 减少到0.5秒
-            wait_interval = 0.02  # 更频繁的检查，每20ms
-            waited_time = 0
+        # 设置 CORS 头
+        def add_cors_headers(response):
+            response.headers['Access-Control-Allow-Origin'] = '*'
+            response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
+            response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+            response.headers['Access-Control-Max-Age'] = '3600'
+            return response
+        
+        # offload 模式：切片交由前端服务器发送，字节拷贝不经过 Python
+        if filename.endswith('.ts') and config.HLS_DELIVERY_MODE != 'direct':
+            if not os.path.exists(file_path):
+                logger.debug(f'HLS file not found: {file_path}')
+                return jsonify({
+                    'code': 404,
+                    'message': 'HLS file not found'
+                }), 404
+            
+            response = Response(mimetype='video/MP2T')
+            if config.HLS_DELIVERY_MODE == 'x-accel-redirect':
+                response.headers['X-Accel-Redirect'] = f"{config.HLS_X_ACCEL_PREFIX.rstrip('/')}/{channel_id}/{relative_path}"
+            else:
+                response.headers['X-Sendfile'] = os.path.abspath(file_path)
+            response.headers['Cache-Control'] = 'public, max-age=60'
+            return add_cors_headers(response)
+        
+        # 切片优先从内存缓存返回，未命中时读盘并回填
+        segment_cache = service.segment_cache
+        if filename.endswith('.ts') and segment_cache:
+            data = segment_cache.get(channel_id, relative_path)
+            if data is None:
+                data = segment_cache.load(channel_id, relative_path, file_path)
             
-            while not os.path.exists(file_path) and waited_time < max_wait_time:
-                time.sleep(wait_interval)
-                waited_time += wait_interval
+            if data is not None:
+                response = Response(data, mimetype='video/MP2T')
+                response.headers['Cache-Control'] = 'public, max-age=60'
+                return add_cors_headers(response)
+        
+        def playlist_response(snapshot):
+            response = Response(snapshot.body, mimetype='application/vnd.apple.mpegurl')
+            # 允许客户端缓存但每次都需重新验证，配合 ETag 返回 304
+            response.headers['Cache-Control'] = 'no-cache'
+            response.set_etag(snapshot.etag)
+            response.last_modified = snapshot.last_modified
+            response.make_conditional(request)
+            return add_cors_headers(response)
+        
+        # LL-HLS 阻塞式播放列表重载参数
+        playlist_tracker = service.playlist_tracker
+        hls_msn = request.args.get('_HLS_msn')
+        hls_part = request.args.get('_HLS_part')
+        blocking_reload = (
+            filename == config.HLS_PLAYLIST_NAME and
+            playlist_tracker.blocking_reload and
+            (hls_msn is not None or hls_part is not None)
+        )
+        
+        if blocking_reload:
+            try:
+                if hls_msn is None:
+                    raise ValueError('_HLS_part requires _HLS_msn')
+                msn = int(hls_msn)
+                # 当前未生成部分切片，_HLS_part 按整切片发布处理
+                if hls_part is not None and int(hls_part) < 0:
+                    raise ValueError('_HLS_part must be non-negative')
+                if msn < 0:
+                    raise ValueError('_HLS_msn must be non-negative')
+            except ValueError as e:
+                return jsonify({
+                    'code': 400,
+                    'message': f'Invalid blocking reload parameters: {str(e)}'
+                }), 400
+        
+        # 播放列表优先使用跟踪器中的最新快照，命中时不访问磁盘（条件请求直接由快照的 ETag 返回 304）
+        snapshot = playlist_tracker.get_snapshot(playlist_key) if filename == config.HLS_PLAYLIST_NAME else None
+        
+        # 对于播放列表文件，等待其生成（由播放列表跟踪器在文件出现时唤醒）
+        if filename.endswith('.m3u8') and snapshot is None and not os.path.exists(file_path):
+            process_status = service.process_manager.get_process_status(channel_id)
+            if process_status and process_status.status.value in ('running', 'starting'):
+                if playlist_tracker.wait_until_ready(playlist_key, timeout=config.HLS_PLAYLIST_WAIT_TIMEOUT):
+                    snapshot = playlist_tracker.get_snapshot(playlist_key) if filename == config.HLS_PLAYLIST_NAME else None
+        
+        # 阻塞直到请求的媒体序列号发布
+        if blocking_reload:
+            if snapshot is not None:
+                if msn > snapshot.last_msn + 2:
+                    return jsonify({
+                        'code': 400,
+                        'message': f'_HLS_msn {msn} is too far ahead of the live edge ({snapshot.last_msn})'
+                    }), 400
                 
-                # 检查进程是否还在运行
-                process_status = service.process_manager.get_process_status(channel_id)
-                if not process_status or process_status.status.value != 'running':
-                    break
+                # 规范要求在三倍目标时长内响应
+                timeout = 3 * (snapshot.target_duration or config.HLS_SEGMENT_DURATION)
+                snapshot = playlist_tracker.wait_for_msn(playlist_key, msn, timeout=timeout)
+                if snapshot is None:
+                    return jsonify({
+                        'code': 503,
+                        'message': f'Media sequence {msn} was not published in time'
+                    }), 503
+                
+                return playlist_response(snapshot)
+        
+        if snapshot is not None:
+            return playlist_response(snapshot)
         
-        # 检查文件是否存在
+        # 快照未命中时读盘，检查文件是否存在
         if not os.path.exists(file_path):
             logger.debug(f'HLS file not found: {file_path}')
             return jsonify({
@@ -544,15 +773,6 @@ def serve_hls_file(channel_id, filename):
                 'message': 'HLS file not found'
             }), 404
         
-        # 设置 CORS 头
-        def add_cors_headers(response):
-            response.headers['Access-Control-Allow-Origin'] = '*'
-            response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-            response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-            response.headers['Access-Control-Max-Age'] = '3600'
-            return response
-        
-        # 返回文件
         if filename.endswith('.m3u8'):
             response = send_file(
                 file_path,
@@ -576,7 +796,7 @@ def serve_hls_file(channel_id, filename):
             }), 400
             
     except Exception as e:
-        logger.error(f'Error serving HLS file {channel_id}/{filename}: {str(e)}')
+        logger.error(f'Error serving HLS file {channel_id}/{relative_path}: {str(e)}')
         return jsonify({
             'code': 500,
             'message': f'Failed to serve HLS file: {str(e)}'
@@ -0,0 +1,154 @@
+"""
+HLS 切片内存缓存
+
+按字节预算限制的 LRU 缓存，以 (频道, 文件名) 为键缓存最近写入的切片，
+避免同一切片被大量听众重复从磁盘读取。
+"""
+
+import threading
+import logging
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.hls_watcher import HLSFileEvent
+
+logger = logging.getLogger(__name__)
+
+
+class SegmentCache:
+    """
+    HLS 切片缓存
+
+    - 切片首次写入完成时由 HLSWatcher 事件预先填充
+    - ffmpeg 删除切片时同步淘汰
+    - 超出字节预算时按 LRU 顺序淘汰
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entry_bytes: int = 2 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+
+        self._entries: 'OrderedDict[Tuple[str, str], bytes]' = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+
+        # 统计计数
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+        logger.info(f"SegmentCache initialized with max_bytes={max_bytes}, max_entry_bytes={max_entry_bytes}")
+
+    @staticmethod
+    def is_cacheable(filename: str) -> bool:
+        """只缓存 TS 切片，播放列表会频繁变化"""
+        return filename.endswith('.ts')
+
+    def handle_file_event(self, event: HLSFileEvent, channel_id: str, filename: str, file_path: str):
+        """HLSWatcher 事件回调"""
+        if not self.is_cacheable(filename):
+            return
+
+        if event == HLSFileEvent.WRITTEN:
+            self.load(channel_id, filename, file_path)
+        elif event == HLSFileEvent.DELETED:
+            if self.evict(channel_id, filename):
+                self._invalidations += 1
+
+    def get(self, channel_id: str, filename: str) -> Optional[bytes]:
+        """
+        查询缓存
+
+        Returns:
+            bytes: 切片内容，未命中返回 None
+        """
+        key = (channel_id, filename)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return data
+
+    def put(self, channel_id: str, filename: str, data: bytes) -> bool:
+        """
+        写入缓存
+
+        Returns:
+            bool: 是否已缓存（超过单条大小上限的切片不缓存）
+        """
+        size = len(data)
+        if size > self.max_entry_bytes or size > self.max_bytes:
+            return False
+
+        key = (channel_id, filename)
+        with self._lock:
+            existing = self._entries.pop(key, None)
+            if existing is not None:
+                self._current_bytes -= len(existing)
+
+            self._entries[key] = data
+            self._current_bytes += size
+
+            while self._current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._current_bytes -= len(evicted)
+                self._evictions += 1
+
+        return True
+
+    def load(self, channel_id: str, filename: str, file_path: str) -> Optional[bytes]:
+        """
+        从磁盘读取切片并写入缓存
+
+        Returns:
+            bytes: 切片内容，文件不存在或读取失败返回 None
+        """
+        try:
+            with open(file_path, 'rb') as f:
+                data = f.read(self.max_entry_bytes + 1)
+        except OSError as e:
+            logger.debug(f"Failed to load segment {channel_id}/{filename}: {str(e)}")
+            return None
+
+        if len(data) > self.max_entry_bytes:
+            return None
+
+        self.put(channel_id, filename, data)
+        return data
+
+    def evict(self, channel_id: str, filename: str) -> bool:
+        """淘汰指定切片"""
+        with self._lock:
+            data = self._entries.pop((channel_id, filename), None)
+            if data is None:
+                return False
+            self._current_bytes -= len(data)
+            return True
+
+    def evict_channel(self, channel_id: str) -> int:
+        """淘汰频道的所有切片"""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == channel_id]
+            for key in keys:
+                self._current_bytes -= len(self._entries.pop(key))
+            return len(keys)
+
+    def get_stats(self) -> dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': (self._hits / lookups) * 100 if lookups else 0.0,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations
+            }
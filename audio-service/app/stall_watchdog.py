@@ -0,0 +1,166 @@
+"""
+FFmpeg 输出停滞看门狗
+
+上游挂起时 FFmpeg 会停在 -reconnect 等待中：进程仍然存活，poll() 显示运行中，
+但不再产生新切片，听众一直卡在最后一个切片。看门狗跟踪每个频道最近一次产生新切片
+（HLSWatcher 事件）或 -progress out_time 增长的时间，超过
+stall_factor × HLS_SEGMENT_DURATION 没有新输出时终止进程，由进程管理器按
+输出停滞错误记录并自动重启。
+"""
+
+import threading
+import time
+import logging
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from app.hls_watcher import HLSFileEvent
+
+if TYPE_CHECKING:
+    from app.process_manager import ProcessManager
+    from app.progress_monitor import ProgressMonitor
+
+logger = logging.getLogger(__name__)
+
+
+class StallWatchdog:
+    """
+    输出停滞看门狗
+
+    - 运行中的进程：距最近一次新输出超过 stall_timeout 判定为停滞
+    - 启动中的进程：超过 startup_timeout 仍未生成首个播放列表判定为停滞
+    """
+
+    def __init__(self, process_manager: 'ProcessManager', stall_timeout: float, startup_timeout: float,
+                 check_interval: float = 1.0, progress_monitor: Optional['ProgressMonitor'] = None):
+        self.process_manager = process_manager
+        self.progress_monitor = progress_monitor
+        self.stall_timeout = stall_timeout
+        self.startup_timeout = startup_timeout
+        self.check_interval = check_interval
+
+        self._last_segment: Dict[str, float] = {}  # 频道 -> 最近一次新切片的时间（单调时钟）
+        self._first_seen: Dict[str, Tuple[int, float]] = {}  # 频道 -> (PID, 首次检查到该进程的时间)
+        self._stalls_total = 0
+        self._last_stalls: Dict[str, dict] = {}
+
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        logger.info(
+            f"StallWatchdog initialized with stall_timeout={stall_timeout}s, "
+            f"startup_timeout={startup_timeout}s, check_interval={check_interval}s"
+        )
+
+    def start(self):
+        """启动看门狗"""
+        if self._running:
+            logger.warning("StallWatchdog is already running")
+            return
+
+        self._running = True
+        self._stop_event.clear()
+
+        self._thread = threading.Thread(target=self._watch_loop, name="StallWatchdog", daemon=True)
+        self._thread.start()
+
+        logger.info("StallWatchdog started")
+
+    def stop(self):
+        """停止看门狗"""
+        if not self._running:
+            return
+
+        self._running = False
+        self._stop_event.set()
+
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+
+        logger.info("StallWatchdog stopped")
+
+    def is_running(self) -> bool:
+        """检查看门狗是否在运行"""
+        return self._running and self._thread is not None and self._thread.is_alive()
+
+    def handle_file_event(self, event: HLSFileEvent, channel_id: str, filename: str, file_path: str):
+        """HLSWatcher 事件回调：记录新切片生成时间"""
+        if event == HLSFileEvent.WRITTEN and filename.endswith('.ts'):
+            self._last_segment[channel_id] = time.monotonic()
+
+    def _watch_loop(self):
+        """检查循环"""
+        while not self._stop_event.wait(self.check_interval):
+            try:
+                self.check_once()
+            except Exception as e:
+                logger.error(f"Error in stall watchdog: {str(e)}")
+
+    def check_once(self):
+        """检查所有进程的输出是否停滞"""
+        now = time.monotonic()
+        processes = self.process_manager.list_processes()
+        pids = self.process_manager.get_pids()
+
+        # 已停止频道的记录随之丢弃
+        for channel_id in list(self._first_seen):
+            if channel_id not in pids:
+                del self._first_seen[channel_id]
+        for channel_id in list(self._last_segment):
+            if channel_id not in pids:
+                self._last_segment.pop(channel_id, None)
+
+        for process_info in processes:
+            channel_id = process_info.channel_id
+            pid = pids.get(channel_id)
+            if pid is None or process_info.status.value not in ('running', 'starting'):
+                continue
+
+            # 新进程从首次检查时开始计时
+            seen = self._first_seen.get(channel_id)
+            if seen is None or seen[0] != pid:
+                seen = self._first_seen[channel_id] = (pid, now)
+
+            last_output = self.get_last_output(channel_id)
+            if process_info.status.value == 'starting':
+                timeout = self.startup_timeout
+                reference = seen[1]
+            else:
+                timeout = self.stall_timeout
+                reference = max(seen[1], last_output or 0.0)
+
+            stalled_for = now - reference
+            if stalled_for < timeout:
+                continue
+
+            logger.warning(
+                f"FFmpeg output for channel {channel_id} stalled for {stalled_for:.0f}s "
+                f"(PID {pid}, status {process_info.status.value}), restarting"
+            )
+            if self.process_manager.kill_stalled_process(channel_id, pid, stalled_for):
+                self._stalls_total += 1
+                self._last_stalls[channel_id] = {
+                    'time': time.time(),
+                    'pid': pid,
+                    'stalled_seconds': round(stalled_for, 1)
+                }
+                self._first_seen.pop(channel_id, None)
+
+    def get_last_output(self, channel_id: str) -> Optional[float]:
+        """获取频道最近一次新输出的时间（单调时钟）"""
+        last_output = self._last_segment.get(channel_id)
+        if self.progress_monitor is not None:
+            progress = self.progress_monitor.get_progress(channel_id)
+            if progress is not None and progress.last_advance_monotonic is not None:
+                last_output = max(last_output or 0.0, progress.last_advance_monotonic)
+        return last_output
+
+    def get_status(self) -> dict:
+        """获取看门狗状态"""
+        return {
+            'running': self.is_running(),
+            'stall_timeout': self.stall_timeout,
+            'startup_timeout': self.startup_timeout,
+            'stalls_total': self._stalls_total,
+            'recent_stalls': dict(self._last_stalls)
+        }
@@ -0,0 +1,243 @@
+"""
+FFmpeg stderr 持续读取器
+
+单个线程通过 selectors 持续读取所有 FFmpeg 进程的 stderr 管道，避免输出较多的
+FFmpeg（重连警告、损坏数据包等）写满 64 KB 管道缓冲区而阻塞编码。
+每个频道只保留最近 N 行输出（环形缓冲区），单频道内存占用固定。
+同一线程也读取 -progress 输出的 stdout 管道，逐行交给注册时提供的回调处理。
+"""
+
+import os
+import selectors
+import threading
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, IO, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StderrStream:
+    """单个进程的 stderr 流（提供 line_handler 时逐行交给回调，不写入缓冲区）"""
+
+    def __init__(self, channel_id: str, pipe: IO[bytes], max_lines: int,
+                 line_handler: Optional[Callable[[str], None]] = None):
+        self.channel_id = channel_id
+        self.pipe = pipe
+        self.line_handler = line_handler
+        self.lines: Deque[str] = deque(maxlen=0 if line_handler else max_lines)
+        self.partial = b''
+        self.closed = threading.Event()
+
+    def get_output(self) -> str:
+        """获取缓冲区中的全部输出"""
+        return '\n'.join(self.lines)
+
+
+class StderrDrainer:
+    """
+    stderr 读取器
+
+    - register() 注册进程的 stderr 管道，管道被设置为非阻塞并由读取线程持续读取
+    - 管道到达 EOF（进程退出）后自动注销，缓冲区保留到该频道下次启动
+    - 每行超过 max_line_length 的部分被截断
+    """
+
+    def __init__(self, max_lines: int = 200, max_line_length: int = 1024):
+        self.max_lines = max_lines
+        self.max_line_length = max_line_length
+
+        self._streams: Dict[str, StderrStream] = {}
+        self._lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_read, False)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ, None)
+
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+        logger.info(f"StderrDrainer initialized with max_lines={max_lines}")
+
+    def start(self):
+        """启动读取线程"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+
+        self._thread = threading.Thread(target=self._drain_loop, daemon=True, name="StderrDrainer")
+        self._thread.start()
+        logger.info("StderrDrainer started")
+
+    def stop(self):
+        """停止读取线程"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+
+        self._wakeup()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        logger.info("StderrDrainer stopped")
+
+    def is_running(self) -> bool:
+        """检查读取线程是否在运行"""
+        return self._running
+
+    def register(self, channel_id: str, pipe: IO[bytes]) -> StderrStream:
+        """
+        注册进程的 stderr 管道
+
+        Args:
+            channel_id: 频道 ID
+            pipe: subprocess.Popen.stderr
+
+        Returns:
+            StderrStream: 该进程的 stderr 流，进程退出后 closed 被设置
+        """
+        if not self._running:
+            self.start()
+
+        stream = StderrStream(channel_id, pipe, self.max_lines)
+        with self._lock:
+            self._streams[channel_id] = stream
+        self._add_stream(stream)
+        return stream
+
+    def register_handler(self, channel_id: str, pipe: IO[bytes], line_handler: Callable[[str], None]) -> StderrStream:
+        """
+        注册由回调逐行处理的管道（如 -progress 输出的 stdout）
+
+        Args:
+            channel_id: 频道 ID
+            pipe: 管道
+            line_handler: 逐行回调，在读取线程中执行，应尽快返回
+
+        Returns:
+            StderrStream: 管道流，管道关闭后 closed 被设置
+        """
+        if not self._running:
+            self.start()
+
+        stream = StderrStream(channel_id, pipe, self.max_lines, line_handler)
+        self._add_stream(stream)
+        return stream
+
+    def _add_stream(self, stream: StderrStream):
+        os.set_blocking(stream.pipe.fileno(), False)
+        with self._lock:
+            self._selector.register(stream.pipe.fileno(), selectors.EVENT_READ, stream)
+        self._wakeup()
+
+    def get_lines(self, channel_id: str, limit: Optional[int] = None) -> List[str]:
+        """获取频道最近的 stderr 输出行"""
+        stream = self._streams.get(channel_id)
+        if stream is None:
+            return []
+
+        lines = list(stream.lines)
+        if limit is not None:
+            lines = lines[-limit:] if limit > 0 else []
+        return lines
+
+    def has_logs(self, channel_id: str) -> bool:
+        """检查是否有频道的 stderr 缓冲区"""
+        return channel_id in self._streams
+
+    def _wakeup(self):
+        try:
+            os.write(self._wakeup_write, b'\0')
+        except OSError:
+            pass
+
+    def _drain_loop(self):
+        """读取线程主循环"""
+        while self._running:
+            try:
+                events = self._selector.select(timeout=1.0)
+            except Exception as e:
+                logger.error(f"Error in stderr drainer select: {str(e)}")
+                continue
+
+            for key, _ in events:
+                stream = key.data
+                if stream is None:
+                    try:
+                        while os.read(self._wakeup_read, 4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+
+                self._read_stream(key.fd, stream)
+
+        # 退出前关闭所有仍在读取的管道
+        with self._lock:
+            for key in list(self._selector.get_map().values()):
+                if key.data is not None:
+                    self._close_stream(key.fd, key.data)
+
+    def _read_stream(self, fd: int, stream: StderrStream):
+        """读取一次管道数据并按行写入环形缓冲区"""
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logger.debug(f"Error reading stderr for channel {stream.channel_id}: {str(e)}")
+            data = b''
+
+        if not data:
+            if stream.partial:
+                self._append_line(stream, stream.partial)
+                stream.partial = b''
+            with self._lock:
+                self._close_stream(fd, stream)
+            return
+
+        chunks = (stream.partial + data).split(b'\n')
+        stream.partial = chunks.pop()
+        if len(stream.partial) > self.max_line_length:
+            self._append_line(stream, stream.partial)
+            stream.partial = b''
+
+        for chunk in chunks:
+            self._append_line(stream, chunk)
+
+    def _append_line(self, stream: StderrStream, chunk: bytes):
+        line = chunk[:self.max_line_length].decode('utf-8', errors='replace').rstrip('\r')
+        if not line:
+            return
+        if stream.line_handler is None:
+            stream.lines.append(line)
+            return
+        try:
+            stream.line_handler(line)
+        except Exception as e:
+            logger.debug(f"Error in line handler for channel {stream.channel_id}: {str(e)}")
+
+    def _close_stream(self, fd: int, stream: StderrStream):
+        """注销并关闭管道（调用方持有 _lock）"""
+        try:
+            self._selector.unregister(fd)
+        except (KeyError, ValueError):
+            pass
+        try:
+            stream.pipe.close()
+        except OSError:
+            pass
+        stream.closed.set()
+
+    def get_status(self) -> dict:
+        """获取读取器状态"""
+        with self._lock:
+            open_streams = sum(1 for key in self._selector.get_map().values() if key.data is not None)
+            buffered_channels = len(self._streams)
+        return {
+            'running': self._running,
+            'open_streams': open_streams,
+            'buffered_channels': buffered_channels,
+            'max_lines': self.max_lines
+        }
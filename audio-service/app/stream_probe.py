@@ -0,0 +1,320 @@
+"""
+上游流探测
+
+用 ffprobe 探测上游的编码、码率、采样率和声道数，结果按流地址缓存。
+上游已经是兼容的编码（默认 AAC）且码率不超过上限时，频道以 -c:a copy 直接重新封装切片，
+省去解码 / 编码的 CPU 开销；探测失败、编码不兼容或直通启动失败时回退为转码。
+启动频道时只查缓存，不等待 ffprobe：未缓存的流地址本次转码，同时在后台探测，下次启动使用探测结果。
+
+探测结果持久化到缓存文件，服务重启后仍然有效。已知容器格式的上游以 -f 指定输入格式并使用
+最小的探测量启动 FFmpeg，不必先等待读取 1 MB 数据再输出首个切片；以缓存参数启动失败时
+清除该流地址的缓存，failure_ttl 内以转码和 FFmpeg 自身的格式探测启动，之后的启动再在后台重新探测。
+"""
+
+import os
+import json
+import time
+import threading
+import subprocess
+import logging
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODE_TRANSCODE = 'transcode'
+MODE_COPY = 'copy'
+
+CACHE_VERSION = 1
+
+# 可以直接指定 -f 并以最小探测量读取的裸流格式（ffprobe format_name -> FFmpeg 输入格式）
+_RAW_INPUT_FORMATS = {
+    'aac': 'aac',
+    'mp3': 'mp3',
+    'ogg': 'ogg',
+    'flac': 'flac'
+}
+
+
+@dataclass
+class ProbeResult:
+    """探测结果"""
+    codec_name: Optional[str] = None
+    profile: Optional[str] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    bit_rate: Optional[int] = None  # bit/s，直播流可能无法获取
+    format_name: Optional[str] = None
+    probed_at: float = 0.0  # time.time()
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @property
+    def input_format(self) -> Optional[str]:
+        """可直接指定的 FFmpeg 输入格式，无法确定时返回 None"""
+        if not self.format_name:
+            return None
+        return _RAW_INPUT_FORMATS.get(self.format_name.split(',')[0])
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class StreamProbe:
+    """
+    上游流探测器
+
+    成功的探测结果缓存 cache_ttl 秒（按探测时间计算，可持久化），失败或直通启动失败的
+    流地址缓存 failure_ttl 秒，期间直接转码，不重复探测。
+    """
+
+    def __init__(self, ffprobe_path: str, copy_codecs: Iterable[str] = ('aac',), max_copy_bitrate: int = 192000,
+                 probe_timeout: float = 5.0, cache_ttl: float = 604800, failure_ttl: float = 300,
+                 copy_enabled: bool = True, cache_path: Optional[str] = None):
+        self.ffprobe_path = ffprobe_path
+        self.copy_enabled = copy_enabled
+        self.cache_path = cache_path
+        self.copy_codecs = frozenset(codec.lower() for codec in copy_codecs)
+        self.max_copy_bitrate = max_copy_bitrate
+        self.probe_timeout = probe_timeout
+        self.cache_ttl = cache_ttl
+        self.failure_ttl = failure_ttl
+
+        self._cache: Dict[str, ProbeResult] = {}  # 流地址 -> 探测结果
+        self._failures: Dict[str, Tuple[str, float]] = {}  # 流地址 -> (原因, 失败时间)
+        self._pending: Set[str] = set()  # 正在后台探测的流地址
+        self._lock = threading.Lock()
+
+        # 统计计数
+        self._probes_total = 0
+        self._probe_failures = 0
+        self._cache_hits = 0
+
+        self._load_cache()
+
+        logger.info(
+            f"StreamProbe initialized with ffprobe={ffprobe_path}, copy_codecs={sorted(self.copy_codecs)}, "
+            f"max_copy_bitrate={max_copy_bitrate}"
+        )
+
+    def get_cached(self, stream_url: str) -> Optional[ProbeResult]:
+        """获取未过期的缓存结果"""
+        with self._lock:
+            cached = self._cache.get(stream_url)
+            if cached is None:
+                return None
+            if time.time() - cached.probed_at > self.cache_ttl:
+                del self._cache[stream_url]
+                return None
+            return cached
+
+    def _recent_failure(self, stream_url: str) -> Optional[str]:
+        with self._lock:
+            failure = self._failures.get(stream_url)
+            if failure is None:
+                return None
+            if time.monotonic() - failure[1] > self.failure_ttl:
+                del self._failures[stream_url]
+                return None
+            return failure[0]
+
+    def mark_failed(self, stream_url: str, reason: str):
+        """记录流地址无法直通（探测失败或直通启动失败），failure_ttl 内直接转码"""
+        with self._lock:
+            self._failures[stream_url] = (reason, time.monotonic())
+            removed = self._cache.pop(stream_url, None) is not None
+        if removed:
+            self._save_cache()
+
+    def probe(self, stream_url: str) -> Optional[ProbeResult]:
+        """
+        探测上游流（优先使用缓存）
+
+        Returns:
+            ProbeResult: 探测结果，探测失败时返回 None
+        """
+        cached = self.get_cached(stream_url)
+        if cached is not None:
+            self._cache_hits += 1
+            return cached
+        if self._recent_failure(stream_url) is not None:
+            return None
+
+        self._probes_total += 1
+        command = [
+            self.ffprobe_path,
+            '-v', 'error',
+            '-print_format', 'json',
+            '-show_format',
+            '-show_streams',
+            '-select_streams', 'a:0',
+            '-rw_timeout', str(int(self.probe_timeout * 1_000_000)),
+            stream_url
+        ]
+        started = time.monotonic()
+        try:
+            completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       timeout=self.probe_timeout)
+            if completed.returncode != 0:
+                stderr = completed.stderr.decode('utf-8', errors='replace').strip()
+                raise RuntimeError(stderr.splitlines()[-1] if stderr else f'ffprobe exited with code {completed.returncode}')
+            result = self._parse(json.loads(completed.stdout or b'{}'))
+        except (OSError, ValueError, RuntimeError, subprocess.TimeoutExpired) as e:
+            self._probe_failures += 1
+            self.mark_failed(stream_url, f'probe failed: {str(e)}')
+            logger.warning(f"Failed to probe stream {stream_url}: {str(e)}")
+            return None
+
+        with self._lock:
+            self._cache[stream_url] = result
+        self._save_cache()
+        logger.info(
+            f"Probed stream {stream_url} in {(time.monotonic() - started) * 1000:.0f}ms: "
+            f"codec={result.codec_name}, bit_rate={result.bit_rate}, sample_rate={result.sample_rate}"
+        )
+        return result
+
+    def probe_async(self, stream_url: str) -> bool:
+        """
+        在后台线程中探测上游流，结果写入缓存供下次启动使用
+
+        Returns:
+            bool: 是否发起了探测（已缓存、近期失败或正在探测时不重复探测）
+        """
+        if self.get_cached(stream_url) is not None or self._recent_failure(stream_url) is not None:
+            return False
+        with self._lock:
+            if stream_url in self._pending:
+                return False
+            self._pending.add(stream_url)
+
+        threading.Thread(
+            target=self._probe_in_background,
+            args=(stream_url,),
+            name="StreamProbe",
+            daemon=True
+        ).start()
+        return True
+
+    def _probe_in_background(self, stream_url: str):
+        try:
+            self.probe(stream_url)
+        except Exception as e:
+            logger.error(f"Error probing stream {stream_url}: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending.discard(stream_url)
+
+    @staticmethod
+    def _parse(data: dict) -> ProbeResult:
+        """解析 ffprobe 的 JSON 输出"""
+        streams = data.get('streams') or []
+        if not streams:
+            raise ValueError('no audio stream found')
+        stream = streams[0]
+        fmt = data.get('format') or {}
+        return ProbeResult(
+            codec_name=stream.get('codec_name'),
+            profile=stream.get('profile'),
+            sample_rate=_to_int(stream.get('sample_rate')),
+            channels=_to_int(stream.get('channels')),
+            # 直播流的流级码率经常缺失，退而使用容器级码率
+            bit_rate=_to_int(stream.get('bit_rate')) or _to_int(fmt.get('bit_rate')),
+            format_name=fmt.get('format_name'),
+            probed_at=time.time()
+        )
+
+    def is_copy_compatible(self, result: ProbeResult) -> bool:
+        """上游编码是否可直接重新封装（码率未知时只按编码判断）"""
+        if not result.codec_name or result.codec_name.lower() not in self.copy_codecs:
+            return False
+        return result.bit_rate is None or result.bit_rate <= self.max_copy_bitrate
+
+    def select_mode(self, stream_url: str, probe: bool = True) -> Tuple[str, Optional[ProbeResult]]:
+        """
+        选择频道的运行模式（只使用缓存，不阻塞启动）
+
+        Args:
+            stream_url: 上游流地址
+            probe: 缓存未命中时是否在后台探测（监督线程中的自动重启只使用缓存）
+
+        Returns:
+            Tuple[str, Optional[ProbeResult]]: (copy / transcode, 缓存的探测结果)
+        """
+        result = self.get_cached(stream_url)
+        if result is not None:
+            self._cache_hits += 1
+        elif probe:
+            # 本次转码启动，探测结果供下次启动使用
+            self.probe_async(stream_url)
+        if result is not None and self.copy_enabled and self.is_copy_compatible(result):
+            return MODE_COPY, result
+        return MODE_TRANSCODE, result
+
+    def _load_cache(self):
+        """读取持久化的探测结果（丢弃已过期的记录）"""
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read probe cache {self.cache_path}: {str(e)}")
+            return
+
+        if not isinstance(data, dict) or data.get('version') != CACHE_VERSION:
+            logger.warning(f"Ignoring probe cache {self.cache_path} with unsupported format")
+            return
+        now = time.time()
+        for stream_url, entry in (data.get('streams') or {}).items():
+            try:
+                result = ProbeResult(**entry)
+            except TypeError:
+                continue
+            if now - result.probed_at <= self.cache_ttl:
+                self._cache[stream_url] = result
+        logger.info(f"Loaded {len(self._cache)} cached stream probes from {self.cache_path}")
+
+    def _save_cache(self):
+        """原子写入探测结果缓存"""
+        if not self.cache_path:
+            return
+        with self._lock:
+            data = {
+                'version': CACHE_VERSION,
+                'streams': {stream_url: result.to_dict() for stream_url, result in self._cache.items()}
+            }
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.cache_path)
+            except OSError as e:
+                logger.error(f"Failed to write probe cache {self.cache_path}: {str(e)}")
+
+    def get_status(self) -> dict:
+        """获取探测器状态"""
+        with self._lock:
+            cached = len(self._cache)
+            failed = len(self._failures)
+            pending = len(self._pending)
+        return {
+            'ffprobe_path': self.ffprobe_path,
+            'copy_enabled': self.copy_enabled,
+            'cache_path': self.cache_path,
+            'copy_codecs': sorted(self.copy_codecs),
+            'max_copy_bitrate': self.max_copy_bitrate,
+            'cached_streams': cached,
+            'failed_streams': failed,
+            'pending_probes': pending,
+            'probes_total': self._probes_total,
+            'probe_failures': self._probe_failures,
+            'cache_hits': self._cache_hits
+        }
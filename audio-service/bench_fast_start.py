@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+基准测试：按缓存的探测结果快速启动 FFmpeg 的首个播放列表耗时
+
+对同一个上游流交替以两种方式启动频道，统计启动到生成首个播放列表的耗时：
+- full_probe: 不指定输入格式，由 FFmpeg 自行探测（probe_cache.fast_start 关闭）
+- fast_start: 按缓存的探测结果以 -f 指定输入格式并使用最小探测量
+
+两种方式使用相同的探测结果和运行模式（直通或转码），只比较输入格式提示的影响。
+需要可用的 FFmpeg / ffprobe（见 config.yaml）和可访问的上游流：
+
+    python3 bench_fast_start.py http://example.com/live.aac --runs 5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(stream_url: str, runs: int, timeout: float) -> dict:
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    from app.config import config
+    from app.routes import get_service
+    process_manager = get_service().process_manager
+    stream_probe = process_manager.stream_probe
+    if stream_probe is None:
+        raise SystemExit('stream probe is disabled (passthrough / probe_cache)')
+
+    probe_result = stream_probe.probe(stream_url)
+    if probe_result is None or probe_result.input_format is None:
+        raise SystemExit(f'{stream_url} has no raw input format usable for fast start: {probe_result}')
+
+    samples = {'full_probe': [], 'fast_start': []}
+    for index in range(runs):
+        for kind in samples:
+            config._config['probe_cache']['fast_start'] = kind == 'fast_start'
+            channel_id = f'bench_{kind}_{index}'
+            process_info = process_manager.start_process(channel_id, stream_url)
+            try:
+                process_info.ready.result(timeout=timeout)
+                samples[kind].append(process_info.startup_seconds)
+            finally:
+                process_manager.stop_process(channel_id)
+
+    return {
+        'stream_url': stream_url,
+        'input_format': probe_result.input_format,
+        'mode': process_info.mode,
+        'runs': runs,
+        **{
+            kind: {
+                'median_s': round(statistics.median(values), 3),
+                'min_s': round(min(values), 3),
+                'max_s': round(max(values), 3)
+            }
+            for kind, values in samples.items()
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='快速启动基准测试')
+    parser.add_argument('stream_url', help='上游流地址')
+    parser.add_argument('--runs', type=int, default=5, help='每种方式的启动次数')
+    parser.add_argument('--timeout', type=float, default=30, help='等待首个播放列表的最长时间 (秒)')
+    args = parser.parse_args()
+
+    # 输出和锁文件放在临时目录，不影响正在运行的服务
+    with tempfile.TemporaryDirectory(prefix='bench_fast_start_') as work_dir:
+        os.environ['HLS_OUTPUT_DIR'] = os.path.join(work_dir, 'hls')
+        os.environ['LOCK_DIR'] = os.path.join(work_dir, 'locks')
+        os.environ['RESTART_ENABLED'] = 'false'
+        started = time.perf_counter()
+        result = run(args.stream_url, args.runs, args.timeout)
+        result['wall_seconds'] = round(time.perf_counter() - started, 1)
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
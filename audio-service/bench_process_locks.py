@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+基准测试：ProcessManager 锁竞争
+
+多个线程同时对不同频道执行 启动 -> 反复查询状态 / 列表 -> 停止，统计各类调用的延迟。
+停止进程时需要等待 FFmpeg 退出，全局锁会让其他频道的查询和启动排在慢停止之后。
+
+为只测量进程管理本身的开销，使用一个替身 FFmpeg：立即写出播放列表，收到 SIGTERM 后
+延迟 --exit-delay 秒退出（模拟 FFmpeg 收尾）。在改动前后的代码上分别运行并比较结果：
+
+    python3 bench_process_locks.py --threads 8 --channels 4 --rounds 3
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+STAND_IN_FFMPEG = r'''#!/usr/bin/env python3
+import os, sys, time, signal
+args = sys.argv[1:]
+if '-version' in args:
+    print('ffmpeg version bench'); sys.exit(0)
+def _term(*_):
+    time.sleep(float(os.environ.get('BENCH_EXIT_DELAY', '0.2')))
+    sys.exit(0)
+signal.signal(signal.SIGTERM, _term)
+playlist = args[-1]
+os.makedirs(os.path.dirname(playlist), exist_ok=True)
+with open(playlist + '.tmp', 'w') as f:
+    f.write('#EXTM3U\n#EXT-X-TARGETDURATION:2\n#EXT-X-MEDIA-SEQUENCE:0\n')
+os.replace(playlist + '.tmp', playlist)
+while True:
+    time.sleep(1)
+'''
+
+
+def prepare_environment(work_dir: str, exit_delay: float):
+    """生成替身 FFmpeg 并通过环境变量指向临时目录（须在导入 app 之前调用）"""
+    ffmpeg_path = os.path.join(work_dir, 'ffmpeg')
+    with open(ffmpeg_path, 'w') as f:
+        f.write(STAND_IN_FFMPEG)
+    os.chmod(ffmpeg_path, 0o755)
+
+    os.environ['FFMPEG_PATH'] = ffmpeg_path
+    os.environ['HLS_OUTPUT_DIR'] = os.path.join(work_dir, 'hls')
+    os.environ['LOCK_DIR'] = os.path.join(work_dir, 'locks')
+    os.environ['BENCH_EXIT_DELAY'] = str(exit_delay)
+    os.environ['RESTART_ENABLED'] = 'false'
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run(args) -> dict:
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    from app.routes import get_service
+    process_manager = get_service().process_manager
+
+    latencies = {'start': [], 'status': [], 'stop': []}
+    latencies_lock = threading.Lock()
+
+    def record(kind, started):
+        elapsed = time.perf_counter() - started
+        with latencies_lock:
+            latencies[kind].append(elapsed)
+
+    def worker(index):
+        channels = [f'bench{index}c{j}' for j in range(args.channels)]
+        for _ in range(args.rounds):
+            for channel_id in channels:
+                started = time.perf_counter()
+                process_manager.start_process(channel_id, 'http://bench.invalid/stream')
+                record('start', started)
+            for _ in range(args.queries):
+                for channel_id in channels:
+                    started = time.perf_counter()
+                    process_manager.get_process_status(channel_id)
+                    record('status', started)
+                started = time.perf_counter()
+                process_manager.list_processes()
+                record('status', started)
+                time.sleep(0.005)
+            for channel_id in channels:
+                started = time.perf_counter()
+                process_manager.stop_process(channel_id)
+                record('stop', started)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    result = {'wall_seconds': round(wall, 2)}
+    for kind, values in latencies.items():
+        values.sort()
+        result[kind] = {
+            'count': len(values),
+            'p50_ms': round(percentile(values, 0.5) * 1000, 1),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 1),
+            'max_ms': round(values[-1] * 1000, 1)
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ProcessManager 锁竞争基准测试')
+    parser.add_argument('--threads', type=int, default=8, help='并发线程数')
+    parser.add_argument('--channels', type=int, default=4, help='每个线程负责的频道数')
+    parser.add_argument('--rounds', type=int, default=3, help='每个线程的 启动/查询/停止 轮数')
+    parser.add_argument('--queries', type=int, default=20, help='每轮的状态查询次数')
+    parser.add_argument('--exit-delay', type=float, default=0.2, help='替身 FFmpeg 收到 SIGTERM 后的退出延迟 (秒)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench_locks_') as work_dir:
+        prepare_environment(work_dir, args.exit_delay)
+        print(json.dumps(run(args), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+基准测试：启动清理与进程查找在进程较多的主机上的耗时
+
+启动 --host-processes 个空闲进程模拟繁忙主机，在独立的解释器中多次测量：
+- 从导入 app 到第一个 API 请求返回的耗时（包含启动时的残留进程清理）
+- 旧版 FFmpegManager.is_running() 单次调用的耗时
+
+在改动前后的代码上分别运行并比较结果：
+
+    python3 bench_startup_scan.py --host-processes 2000
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_process_locks import prepare_environment
+
+CHILD = r'''
+import time
+started = time.perf_counter()
+from app import app
+app.test_client().get('/api/process/bench/status')
+first_response = time.perf_counter() - started
+from app.ffmpeg_manager import ffmpeg_manager
+started = time.perf_counter()
+for _ in range(20):
+    ffmpeg_manager.is_running('bench')
+print('RESULT', first_response, (time.perf_counter() - started) / 20)
+'''
+
+
+def measure_once(service_dir: str):
+    completed = subprocess.run([sys.executable, '-c', CHILD], cwd=service_dir, env=os.environ,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    # 服务日志同样输出到标准输出，只取结果行
+    line = next(line for line in completed.stdout.splitlines() if line.startswith('RESULT '))
+    _, first_response, is_running = line.split()
+    return float(first_response), float(is_running)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动清理与进程查找基准测试')
+    parser.add_argument('--host-processes', type=int, default=2000, help='模拟的主机空闲进程数')
+    parser.add_argument('--runs', type=int, default=5, help='测量次数（取中位数）')
+    args = parser.parse_args()
+
+    service_dir = os.path.dirname(os.path.abspath(__file__))
+    idle = [subprocess.Popen(['sleep', '600'], start_new_session=True) for _ in range(args.host_processes)]
+    try:
+        with tempfile.TemporaryDirectory(prefix='bench_scan_') as work_dir:
+            prepare_environment(work_dir, 0)
+            os.environ['PYTHONPATH'] = service_dir
+            results = [measure_once(service_dir) for _ in range(args.runs)]
+    finally:
+        for process in idle:
+            process.kill()
+        for process in idle:
+            process.wait()
+
+    print(json.dumps({
+        'host_processes': args.host_processes,
+        'runs': args.runs,
+        'first_response_ms_median': round(statistics.median(r[0] for r in results) * 1000, 1),
+        'legacy_is_running_ms_median': round(statistics.median(r[1] for r in results) * 1000, 2)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
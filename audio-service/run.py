@@ -12,6 +12,7 @@ import atexit
 from app import app
 from app.config import config
 from app.audio_service import get_audio_service, shutdown_service
+from app.container import get_container
 
 logger = logging.getLogger(__name__)
 
@@ -23,10 +24,19 @@ def signal_handler(signum, frame):
     sys.exit(0)
 
 
+def restart_handler(signum, frame):
+    """重启信号处理器：保留 FFmpeg 进程退出，由进程管理器（systemd Restart=always）重新拉起后接管"""
+    logger.info(f"Received signal {signum}, restarting with FFmpeg processes kept running...")
+    get_container().request_restart()
+    shutdown_service()
+    sys.exit(0)
+
+
 def setup_signal_handlers():
     """设置信号处理器"""
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
+    signal.signal(signal.SIGHUP, restart_handler)
 
 
 def main():